@@ -1,219 +1,400 @@
 import os
-import json
+import time
 import logging
-import requests
-from typing import Dict, Any, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+from llm_client import LLMClient, TransientLLMError, PermanentLLMError, estimate_tokens
+from llm_response_parser import parse_verdict, parse_verdicts, VERDICT_SCHEMA, PACKED_VERDICTS_SCHEMA
+from ai_providers import AIProvider, create_provider
+from verdict_cache import is_cacheable
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Maximum number of AI API requests in flight for check_eligibility_batch
+AI_MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", "8"))
+
+# Pairs sent per request by check_eligibility_batch; 1 sends every pair on its own
+AI_PACK_SIZE = int(os.environ.get("AI_PACK_SIZE", "1"))
+
+# Providers a pair is routed through, e.g. "local,openai"; empty uses the api_type alone
+AI_ROUTE = os.environ.get("AI_ROUTE", "")
+
+# A routed pair whose verdict is less confident than this goes on to the next provider
+AI_ESCALATE_CONFIDENCE = float(os.environ.get("AI_ESCALATE_CONFIDENCE", "75"))
+
+# Bump whenever the prompts or their rendering change, so cached verdicts are not reused
+PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = "You are a loan eligibility expert. Your task is to evaluate if a user with specific financial characteristics would be eligible for a loan product, even if they are slightly below the standard requirements. Consider factors like employment stability, debt-to-income ratio, and overall financial health. Respond with a JSON object containing 'eligible' (boolean), 'confidence' (number between 0-100), and 'reason' (string)."
+
+# Placeholder verdict of pairs in a pack the API failed on transiently, so they are not re-checked one by one
+DEFERRED = object()
+
+PACKED_SYSTEM_PROMPT = "You are a loan eligibility expert. Your task is to evaluate, for each case, if a user with specific financial characteristics would be eligible for a loan product, even if they are slightly below the standard requirements. Consider factors like employment stability, debt-to-income ratio, and overall financial health. Respond with only a JSON array containing one object per case, each with 'id' (the Case ID, copied exactly), 'eligible' (boolean), 'confidence' (number between 0-100), and 'reason' (string)."
+
+# Packed prompt for the JSON modes, whose answer must be an object rather than an array
+PACKED_OBJECT_SYSTEM_PROMPT = "You are a loan eligibility expert. Your task is to evaluate, for each case, if a user with specific financial characteristics would be eligible for a loan product, even if they are slightly below the standard requirements. Consider factors like employment stability, debt-to-income ratio, and overall financial health. Respond with a JSON object with a 'verdicts' array containing one object per case, each with 'id' (the Case ID, copied exactly), 'eligible' (boolean), 'confidence' (number between 0-100), and 'reason' (string)."
+
+# Verdict recorded when an answer cannot be parsed; the "API error" prefix keeps it out of the verdict cache
+UNPARSEABLE_REASON = "API error: unparseable response"
+
 class AIEligibilityChecker:
     """
     A class to handle AI-based eligibility checks for loan applications.
-    Supports both OpenAI GPT and Google Gemini APIs.
+    Verdicts come from the providers registered in ai_providers: OpenAI GPT,
+    Google Gemini, the local classifier and the deterministic mock.
     """
     
-    def __init__(self, api_type: str = "openai"):
+    def __init__(self, api_type: str = "openai", api_base: Optional[str] = None,
+                 max_concurrency: int = AI_MAX_CONCURRENCY, pack_size: int = AI_PACK_SIZE,
+                 client: Optional[LLMClient] = None, response_format: Optional[str] = None,
+                 route: Optional[Sequence[str]] = None, escalate_confidence: float = AI_ESCALATE_CONFIDENCE):
         """
         Initialize the AI eligibility checker.
         
         Args:
-            api_type: The type of AI API to use ('openai' or 'gemini')
+            api_type: Provider used when no route is set ('openai', 'gemini', 'local' or 'mock')
+            api_base: Base URL of the api_type provider's API; defaults to OPENAI_API_BASE or GEMINI_API_BASE
+            max_concurrency: Maximum number of requests in flight in check_eligibility_batch
+            pack_size: Pairs per request in check_eligibility_batch
+            client: HTTP client with retries, budget and circuit breaker; defaults to
+                    one configured from the environment
+            response_format: 'json', 'schema' or 'text' for the api_type provider;
+                             defaults to AI_RESPONSE_FORMATS
+            route: Provider names each pair is routed through; defaults to AI_ROUTE,
+                   or to api_type alone when that is empty
+            escalate_confidence: Confidence below which a routed pair goes on to the next provider
         """
         self.api_type = api_type.lower()
+        self.max_concurrency = max(1, max_concurrency)
+        self.pack_size = max(1, pack_size)
+        self.client = client or LLMClient(pool_size=self.max_concurrency)
+        self.escalate_confidence = escalate_confidence
+        self._providers = {}
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        
+        provider = self._provider(self.api_type, api_base)
+        if response_format and provider.prompts:
+            provider.response_format = response_format.lower()
+        if provider.prompts and provider.response_format not in ("json", "schema", "text"):
+            raise ValueError(f"Unsupported response format: {provider.response_format}. Use 'json', 'schema' or 'text'.")
         
-        # Load API keys from environment variables
-        if self.api_type == "openai":
-            self.api_key = os.environ.get("OPENAI_API_KEY")
-            if not self.api_key:
-                logger.warning("OPENAI_API_KEY not found in environment variables")
-        elif self.api_type == "gemini":
-            self.api_key = os.environ.get("GEMINI_API_KEY")
-            if not self.api_key:
-                logger.warning("GEMINI_API_KEY not found in environment variables")
-        else:
-            raise ValueError(f"Unsupported API type: {api_type}. Use 'openai' or 'gemini'.")
+        if route is None:
+            route = [name for name in AI_ROUTE.split(",") if name.strip()]
+        self.route = self._route(route or [self.api_type])
+        # Verdicts depend on every provider of the route, so all take part in cache keys
+        self.model = self.route_model()
     
-    def check_eligibility(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def check_eligibility(self, user_data: Dict[str, Any], loan_product: Dict[str, Any],
+                          provider: Union[str, Sequence[str], None] = None) -> Optional[Tuple[bool, float, str]]:
         """
         Check if a user is eligible for a loan product using AI.
         
         Args:
             user_data: Dictionary containing user financial information
             loan_product: Dictionary containing loan product details
+            provider: Provider name or route for this call; defaults to the checker's route
             
         Returns:
-            Tuple containing (is_eligible, confidence_score, reason)
+            Tuple containing (is_eligible, confidence_score, reason), or None when
+            the API failed transiently and the pair should be checked again later
+            
+        Raises:
+            PermanentLLMError: The API is not configured or rejected the request
         """
-        if self.api_type == "openai":
-            return self._check_with_openai(user_data, loan_product)
-        else:
-            return self._check_with_gemini(user_data, loan_product)
+        return self.check_eligibility_batch([(user_data, loan_product)], 1, 1, provider)[0]
     
-    def _check_with_openai(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> Tuple[bool, float, str]:
-        """
-        Check eligibility using OpenAI's GPT API.
+    def check_eligibility_batch(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                                max_concurrency: Optional[int] = None,
+                                pack_size: Optional[int] = None,
+                                provider: Union[str, Sequence[str], None] = None) -> List[Optional[Tuple[bool, float, str]]]:
         """
-        if not self.api_key:
-            logger.error("OpenAI API key not configured")
-            return False, 0.0, "API key not configured"
+        Check many user/loan product pairs, with up to max_concurrency requests in flight.
         
-        # Prepare the prompt
-        prompt = self._create_prompt(user_data, loan_product)
+        Pairs go through the providers of the route from the cheapest: a pair
+        moves on to the next provider when its verdict is below the escalation
+        confidence, is an API error or was deferred, so e.g. a "local,openai"
+        route only sends the cases the local classifier is unsure of to OpenAI.
+        An escalated pair keeps its earlier verdict when the next provider
+        answers with an API error or defers it.
         
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+        With a pack_size above 1, pairs are sent pack_size at a time in one
+        request. Pairs whose verdict is missing or malformed in the packed
+        answer are re-checked with single-pair requests; pairs of packs the
+        API failed on transiently are not.
+        
+        Args:
+            pairs: List of (user_data, loan_product) tuples
+            max_concurrency: Overrides the limit given to the constructor
+            pack_size: Overrides the pack size given to the constructor
+            provider: Provider name or route for this call, e.g. "mock" or
+                      ["local", "gemini"]; defaults to the checker's route
             
-            payload = {
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a loan eligibility expert. Your task is to evaluate if a user with specific financial characteristics would be eligible for a loan product, even if they are slightly below the standard requirements. Consider factors like employment stability, debt-to-income ratio, and overall financial health. Respond with a JSON object containing 'eligible' (boolean), 'confidence' (number between 0-100), and 'reason' (string)."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.2
-            }
+        Returns:
+            List of (is_eligible, confidence_score, reason) tuples, in the order of pairs,
+            with None for pairs the API failed on transiently
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
+        Raises:
+            PermanentLLMError: A provider is not configured or rejected a request
+        """
+        route = self._call_route(provider)
+        results = [None] * len(pairs)
+        pending = list(range(len(pairs)))
+        
+        for position, current in enumerate(route):
+            verdicts = self._check_with(current, [pairs[i] for i in pending], max_concurrency, pack_size)
+            self._count(f"pairs_{current.name}", len(pending))
+            last = position == len(route) - 1
             
-            response.raise_for_status()
-            response_data = response.json()
+            escalated = []
+            for i, verdict in zip(pending, verdicts):
+                if verdict is not None and (results[i] is None or is_cacheable(verdict)):
+                    results[i] = verdict
+                if not last and self._should_escalate(verdict):
+                    escalated.append(i)
             
-            # Extract the response content
-            content = response_data["choices"][0]["message"]["content"]
+            if escalated:
+                logger.info(f"Escalating {len(escalated)} of {len(pending)} pairs from {current.name} to {route[position + 1].name}")
+                self._count("escalated_pairs", len(escalated))
+            pending = escalated
+            if not pending:
+                break
+        
+        return results
+    
+    def route_model(self, provider: Union[str, Sequence[str], None] = None) -> str:
+        """
+        Name the models of the route a call goes through, for cache keys.
+        
+        Args:
+            provider: Provider name or route of the call; defaults to the checker's route
             
-            # Parse the JSON response
-            try:
-                result = json.loads(content)
-                eligible = result.get("eligible", False)
-                confidence = float(result.get("confidence", 0))
-                reason = result.get("reason", "No reason provided")
-                
-                return eligible, confidence, reason
-                
-            except json.JSONDecodeError:
-                # If not valid JSON, try to extract using regex
-                import re
-                
-                eligible_match = re.search(r'"eligible"\s*:\s*(true|false)', content, re.IGNORECASE)
-                eligible = eligible_match and eligible_match.group(1).lower() == 'true'
-                
-                confidence_match = re.search(r'"confidence"\s*:\s*(\d+)', content, re.IGNORECASE)
-                confidence = float(confidence_match.group(1)) if confidence_match else 0
-                
-                reason_match = re.search(r'"reason"\s*:\s*"([^"]+)"', content, re.IGNORECASE)
-                reason = reason_match.group(1) if reason_match else "No reason provided"
-                
-                return eligible, confidence, reason
-                
-        except Exception as e:
-            logger.error(f"Error calling OpenAI API: {str(e)}")
-            return False, 0.0, f"API error: {str(e)}"
+        Returns:
+            Models of the route's providers joined with "+"
+        """
+        return "+".join(current.model for current in self._call_route(provider))
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Return request, token, latency and HTTP client counters accumulated since the last reset"""
+        with self._stats_lock:
+            return {**self.stats, **self.client.get_stats()}
+    
+    def reset_stats(self):
+        """Reset the request, token, latency and HTTP client counters"""
+        self.client.reset_stats()
+        with self._stats_lock:
+            self.stats = {
+                "requests": 0,
+                "packed_requests": 0,
+                "fallback_pairs": 0,
+                "deferred_pairs": 0,
+                "escalated_pairs": 0,
+                "parse_fast": 0,
+                "parse_fallback": 0,
+                "parse_failed": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency_seconds": 0.0
+            }
+    
+    def _count(self, name: str, amount: float = 1):
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+    
+    def _provider(self, name: str, api_base: Optional[str] = None) -> AIProvider:
+        """Return the checker's instance of a registered provider, creating it on first use"""
+        name = name.strip().lower()
+        if name not in self._providers:
+            self._providers[name] = create_provider(name, api_base)
+        return self._providers[name]
+    
+    def _route(self, names: Sequence[str]) -> List[AIProvider]:
+        """
+        Resolve provider names to a route ordered from the cheapest provider.
+        
+        Providers that are not configured, e.g. lack an API key, are left out
+        unless none is configured.
+        """
+        route = sorted((self._provider(name) for name in dict.fromkeys(names)), key=lambda provider: provider.cost)
+        configured = [provider for provider in route if provider.is_configured()]
+        if configured and len(configured) < len(route):
+            logger.warning(f"Leaving unconfigured providers out of the route: {[p.name for p in route if p not in configured]}")
+        return configured or route
+    
+    def _call_route(self, provider: Union[str, Sequence[str], None]) -> List[AIProvider]:
+        """Return the route of one call: the checker's route, or the one provider overrides it with"""
+        if provider is None:
+            return self.route
+        return self._route([provider] if isinstance(provider, str) else provider)
+    
+    def _should_escalate(self, verdict: Optional[Tuple[bool, float, str]]) -> bool:
+        """Whether a routed pair goes on to the next provider"""
+        return verdict is None or not is_cacheable(verdict) or verdict[1] < self.escalate_confidence
+    
+    def _check_with(self, provider: AIProvider, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                    max_concurrency: Optional[int] = None,
+                    pack_size: Optional[int] = None) -> List[Optional[Tuple[bool, float, str]]]:
+        """Check pairs with one provider, packing and sending its prompts concurrently"""
+        if not pairs:
+            return []
+        if not provider.prompts:
+            return provider.judge(pairs)
+        
+        pack_size = max(1, pack_size or self.pack_size)
+        if pack_size == 1:
+            return self._map_concurrently(lambda pair: self._check_single(provider, *pair), pairs, max_concurrency)
+        
+        packs = [pairs[i:i + pack_size] for i in range(0, len(pairs), pack_size)]
+        results = [verdict for verdicts in self._map_concurrently(lambda pack: self._check_pack(provider, pack), packs, max_concurrency) for verdict in verdicts]
+        
+        missing = [i for i, verdict in enumerate(results) if verdict is None]
+        if missing:
+            logger.info(f"Falling back to single-pair checks for {len(missing)} of {len(pairs)} pairs")
+            self._count("fallback_pairs", len(missing))
+            fallback = self._map_concurrently(lambda i: self._check_single(provider, *pairs[i]), missing, max_concurrency)
+            for i, verdict in zip(missing, fallback):
+                results[i] = verdict
+        
+        return [None if verdict is DEFERRED else verdict for verdict in results]
+    
+    def _map_concurrently(self, function, items: List[Any], max_concurrency: Optional[int] = None) -> List[Any]:
+        """Apply function to items with a bounded thread pool, keeping the order of items"""
+        workers = min(max_concurrency or self.max_concurrency, len(items))
+        if workers <= 1:
+            return [function(item) for item in items]
+        
+        # The check functions report transient API failures in their result; only PermanentLLMError is raised
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, items))
+    
+    def _request(self, provider: AIProvider, system_prompt: str, prompt: str,
+                 schema: Dict[str, Any] = VERDICT_SCHEMA) -> str:
+        """
+        Send one prompt to a provider and return the text of the answer.
+        
+        In the 'json' and 'schema' response formats the API's native JSON mode
+        is requested, constrained to schema in 'schema'. Raises TransientLLMError
+        when the API cannot answer now and PermanentLLMError when it rejects
+        the request; records request count, token usage and latency.
+        """
+        start = time.perf_counter()
+        content, prompt_tokens, completion_tokens = provider.complete(self.client, system_prompt, prompt, schema)
+        if provider.remote:
+            self.client.record_tokens(estimate_tokens(system_prompt) + estimate_tokens(prompt), prompt_tokens + completion_tokens)
+        
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["latency_seconds"] += time.perf_counter() - start
+        
+        return content
     
-    def _check_with_gemini(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def _parse_verdict(self, provider: AIProvider, content: str) -> Tuple[bool, float, str]:
+        """Parse a single-pair verdict, recording an API error verdict when none can be read"""
+        verdict, outcome = parse_verdict(content)
+        self._count(f"parse_{outcome}")
+        if verdict is None:
+            logger.warning(f"Could not parse {provider.name} answer: {content[:200]!r}")
+            return False, 0.0, UNPARSEABLE_REASON
+        return verdict
+    
+    def _check_single(self, provider: AIProvider, user_data: Dict[str, Any],
+                      loan_product: Dict[str, Any]) -> Optional[Tuple[bool, float, str]]:
         """
-        Check eligibility using Google's Gemini API.
+        Check one pair with a single-pair prompt to a provider.
+        
+        Raises PermanentLLMError when the provider is not configured or rejects
+        the request, since no verdict can come from it.
         """
-        if not self.api_key:
-            logger.error("Gemini API key not configured")
-            return False, 0.0, "API key not configured"
+        if not provider.is_configured():
+            raise PermanentLLMError(f"{provider.name} API key not configured")
         
         # Prepare the prompt
         prompt = self._create_prompt(user_data, loan_product)
         
         try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": "You are a loan eligibility expert. Your task is to evaluate if a user with specific financial characteristics would be eligible for a loan product, even if they are slightly below the standard requirements. Consider factors like employment stability, debt-to-income ratio, and overall financial health. Respond with a JSON object containing 'eligible' (boolean), 'confidence' (number between 0-100), and 'reason' (string)."
-                            }
-                        ]
-                    },
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.2
-                }
-            }
-            
-            # Gemini API endpoint
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={self.api_key}"
-            
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            response_data = response.json()
-            
-            # Extract the response content
-            content = response_data["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Parse the JSON response
-            try:
-                result = json.loads(content)
-                eligible = result.get("eligible", False)
-                confidence = float(result.get("confidence", 0))
-                reason = result.get("reason", "No reason provided")
-                
-                return eligible, confidence, reason
-                
-            except json.JSONDecodeError:
-                # If not valid JSON, try to extract using regex
-                import re
-                
-                eligible_match = re.search(r'"eligible"\s*:\s*(true|false)', content, re.IGNORECASE)
-                eligible = eligible_match and eligible_match.group(1).lower() == 'true'
-                
-                confidence_match = re.search(r'"confidence"\s*:\s*(\d+)', content, re.IGNORECASE)
-                confidence = float(confidence_match.group(1)) if confidence_match else 0
-                
-                reason_match = re.search(r'"reason"\s*:\s*"([^"]+)"', content, re.IGNORECASE)
-                reason = reason_match.group(1) if reason_match else "No reason provided"
-                
-                return eligible, confidence, reason
-                
+            return self._parse_verdict(provider, self._request(provider, SYSTEM_PROMPT, prompt))
+        except TransientLLMError as e:
+            # Not a verdict: the pair stays unevaluated and is checked again later
+            logger.warning(f"{provider.name} API unavailable, deferring the pair: {str(e)}")
+            self._count("deferred_pairs")
+            return None
+        except PermanentLLMError:
+            raise
         except Exception as e:
-            logger.error(f"Error calling Gemini API: {str(e)}")
+            logger.error(f"Error calling {provider.name} API: {str(e)}")
             return False, 0.0, f"API error: {str(e)}"
     
-    def _create_prompt(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> str:
+    def _check_pack(self, provider: AIProvider,
+                    pack: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Optional[Tuple[bool, float, str]]]:
         """
-        Create a prompt for the AI model based on user data and loan product.
+        Check several pairs with one packed request.
         
         Args:
-            user_data: Dictionary containing user financial information
-            loan_product: Dictionary containing loan product details
+            provider: Provider answering the request
+            pack: List of (user_data, loan_product) tuples
             
         Returns:
-            String prompt for the AI model
+            List with a verdict tuple per pair, None where the answer had no valid
+            verdict, or DEFERRED for every pair when the API failed transiently
+            
+        Raises:
+            PermanentLLMError: The provider is not configured or rejected the request
         """
-        prompt = f"""
-Evaluate if this user is eligible for this loan product:
-
-User Information:
+        if not provider.is_configured():
+            raise PermanentLLMError(f"{provider.name} API key not configured")
+        
+        case_ids = self._case_ids(pack)
+        prompt = self._create_packed_prompt(case_ids, pack)
+        
+        try:
+            if provider.response_format == "text":
+                content = self._request(provider, PACKED_SYSTEM_PROMPT, prompt)
+            else:
+                content = self._request(provider, PACKED_OBJECT_SYSTEM_PROMPT, prompt, PACKED_VERDICTS_SCHEMA)
+            self._count("packed_requests")
+        except TransientLLMError as e:
+            logger.warning(f"{provider.name} API unavailable, deferring a pack of {len(pack)} pairs: {str(e)}")
+            self._count("deferred_pairs", len(pack))
+            return [DEFERRED] * len(pack)
+        except PermanentLLMError:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling {provider.name} API for a pack of {len(pack)} pairs: {str(e)}")
+            return [None] * len(pack)
+        
+        verdicts = self._parse_packed_verdicts(content, set(case_ids))
+        return [verdicts.get(case_id) for case_id in case_ids]
+    
+    def _case_ids(self, pack: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[str]:
+        """Build a stable, unique ID per pair from its user_id and product_id"""
+        case_ids = []
+        for position, (user_data, loan_product) in enumerate(pack):
+            case_id = f"u{user_data.get('user_id', '')}-p{loan_product.get('product_id', '')}"
+            if case_id == "u-p" or case_id in case_ids:
+                case_id = f"{case_id}-{position}"
+            case_ids.append(case_id)
+        return case_ids
+    
+    def _parse_packed_verdicts(self, content: str, case_ids: set) -> Dict[str, Tuple[bool, float, str]]:
+        """
+        Parse packed verdicts, keeping only well-formed items for known case IDs.
+        
+        Returns:
+            Dict mapping case ID to (is_eligible, confidence_score, reason)
+        """
+        verdicts, outcome = parse_verdicts(content, case_ids)
+        self._count(f"parse_{outcome}")
+        return verdicts
+    
+    def _describe_pair(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> str:
+        """Render the user and loan product details shared by single and packed prompts"""
+        return f"""User Information:
 Monthly Income: ${user_data.get('monthly_income', 'Not provided')}
 Credit Score: {user_data.get('credit_score', 'Not provided')}
 Employment Status: {user_data.get('employment_status', 'Not provided')}
@@ -229,11 +410,48 @@ Minimum Credit Score Requirement: {loan_product.get('min_credit_score', 'Not pro
 Minimum Monthly Income: ${loan_product.get('min_monthly_income', 'Not provided')}
 Maximum Debt-to-Income Ratio: {loan_product.get('max_debt_to_income', 'Not provided')}
 Loan Amount Range: ${loan_product.get('min_loan_amount', 'Not provided')} - ${loan_product.get('max_loan_amount', 'Not provided')}
-Loan Term: {loan_product.get('loan_term_months', 'Not provided')} months
+Loan Term: {loan_product.get('loan_term_months', 'Not provided')} months"""
+    
+    def _create_prompt(self, user_data: Dict[str, Any], loan_product: Dict[str, Any]) -> str:
+        """
+        Create a prompt for the AI model based on user data and loan product.
+        
+        Args:
+            user_data: Dictionary containing user financial information
+            loan_product: Dictionary containing loan product details
+            
+        Returns:
+            String prompt for the AI model
+        """
+        prompt = f"""
+Evaluate if this user is eligible for this loan product:
+
+{self._describe_pair(user_data, loan_product)}
 
 The user is slightly below the standard requirements. Would you recommend approving them for this loan?
 """
         return prompt
+    
+    def _create_packed_prompt(self, case_ids: List[str], pack: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> str:
+        """
+        Create one prompt covering several user/loan product pairs.
+        
+        Args:
+            case_ids: ID of each pair, echoed back in the verdicts
+            pack: List of (user_data, loan_product) tuples
+            
+        Returns:
+            String prompt for the AI model
+        """
+        cases = "\n\n".join(
+            f"Case ID: {case_id}\n{self._describe_pair(user_data, loan_product)}"
+            for case_id, (user_data, loan_product) in zip(case_ids, pack)
+        )
+        return f"""
+Evaluate each of the following {len(pack)} cases. In every case the user is slightly below the standard requirements of the loan product. Would you recommend approving them for this loan?
+
+{cases}
+"""
 
 
 # Example usage
@@ -268,8 +486,11 @@ if __name__ == "__main__":
     checker = AIEligibilityChecker(api_type="openai")
     
     # Check eligibility
-    eligible, confidence, reason = checker.check_eligibility(user, loan)
-    
-    print(f"Eligible: {eligible}")
-    print(f"Confidence: {confidence}%")
-    print(f"Reason: {reason}")
+    verdict = checker.check_eligibility(user, loan)
+    if verdict is None:
+        print("The API is unavailable, try again later")
+    else:
+        eligible, confidence, reason = verdict
+        print(f"Eligible: {eligible}")
+        print(f"Confidence: {confidence}%")
+        print(f"Reason: {reason}")
@@ -1,10 +1,16 @@
 import os
 import json
+import time
 import logging
-import boto3
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from ai_eligibility_checker import AIEligibilityChecker
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
+from ai_eligibility_checker import AIEligibilityChecker, PROMPT_VERSION
+from llm_client import PermanentLLMError
+from verdict_cache import VerdictCache, is_cacheable
+from pre_scorer import score_dict_pairs, triage, verdict, ASK_LLM
+from product_index import BORDERLINE_CREDIT_BAND, BORDERLINE_INCOME_RATIO
+from matching_engine import MATCH_REASON
+from db import get_db_connection, release_db_connection
 
 # Configure logging
 logger = logging.getLogger()
@@ -13,27 +19,336 @@ logger.setLevel(logging.INFO)
 # Initialize the AI checker
 ai_checker = AIEligibilityChecker(api_type=os.environ.get("AI_API_TYPE", "openai"))
 
-# Database connection parameters
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME")
-DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
-DB_PORT = os.environ.get("DB_PORT", "5432")
+# Verdict cache; its in-memory tier is reused across warm invocations
+verdict_cache = VerdictCache(model=ai_checker.model, prompt_version=PROMPT_VERSION)
 
-def get_db_connection():
-    """Create a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT
+def load_batch_pairs(cursor, batch_id, include_evaluated=False):
+    """
+    Get the borderline (user_id, product_id) pairs of an upload batch.
+    
+    Same band as matching_engine.find_borderline_pairs: credit score at most
+    BORDERLINE_CREDIT_BAND points below the product minimum and income at
+    least BORDERLINE_INCOME_RATIO of the minimum. Pairs the rules matched are
+    left out, they need no AI verdict. A pair without a match counts as
+    evaluated once its LLM job is done, a matched pair once it has an AI
+    verdict.
+    
+    Args:
+        cursor: RealDictCursor on the database connection
+        batch_id: Batch ID assigned by process_user_data
+        include_evaluated: Also return pairs that already have an AI verdict
+        
+    Returns:
+        List of (user_id, product_id) tuples
+    """
+    cursor.execute("""
+        SELECT u.user_id, lp.product_id
+        FROM users u
+        JOIN loan_products lp
+          ON u.credit_score BETWEEN lp.min_credit_score - %(credit_band)s AND lp.min_credit_score
+          AND u.monthly_income >= lp.min_monthly_income * %(income_ratio)s
+        LEFT JOIN matches m
+          ON m.user_id = u.user_id AND m.product_id = lp.product_id
+          AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch_id)s)
+        WHERE u.batch_id = %(batch_id)s
+        AND m.match_reason IS DISTINCT FROM %(rule_reason)s
+        AND (%(include_evaluated)s OR CASE
+            WHEN m.match_id IS NULL THEN NOT EXISTS (
+                SELECT 1 FROM llm_jobs j
+                WHERE j.user_id = u.user_id AND j.product_id = lp.product_id AND j.status = 'done'
+            )
+            ELSE m.ai_evaluated_at IS NULL
+        END)
+        ORDER BY u.user_id, lp.product_id
+    """, {
+        "batch_id": batch_id,
+        "credit_band": BORDERLINE_CREDIT_BAND,
+        "income_ratio": BORDERLINE_INCOME_RATIO,
+        "rule_reason": MATCH_REASON,
+        "include_evaluated": include_evaluated
+    })
+    return [(row["user_id"], row["product_id"]) for row in cursor.fetchall()]
+
+def update_match_verdicts(cursor, rows):
+    """
+    Record AI verdicts on the existing matches of their pairs with one UPDATE.
+    
+    matches is partitioned by created_at and no match predates its user, so
+    only partitions from the earliest of these users' creation times are
+    searched. Matches the rules made keep their score and get no verdict:
+    the rules already qualified them.
+    
+    Args:
+        cursor: RealDictCursor
+        rows: List of (user_id, product_id, eligible, confidence, reason, match_score) tuples
+        
+    Returns:
+        Dict of (user_id, product_id) -> match_id for the pairs whose match got the verdict
+    """
+    returned = execute_values(cursor, sql.SQL("""
+        WITH v (user_id, product_id, ai_eligible, ai_confidence, ai_reason, match_score) AS (
+            VALUES %s
         )
-        return conn
+        UPDATE matches AS m
+        SET ai_eligible = v.ai_eligible,
+            ai_confidence = v.ai_confidence,
+            ai_reason = v.ai_reason,
+            match_score = v.match_score,
+            ai_evaluated_at = NOW()
+        FROM v
+        WHERE m.user_id = v.user_id
+        AND m.product_id = v.product_id
+        AND m.created_at >= (SELECT MIN(u.created_at) FROM users u JOIN v ON v.user_id = u.user_id)
+        AND m.match_reason IS DISTINCT FROM {rule_reason}
+        RETURNING m.match_id, m.user_id, m.product_id
+    """).format(rule_reason=sql.Literal(MATCH_REASON)), rows, template="(%s::integer, %s::integer, %s::boolean, %s::numeric, %s::text, %s::numeric)",
+        page_size=len(rows), fetch=True)
+    return {(row["user_id"], row["product_id"]): row["match_id"] for row in returned}
+
+def evaluate_pairs(conn, pairs, insert_ineligible=False, provider=None):
+    """
+    Evaluate many user/loan product pairs and record every verdict at once.
+    
+    Users and products are fetched with one query each, pairs the pre-scorer
+    finds clearly eligible or ineligible are decided locally, the other
+    verdicts come from the verdict cache or from concurrent AI requests, and
+    all match rows are written with one UPDATE, one INSERT for pairs never
+    matched, and one commit. Pairs the AI API failed on transiently get no
+    verdict and are returned as deferred: their matches keep ai_evaluated_at
+    NULL, so a later batch invocation picks them up again. Inserted eligible
+    pairs get an "LLM Evaluation: " match_reason, which the llm_matches
+    counters count, or the pre-score reason. Pairs the rules already matched are left
+    as they are; their results have no match_id.
+    
+    Args:
+        conn: Database connection
+        pairs: List of (user_id, product_id) tuples
+        insert_ineligible: Also insert pairs never matched whose verdict is not
+                           eligible; otherwise only existing matches record them.
+                           Inserted ineligible matches are never notified.
+        provider: Provider name or route overriding the checker's route; cache
+                  keys are built on the route actually used
+        
+    Returns:
+        Dict with per-pair results, pairs whose user or product is missing,
+        deferred pairs, pre-score, cache and AI request counters, and the time
+        spent in each step
+        
+    Raises:
+        PermanentLLMError: The AI API is not configured or rejected a request;
+                           nothing is written
+    """
+    started = time.perf_counter()
+    timing = {}
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    try:
+        # Duplicates would make the upsert touch the same row twice
+        pairs = list(dict.fromkeys((int(user_id), int(product_id)) for user_id, product_id in pairs))
+        
+        cursor.execute("""
+            SELECT user_id, email, monthly_income, credit_score, 
+                   employment_status, age, debt_to_income_ratio, existing_loans
+            FROM users
+            WHERE user_id = ANY(%s)
+        """, (sorted({user_id for user_id, _ in pairs}),))
+        users = {row["user_id"]: row for row in cursor.fetchall()}
+        
+        cursor.execute("""
+            SELECT product_id, provider_name, product_name, interest_rate,
+                   min_loan_amount, max_loan_amount, loan_term_months,
+                   min_credit_score, min_monthly_income, max_debt_to_income
+            FROM loan_products
+            WHERE product_id = ANY(%s)
+        """, (sorted({product_id for _, product_id in pairs}),))
+        products = {row["product_id"]: row for row in cursor.fetchall()}
+        
+        not_found = [
+            {"user_id": user_id, "product_id": product_id}
+            for user_id, product_id in pairs
+            if user_id not in users or product_id not in products
+        ]
+        pairs = [(user_id, product_id) for user_id, product_id in pairs if user_id in users and product_id in products]
+        timing["load_seconds"] = time.perf_counter() - started
+        
+        # Decide the clear cases locally
+        step = time.perf_counter()
+        scores = score_dict_pairs([(users[user_id], products[product_id]) for user_id, product_id in pairs])
+        local = {
+            pair: verdict(decision, score)
+            for pair, score, decision in zip(pairs, scores, triage(scores))
+            if decision != ASK_LLM
+        }
+        timing["pre_score_seconds"] = time.perf_counter() - step
+        
+        # Serve identical situations from the verdict cache
+        step = time.perf_counter()
+        model = ai_checker.route_model(provider)
+        keys = [verdict_cache.key(users[user_id], products[product_id], model) for user_id, product_id in pairs]
+        verdicts = verdict_cache.get_many([key for key, pair in zip(keys, pairs) if pair not in local], conn)
+        cached = set(verdicts)
+        timing["cache_seconds"] = time.perf_counter() - step
+        
+        # Ask the AI once per distinct missing key
+        step = time.perf_counter()
+        ai_checker.reset_stats()
+        misses = {}
+        for key, (user_id, product_id) in zip(keys, pairs):
+            if key not in verdicts and (user_id, product_id) not in local:
+                misses.setdefault(key, (user_id, product_id))
+        if misses:
+            answers = ai_checker.check_eligibility_batch([
+                (users[user_id], products[product_id]) for user_id, product_id in misses.values()
+            ], provider=provider)
+            verdicts.update((key, answer) for key, answer in zip(misses, answers) if answer is not None)
+            verdict_cache.put_many([
+                (key, product_id, verdicts[key])
+                for key, (_, product_id) in misses.items()
+                if key in verdicts and is_cacheable(verdicts[key])
+            ], conn, model)
+        timing["ai_seconds"] = time.perf_counter() - step
+        
+        # Record every verdict with one statement
+        step = time.perf_counter()
+        rows = []
+        row_keys = []
+        deferred = []
+        for key, (user_id, product_id) in zip(keys, pairs):
+            if (user_id, product_id) not in local and key not in verdicts:
+                deferred.append({"user_id": user_id, "product_id": product_id})
+                continue
+            eligible, confidence, reason = local.get((user_id, product_id)) or verdicts[key]
+            match_score = confidence if eligible else confidence * 0.5
+            rows.append((user_id, product_id, eligible, confidence, reason, match_score))
+            row_keys.append(key)
+        
+        match_ids = {}
+        if rows:
+            # Existing matches get the verdict
+            match_ids = update_match_verdicts(cursor, rows)
+            
+            # Pairs that were never matched are inserted
+            missing = [
+                (*row, (row[4] if (row[0], row[1]) in local else f"LLM Evaluation: {row[4]}") if row[2] else None)
+                for row in rows
+                if (row[0], row[1]) not in match_ids and (insert_ineligible or row[2])
+            ]
+            if missing:
+                # Only pairs whose key is new in match_keys are inserted (see migration 008)
+                returned = execute_values(cursor, """
+                    WITH v (user_id, product_id, ai_eligible, ai_confidence, ai_reason, match_score, match_reason) AS (
+                        VALUES %s
+                    ), new_keys AS (
+                        INSERT INTO match_keys (user_id, product_id)
+                        SELECT user_id, product_id FROM v
+                        ORDER BY user_id, product_id
+                        ON CONFLICT DO NOTHING
+                        RETURNING user_id, product_id
+                    )
+                    INSERT INTO matches
+                    (user_id, product_id, ai_eligible, ai_confidence, ai_reason, match_score, match_reason, ai_evaluated_at)
+                    SELECT v.user_id, v.product_id, v.ai_eligible, v.ai_confidence, v.ai_reason, v.match_score, v.match_reason, NOW()
+                    FROM v
+                    JOIN new_keys k ON k.user_id = v.user_id AND k.product_id = v.product_id
+                    RETURNING match_id, user_id, product_id
+                """, missing, template="(%s::integer, %s::integer, %s::boolean, %s::numeric, %s::text, %s::numeric, %s::text)",
+                    page_size=len(missing), fetch=True)
+                match_ids.update({(row["user_id"], row["product_id"]): row["match_id"] for row in returned})
+                
+                # A concurrent writer matched the rest since the UPDATE; adding
+                # their keys waited for it to commit, so the matches are visible now
+                raced = [row[:6] for row in missing if (row[0], row[1]) not in match_ids]
+                if raced:
+                    match_ids.update(update_match_verdicts(cursor, raced))
+        conn.commit()
+        timing["write_seconds"] = time.perf_counter() - step
+        
+        results = [
+            {
+                "match_id": match_ids.get((user_id, product_id)),
+                "user_id": user_id,
+                "product_id": product_id,
+                "eligible": eligible,
+                "confidence": confidence,
+                "reason": reason,
+                "match_score": match_score,
+                "cached": key in cached,
+                "pre_scored": (user_id, product_id) in local
+            }
+            for key, (user_id, product_id, eligible, confidence, reason, match_score) in zip(row_keys, rows)
+        ]
+        timing["total_seconds"] = time.perf_counter() - started
+        
+        logger.info(f"Evaluated {len(results)} pairs ({len(local)} pre-scored, {len(cached)} cached keys, {len(misses)} AI checks, {len(deferred)} deferred) in {timing['total_seconds']:.2f}s")
+        return {
+            "evaluated": len(results),
+            "eligible": sum(1 for result in results if result["eligible"]),
+            "pre_scored": len(local),
+            "results": results,
+            "not_found": not_found,
+            "deferred": deferred,
+            "cache_stats": verdict_cache.stats(),
+            "ai_stats": ai_checker.get_stats(),
+            "timing": {name: round(seconds, 4) for name, seconds in timing.items()}
+        }
+    finally:
+        cursor.close()
+
+def handle_batch(body):
+    """
+    Evaluate every pair of a batch in one invocation.
+    
+    Args:
+        body: Request body with either batch_id (plus optional include_evaluated)
+              or pairs, a list of {"user_id": ..., "product_id": ...}
+        
+    Returns:
+        Lambda response with per-pair results and timing
+    """
+    conn = get_db_connection()
+    
+    try:
+        if body.get("pairs"):
+            pairs = [(pair["user_id"], pair["product_id"]) for pair in body["pairs"]]
+        else:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                pairs = load_batch_pairs(cursor, body["batch_id"], bool(body.get("include_evaluated")))
+            finally:
+                cursor.close()
+        
+        summary = evaluate_pairs(conn, pairs)
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "status": "success",
+                "batch_id": body.get("batch_id"),
+                **summary
+            })
+        }
+        
+    except PermanentLLMError as e:
+        conn.rollback()
+        logger.error(f"AI API error: {str(e)}")
+        return {
+            "statusCode": 502,
+            "body": json.dumps({
+                "status": "error",
+                "message": f"AI API error: {str(e)}"
+            })
+        }
     except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise e
+        conn.rollback()
+        logger.error(f"Database error: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "status": "error",
+                "message": f"Database error: {str(e)}"
+            })
+        }
+    finally:
+        release_db_connection(conn)
 
 def lambda_handler(event, context):
     """
@@ -43,10 +358,16 @@ def lambda_handler(event, context):
     1. Receives user_id and product_id from the event
     2. Retrieves user and loan product data from the database
     3. Uses AI to determine eligibility
-    4. Updates the match record with AI evaluation results
+    4. Updates the match record with AI evaluation results, or inserts a
+       match for an eligible pair that has none
+    
+    A body with batch_id or pairs instead evaluates all of them in one
+    invocation (see handle_batch). Such requests take longer than API Gateway
+    waits, so they are refused on the synchronous endpoint and taken by
+    POST /ai-eligibility/batch, which invokes this asynchronously.
     
     Args:
-        event: Dict containing user_id and product_id
+        event: Dict containing user_id and product_id, directly or in a JSON body
         context: AWS Lambda context
         
     Returns:
@@ -54,7 +375,21 @@ def lambda_handler(event, context):
     """
     try:
         # Extract parameters from the event
-        body = json.loads(event.get("body", "{}"))
+        body = event.get("body", event)
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
+        
+        if body.get("batch_id") or body.get("pairs"):
+            if "httpMethod" in event:
+                return {
+                    "statusCode": 400,
+                    "body": json.dumps({
+                        "status": "error",
+                        "message": "Batch requests are evaluated asynchronously: POST them to /ai-eligibility/batch"
+                    })
+                }
+            return handle_batch(body)
+        
         user_id = body.get("user_id")
         product_id = body.get("product_id")
         
@@ -63,7 +398,7 @@ def lambda_handler(event, context):
                 "statusCode": 400,
                 "body": json.dumps({
                     "status": "error",
-                    "message": "Missing required parameters: user_id and product_id"
+                    "message": "Missing required parameters: user_id and product_id, or batch_id"
                 })
             }
         
@@ -109,53 +444,99 @@ def lambda_handler(event, context):
                     })
                 }
             
-            # Check eligibility using AI
-            eligible, confidence, reason = ai_checker.check_eligibility(user_data, loan_product)
+            # Decide clear cases locally
+            score = score_dict_pairs([(user_data, loan_product)])[0]
+            decision = triage(score)
+            cached = None
+            if decision != ASK_LLM:
+                eligible, confidence, reason = verdict(decision, score)
+                logger.info(f"Pre-scored user {user_id}, product {product_id} at {score:.0f}")
+            else:
+                # Serve identical situations from the verdict cache, otherwise ask the AI
+                cache_key = verdict_cache.key(user_data, loan_product)
+                cached = verdict_cache.get(cache_key, conn)
+                if cached:
+                    eligible, confidence, reason = cached
+                else:
+                    answer = ai_checker.check_eligibility(user_data, loan_product)
+                    if answer is None:
+                        # Leave the match unevaluated rather than record a rejection
+                        return {
+                            "statusCode": 503,
+                            "body": json.dumps({
+                                "status": "deferred",
+                                "message": "AI API temporarily unavailable, try again later",
+                                "user_id": user_id,
+                                "product_id": product_id
+                            })
+                        }
+                    eligible, confidence, reason = answer
+                    if is_cacheable((eligible, confidence, reason)):
+                        verdict_cache.put(cache_key, product_id, (eligible, confidence, reason), conn)
+                        # Keep the verdict even if the match update below fails
+                        conn.commit()
+                logger.info(f"Verdict cache {'hit' if cached else 'miss'} for user {user_id}, product {product_id}: {verdict_cache.stats()}")
             
             # Calculate match score (0-100)
             match_score = confidence if eligible else confidence * 0.5
             
-            # Update the match record in the database
-            cursor.execute("""
-                UPDATE matches
-                SET ai_eligible = %s,
-                    ai_confidence = %s,
-                    ai_reason = %s,
-                    match_score = %s,
-                    ai_evaluated_at = NOW()
-                WHERE user_id = %s AND product_id = %s
-                RETURNING match_id
-            """, (eligible, confidence, reason, match_score, user_id, product_id))
-            
-            match = cursor.fetchone()
-            conn.commit()
+            # Update the match record in the database, with the rules of evaluate_pairs
+            row = (int(user_id), int(product_id), eligible, confidence, reason, match_score)
+            match_id = update_match_verdicts(cursor, [row]).get(row[:2])
             
-            if not match:
-                # If no match record exists, create one
+            if match_id is None and eligible:
+                # Only eligible pairs are inserted, and only when their key is
+                # new in match_keys (see migration 008)
+                match_reason = reason if decision != ASK_LLM else f"LLM Evaluation: {reason}"
                 cursor.execute("""
+                    WITH new_key AS (
+                        INSERT INTO match_keys (user_id, product_id) VALUES (%s, %s)
+                        ON CONFLICT DO NOTHING
+                        RETURNING user_id, product_id
+                    )
                     INSERT INTO matches
-                    (user_id, product_id, ai_eligible, ai_confidence, ai_reason, match_score, ai_evaluated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                    (user_id, product_id, ai_eligible, ai_confidence, ai_reason, match_score, match_reason, ai_evaluated_at)
+                    SELECT user_id, product_id, %s, %s, %s, %s, %s, NOW()
+                    FROM new_key
                     RETURNING match_id
-                """, (user_id, product_id, eligible, confidence, reason, match_score))
-                match = cursor.fetchone()
-                conn.commit()
+                """, (*row[:2], eligible, confidence, reason, match_score, match_reason))
+                inserted = cursor.fetchone()
+                if inserted:
+                    match_id = inserted["match_id"]
+                else:
+                    # A concurrent writer matched the pair since the UPDATE; adding
+                    # its key waited for it to commit, so the match is visible now
+                    match_id = update_match_verdicts(cursor, [row]).get(row[:2])
+            conn.commit()
             
             # Return the results
             return {
                 "statusCode": 200,
                 "body": json.dumps({
                     "status": "success",
-                    "match_id": match["match_id"],
+                    "match_id": match_id,
                     "user_id": user_id,
                     "product_id": product_id,
                     "eligible": eligible,
                     "confidence": confidence,
                     "reason": reason,
-                    "match_score": match_score
+                    "match_score": match_score,
+                    "cached": cached is not None,
+                    "pre_scored": bool(decision != ASK_LLM),
+                    "cache_stats": verdict_cache.stats()
                 })
             }
             
+        except PermanentLLMError as e:
+            conn.rollback()
+            logger.error(f"AI API error: {str(e)}")
+            return {
+                "statusCode": 502,
+                "body": json.dumps({
+                    "status": "error",
+                    "message": f"AI API error: {str(e)}"
+                })
+            }
         except Exception as e:
             conn.rollback()
             logger.error(f"Database error: {str(e)}")
@@ -168,7 +549,7 @@ def lambda_handler(event, context):
             }
         finally:
             cursor.close()
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Lambda error: {str(e)}")
@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from llm_client import LLMClient, estimate_tokens
+from llm_response_parser import gemini_schema
+from pre_scorer import score_dict_pairs
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Base URLs of the AI APIs, overridable to point at a proxy or a local mock server
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+
+# Model used for each API type
+AI_MODELS = {
+    "openai": os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo"),
+    "gemini": os.environ.get("GEMINI_MODEL", "gemini-pro")
+}
+
+# How answers are requested for each API type: 'json' uses the API's JSON mode, 'schema' also
+# constrains the answer to the verdict schema, 'text' asks for JSON in the prompt only.
+# gemini-pro has no JSON mode; use 'json' or 'schema' with Gemini 1.5 and later models.
+AI_RESPONSE_FORMATS = {
+    "openai": os.environ.get("OPENAI_RESPONSE_FORMAT", "json"),
+    "gemini": os.environ.get("GEMINI_RESPONSE_FORMAT", "text")
+}
+
+# Pre-score from which the local classifier finds a pair eligible
+LOCAL_ELIGIBLE_SCORE = float(os.environ.get("LOCAL_ELIGIBLE_SCORE", "50"))
+
+# Fields of a single-pair prompt read by the deterministic mock
+CREDIT_SCORE_PATTERN = re.compile(r"Credit Score: (\d+)")
+MIN_CREDIT_SCORE_PATTERN = re.compile(r"Minimum Credit Score Requirement: (\d+)")
+CASE_ID_PATTERN = re.compile(r"^Case ID: (\S+)$", re.MULTILINE)
+
+PROVIDERS: Dict[str, Callable[..., "AIProvider"]] = {}
+
+def register_provider(name: str):
+    """Class decorator adding a provider to PROVIDERS under name"""
+    def register(cls):
+        cls.name = name
+        PROVIDERS[name] = cls
+        return cls
+    return register
+
+def create_provider(name: str, api_base: Optional[str] = None) -> "AIProvider":
+    """
+    Instantiate a registered provider.
+
+    Args:
+        name: Registered provider name, e.g. 'openai', 'gemini', 'local' or 'mock'
+        api_base: Base URL of a remote provider's API; defaults to its environment setting
+
+    Returns:
+        AIProvider instance
+    """
+    name = name.strip().lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unsupported API type: {name}. Use one of {', '.join(sorted(PROVIDERS))}.")
+    return PROVIDERS[name](api_base=api_base)
+
+class AIProvider:
+    """
+    Backend producing eligibility verdicts for AIEligibilityChecker.
+
+    Prompt providers answer the checker's rendered prompts through complete(),
+    and the checker parses their text. Providers with prompts = False judge
+    the user and product dicts directly through judge(), without a prompt.
+    The cost and remote attributes let the checker route pairs to the
+    cheapest provider first.
+    """
+
+    name = None
+    # Whether the provider answers prompts; otherwise it judges pairs with judge()
+    prompts = True
+    # Whether calls leave the process
+    remote = True
+    # Relative cost of one pair, used to order routes
+    cost = 1.0
+
+    def __init__(self, api_base: Optional[str] = None):
+        self.model = self.name
+        self.response_format = "json"
+
+    def is_configured(self) -> bool:
+        """Whether the provider can be called, e.g. has its API key"""
+        return True
+
+    def complete(self, client: LLMClient, system_prompt: str, prompt: str,
+                 schema: Dict[str, Any]) -> Tuple[str, int, int]:
+        """
+        Answer one prompt.
+
+        Raises TransientLLMError when the provider cannot answer now, and
+        PermanentLLMError when it rejects the request.
+
+        Args:
+            client: HTTP client with retries, budget and circuit breaker
+            system_prompt: Instructions of the checker
+            prompt: Rendered user prompt
+            schema: JSON Schema of the answer, used in the 'schema' response format
+
+        Returns:
+            Tuple of (answer text, prompt tokens, completion tokens)
+        """
+        raise NotImplementedError(f"{self.name} does not answer prompts")
+
+    def judge(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Tuple[bool, float, str]]:
+        """
+        Judge user/loan product pairs without a prompt.
+
+        Args:
+            pairs: List of (user_data, loan_product) tuples
+
+        Returns:
+            List of (is_eligible, confidence_score, reason) tuples
+        """
+        raise NotImplementedError(f"{self.name} only answers prompts")
+
+@register_provider("openai")
+class OpenAIProvider(AIProvider):
+    """OpenAI chat completions"""
+
+    cost = 10.0
+
+    def __init__(self, api_base: Optional[str] = None):
+        self.api_key = os.environ.get("OPENAI_API_KEY")
+        self.api_base = (api_base or OPENAI_API_BASE).rstrip("/")
+        self.model = AI_MODELS["openai"]
+        self.response_format = AI_RESPONSE_FORMATS["openai"]
+        if not self.api_key:
+            logger.warning("OPENAI_API_KEY not found in environment variables")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def complete(self, client, system_prompt, prompt, schema):
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.2
+        }
+        if self.response_format == "json":
+            payload["response_format"] = {"type": "json_object"}
+        elif self.response_format == "schema":
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "loan_eligibility", "strict": True, "schema": schema}
+            }
+
+        response_data = client.post_json(
+            f"{self.api_base}/chat/completions",
+            payload,
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+            estimated_tokens=estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        )
+
+        usage = response_data.get("usage", {})
+        content = response_data["choices"][0]["message"]["content"]
+        return content, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+@register_provider("gemini")
+class GeminiProvider(AIProvider):
+    """Google Gemini generateContent"""
+
+    cost = 5.0
+
+    def __init__(self, api_base: Optional[str] = None):
+        self.api_key = os.environ.get("GEMINI_API_KEY")
+        self.api_base = (api_base or GEMINI_API_BASE).rstrip("/")
+        self.model = AI_MODELS["gemini"]
+        self.response_format = AI_RESPONSE_FORMATS["gemini"]
+        if not self.api_key:
+            logger.warning("GEMINI_API_KEY not found in environment variables")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def complete(self, client, system_prompt, prompt, schema):
+        payload = {
+            "contents": [
+                {"parts": [{"text": system_prompt}]},
+                {"parts": [{"text": prompt}]}
+            ],
+            "generationConfig": {"temperature": 0.2}
+        }
+        if self.response_format != "text":
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+        if self.response_format == "schema":
+            payload["generationConfig"]["responseSchema"] = gemini_schema(schema)
+
+        response_data = client.post_json(
+            f"{self.api_base}/models/{self.model}:generateContent?key={self.api_key}",
+            payload,
+            headers={"Content-Type": "application/json"},
+            estimated_tokens=estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        )
+
+        usage = response_data.get("usageMetadata", {})
+        content = response_data["candidates"][0]["content"]["parts"][0]["text"]
+        return content, usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)
+
+@register_provider("local")
+class LocalProvider(AIProvider):
+    """
+    On-CPU classifier over the pre-scorer's features, with no network calls.
+
+    A pair is eligible when its pre-score reaches LOCAL_ELIGIBLE_SCORE, and the
+    confidence grows with the distance from that threshold, so pairs near it
+    are the ones a route escalates to a remote LLM.
+    """
+
+    prompts = False
+    remote = False
+    cost = 0.0
+
+    def __init__(self, api_base: Optional[str] = None):
+        self.model = f"pre-scorer@{LOCAL_ELIGIBLE_SCORE:g}"
+        self.response_format = None
+
+    def judge(self, pairs):
+        verdicts = []
+        for score in score_dict_pairs(pairs) if pairs else []:
+            eligible = bool(score >= LOCAL_ELIGIBLE_SCORE)
+            margin = abs(float(score) - LOCAL_ELIGIBLE_SCORE) / max(LOCAL_ELIGIBLE_SCORE, 100 - LOCAL_ELIGIBLE_SCORE)
+            confidence = round(50 + 50 * min(margin, 1.0), 1)
+            outcome = "eligible" if eligible else "not eligible"
+            verdicts.append((eligible, confidence, f"Local classifier {float(score):.0f}/100: {outcome} on credit, income, DTI, employment and existing loans"))
+        return verdicts
+
+@register_provider("mock")
+class MockProvider(AIProvider):
+    """
+    Deterministic in-process LLM: the rule tools/mock_llm_server.py serves over HTTP.
+
+    Answers go through the same prompts, packing and parsing as a remote
+    provider, so the whole pipeline can run and be benchmarked offline.
+    """
+
+    remote = False
+    cost = 0.0
+
+    def __init__(self, api_base: Optional[str] = None):
+        self.model = "mock"
+        self.response_format = "json"
+
+    def complete(self, client, system_prompt, prompt, schema):
+        content = answer_prompt(prompt, json_mode=self.response_format != "text")
+        return content, estimate_tokens(system_prompt) + estimate_tokens(prompt), estimate_tokens(content)
+
+def evaluate_prompt(prompt: str) -> Dict[str, Any]:
+    """
+    Produce the mock verdict of a single-pair prompt rendered by _create_prompt.
+
+    A user is eligible when their credit score is within 20 points of the
+    product minimum.
+
+    Returns:
+        Dict with eligible, confidence and reason
+    """
+    credit = CREDIT_SCORE_PATTERN.search(prompt)
+    minimum = MIN_CREDIT_SCORE_PATTERN.search(prompt)
+    if not credit or not minimum:
+        return {"eligible": False, "confidence": 0, "reason": "Could not read the credit criteria"}
+
+    gap = int(minimum.group(1)) - int(credit.group(1))
+    eligible = gap <= 20
+    return {
+        "eligible": eligible,
+        "confidence": max(0, 90 - 2 * max(gap, 0)),
+        "reason": f"Credit score is {gap} points below the minimum" if gap > 0 else "Meets the credit score minimum"
+    }
+
+def answer_prompt(prompt: str, drop_every: int = 0, counter=None, json_mode: bool = False) -> str:
+    """
+    Render the mock answer text for a single-pair or packed prompt.
+
+    Args:
+        prompt: User prompt text
+        drop_every: Omit every Nth case of packed answers (0 keeps all)
+        counter: itertools.count shared across requests, used with drop_every
+        json_mode: The request asked for a JSON object, so packed verdicts are
+                   wrapped in {"verdicts": [...]}
+
+    Returns:
+        JSON text of one verdict object, or of the verdicts with ids
+    """
+    blocks = CASE_ID_PATTERN.split(prompt)
+    if len(blocks) == 1:
+        return json.dumps(evaluate_prompt(prompt))
+
+    verdicts = []
+    # split() alternates the text before each ID, the ID and the case body
+    for case_id, body in zip(blocks[1::2], blocks[2::2]):
+        if drop_every and counter is not None and next(counter) % drop_every == drop_every - 1:
+            continue
+        verdicts.append({"id": case_id, **evaluate_prompt(body)})
+    return json.dumps({"verdicts": verdicts} if json_mode else verdicts)
@@ -0,0 +1,238 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+
+REQUIRED_FIELDS = ['email', 'monthly_income', 'credit_score', 'employment_status', 'age']
+
+# Optional numeric fields and the value used when the column is absent
+OPTIONAL_DEFAULTS = {
+    'debt_to_income_ratio': 0.0,
+    'existing_loans': 0
+}
+
+FLOAT_FIELDS = ['monthly_income', 'debt_to_income_ratio']
+INT_FIELDS = ['credit_score', 'age', 'existing_loans']
+
+# Inclusive (min, max) bounds; values outside are rejected
+FIELD_RANGES = {
+    'monthly_income': (0, 9999999999.99),
+    'credit_score': (300, 850),
+    'age': (18, 120),
+    'debt_to_income_ratio': (0, 999.99),
+    'existing_loans': (0, 1000)
+}
+
+# Columns of the validated batches, in order
+OUTPUT_COLUMNS = [
+    'row_number', 'user_id', 'email', 'monthly_income', 'credit_score',
+    'employment_status', 'age', 'debt_to_income_ratio', 'existing_loans'
+]
+
+FLOAT_PATTERN = r'^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$'
+INT_PATTERN = r'^\s*[+-]?\d{1,18}\s*$'
+USER_ID_PATTERN = r'^\d{1,9}$'
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+$'
+
+# Bytes of CSV parsed per Arrow record batch
+READ_BLOCK_SIZE = 1024 * 1024
+# Maximum number of (row_number, reason) samples kept per report
+MAX_REJECT_SAMPLES = 100
+
+class RejectReport:
+    """
+    Compact summary of rejected rows: a count per reason plus the first few
+    row numbers, instead of one log line per row.
+    """
+
+    def __init__(self, max_samples: int = MAX_REJECT_SAMPLES):
+        self.max_samples = max_samples
+        self.total = 0
+        self.reasons = {}
+        self.samples = []
+
+    def add(self, row_number, reason: str):
+        """Record one rejected row"""
+        self.total += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append({'row_number': row_number, 'reason': reason})
+
+    def add_rows(self, row_numbers, reason: str):
+        """Record every row number in an array of rejected rows for reason"""
+        count = len(row_numbers)
+        if not count:
+            return
+        self.total += count
+        self.reasons[reason] = self.reasons.get(reason, 0) + count
+        room = self.max_samples - len(self.samples)
+        for row_number in row_numbers[:room]:
+            self.samples.append({'row_number': int(row_number), 'reason': reason})
+
+    def as_dict(self):
+        """Return the report in the shape used by ingest summaries"""
+        return {
+            'rejected': self.total,
+            'reject_reasons': dict(self.reasons),
+            'reject_samples': list(self.samples)
+        }
+
+class ChunkStream:
+    """Read-only file object over an iterable of byte chunks, for the Arrow CSV reader"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self.closed = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self.closed = True
+
+def _reject(report, valid, ok, row_numbers, reason):
+    """Report rows that are still valid but fail ok, and return the narrowed mask"""
+    ok = pc.fill_null(ok, False)
+    failed = pc.and_(valid, pc.invert(ok))
+    if pc.any(failed).as_py():
+        report.add_rows(pc.filter(row_numbers, failed).to_numpy(), reason)
+    return pc.and_(valid, ok)
+
+def _parse_numbers(column, pattern, target_type):
+    """Return (ok_mask, values) for a string column, with 0 in place of unparsable entries"""
+    try:
+        # Fast path: clean columns convert in one kernel call
+        values = pc.cast(column, target_type)
+        if pa.types.is_floating(target_type):
+            # The cast accepts 'nan' and 'inf', which the pattern does not
+            return pc.is_finite(values), values
+        return pa.array(np.ones(len(column), dtype=bool)), values
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+    
+    ok = pc.fill_null(pc.match_substring_regex(column, pattern), False)
+    values = pc.cast(pc.if_else(ok, pc.utf8_trim_whitespace(column), '0'), target_type)
+    return ok, values
+
+def validate_batch(batch, row_numbers, report):
+    """
+    Validate and coerce one batch of raw CSV strings column-wise.
+
+    Args:
+        batch: Arrow RecordBatch with string columns as read from the CSV
+        row_numbers: Arrow int64 array with the file row of each record
+        report: RejectReport collecting rejected rows
+
+    Returns:
+        Arrow RecordBatch of valid rows with OUTPUT_COLUMNS, or None if no row is valid
+    """
+    names = batch.schema.names
+    num_rows = batch.num_rows
+
+    missing = [field for field in REQUIRED_FIELDS if field not in names]
+    if missing:
+        report.add_rows(row_numbers.to_numpy(), f"missing required fields: {', '.join(missing)}")
+        return None
+
+    valid = pa.array(np.ones(num_rows, dtype=bool))
+    columns = {'row_number': row_numbers}
+
+    if 'user_id' in names:
+        user_id = pc.utf8_trim_whitespace(batch.column('user_id'))
+        user_id = pc.if_else(pc.equal(user_id, ''), pa.scalar(None, pa.string()), user_id)
+        ok = pc.or_kleene(pc.is_null(user_id), pc.match_substring_regex(user_id, USER_ID_PATTERN))
+        valid = _reject(report, valid, ok, row_numbers, 'invalid user_id')
+        columns['user_id'] = user_id
+    else:
+        columns['user_id'] = pa.nulls(num_rows, pa.string())
+
+    email = pc.utf8_lower(pc.utf8_trim_whitespace(batch.column('email')))
+    valid = _reject(report, valid, pc.match_substring_regex(email, EMAIL_PATTERN), row_numbers, 'invalid email')
+    columns['email'] = email
+
+    columns['employment_status'] = pc.utf8_trim_whitespace(batch.column('employment_status'))
+
+    for field in FLOAT_FIELDS + INT_FIELDS:
+        target_type = pa.float64() if field in FLOAT_FIELDS else pa.int64()
+        if field not in names:
+            columns[field] = pa.array(np.full(num_rows, OPTIONAL_DEFAULTS[field]), target_type)
+            continue
+
+        pattern = FLOAT_PATTERN if field in FLOAT_FIELDS else INT_PATTERN
+        ok, values = _parse_numbers(batch.column(field), pattern, target_type)
+        valid = _reject(report, valid, ok, row_numbers, f"invalid {field}")
+
+        low, high = FIELD_RANGES[field]
+        in_range = pc.and_(pc.greater_equal(values, low), pc.less_equal(values, high))
+        valid = _reject(report, valid, in_range, row_numbers, f"{field} out of range")
+        columns[field] = values
+
+    if not pc.any(valid).as_py():
+        return None
+
+    result = pa.RecordBatch.from_arrays([columns[name] for name in OUTPUT_COLUMNS], names=OUTPUT_COLUMNS)
+    return result.filter(valid)
+
+def iter_valid_batches(stream, report, block_size=READ_BLOCK_SIZE):
+    """
+    Parse CSV bytes into Arrow batches and yield the validated rows of each.
+
+    Rows with the wrong number of fields are skipped by the parser and
+    reported with their row number. Row numbers count the header as row 1
+    and ignore blank lines, so they match file lines when records do not
+    span several lines.
+
+    Args:
+        stream: File-like object returning CSV bytes (see ChunkStream)
+        report: RejectReport collecting rejected rows
+        block_size: Bytes parsed per batch
+
+    Yields:
+        Arrow RecordBatch of valid rows with OUTPUT_COLUMNS
+    """
+    skipped = []
+
+    def handle_invalid_row(row):
+        reason = f"expected {row.expected_columns} fields, got {row.actual_columns}"
+        report.add(row.number, reason)
+        skipped.append(row.number)
+        return 'skip'
+
+    # Read every known column as text so bad values are rejected per row instead of failing the file
+    string_columns = ['user_id'] + REQUIRED_FIELDS + list(OPTIONAL_DEFAULTS)
+    reader = pacsv.open_csv(
+        stream,
+        read_options=pacsv.ReadOptions(block_size=block_size, use_threads=False),
+        parse_options=pacsv.ParseOptions(invalid_row_handler=handle_invalid_row),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in string_columns},
+            strings_can_be_null=False
+        )
+    )
+
+    # Row 1 is the header
+    next_row = 2
+    for batch in reader:
+        numbers = np.arange(next_row, next_row + batch.num_rows, dtype=np.int64)
+        # Shift past rows the parser skipped inside this batch
+        for skipped_row in sorted(skipped):
+            numbers[numbers >= skipped_row] += 1
+        next_row += batch.num_rows + len(skipped)
+        skipped.clear()
+
+        valid_batch = validate_batch(batch, pa.array(numbers), report)
+        if valid_batch is not None and valid_batch.num_rows:
+            yield valid_batch
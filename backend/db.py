@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Database connection parameters
+DB_HOST = os.environ.get("DB_HOST")
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+# Maximum number of open connections per Lambda container (keep small on db.t3.micro)
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "4"))
+# Connections idle longer than this many seconds are pinged before reuse
+DB_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_HEALTH_CHECK_INTERVAL", "30"))
+# Seconds to wait for a free connection when the pool is at its maximum size
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Seconds allowed for establishing a new connection
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+
+def connect():
+    """Open a new, unpooled connection to the PostgreSQL database."""
+    try:
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT,
+            connect_timeout=DB_CONNECT_TIMEOUT,
+            # TCP keepalives let dead sockets of frozen Lambda containers be noticed
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
+        )
+        return conn
+    except Exception as e:
+        logger.error(f"Database connection error: {str(e)}")
+        raise e
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of PostgreSQL connections, reused across warm invocations.
+
+    Idle connections are kept LIFO. A connection idle for longer than
+    health_check_interval is pinged with SELECT 1 before it is handed out, and
+    replaced by a new one if the ping fails. At most max_size connections are
+    open at once; callers wait up to timeout seconds for one to be released.
+    """
+
+    def __init__(self, max_size=DB_POOL_MAX_SIZE, health_check_interval=DB_HEALTH_CHECK_INTERVAL,
+                 timeout=DB_POOL_TIMEOUT, connect_function=connect):
+        self.max_size = max(1, max_size)
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._connect = connect_function
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.stats = {"connects": 0, "reuses": 0, "health_checks": 0, "reconnects": 0}
+
+    def get(self):
+        """
+        Check out a healthy connection, opening one if none is idle.
+
+        Raises:
+            PoolError: If no connection is released within the timeout
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"No database connection available within {self.timeout}s")
+
+        try:
+            while True:
+                with self._lock:
+                    conn, last_used = self._idle.pop() if self._idle else (None, None)
+
+                if conn is None:
+                    conn = self._connect()
+                    self.stats["connects"] += 1
+                    return conn
+
+                if self._is_healthy(conn, last_used):
+                    self.stats["reuses"] += 1
+                    return conn
+
+                logger.warning("Discarding stale database connection")
+                self.stats["reconnects"] += 1
+                self._close_quietly(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def put(self, conn, discard=False):
+        """
+        Return a connection to the pool, rolling back any open transaction.
+
+        Args:
+            conn: Connection obtained from get()
+            discard: Close the connection instead of keeping it
+        """
+        try:
+            if not discard and not conn.closed:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+                return
+        except psycopg2.Error as e:
+            logger.warning(f"Closing database connection that failed to reset: {str(e)}")
+        finally:
+            self._slots.release()
+
+        self._close_quietly(conn)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        self.stats["health_checks"] += 1
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+# Module-level pool shared by the handlers of this Lambda container
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the container's pool, creating it on first use and again after a fork."""
+    global _pool
+    with _pool_lock:
+        # Sockets inherited from a parent process must not be shared; start a fresh pool
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool()
+        return _pool
+
+def get_db_connection():
+    """Check out a connection from the shared pool; hand it back with release_db_connection."""
+    return get_pool().get()
+
+def release_db_connection(conn, discard=False):
+    """Return a connection obtained from get_db_connection to the shared pool."""
+    if conn is None:
+        return
+    # A broken connection is not worth keeping even if the caller did not notice
+    get_pool().put(conn, discard=discard or bool(conn.closed))
+
+def close_pool():
+    """Close all idle pooled connections, e.g. between benchmark runs."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close_all()
+        _pool = None
@@ -0,0 +1,259 @@
+import os
+import sys
+import base64
+import random
+import string
+from functools import lru_cache
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Version of the templates below; bump it whenever they change, since compact
+# notification logs are rendered again from it
+EMAIL_TEMPLATE_VERSION = "1"
+
+# Product cards kept rendered; every user matched to a product shares its card
+EMAIL_CARD_CACHE_SIZE = int(os.environ.get("EMAIL_CARD_CACHE_SIZE", "4096"))
+
+# Longest header line written without folding, as in the email package
+MAX_HEADER_LENGTH = 78
+
+class CompiledTemplate:
+    """
+    Template parsed once into literal text and named slots.
+
+    The source uses str.format syntax ({name} slots, {{ and }} for braces).
+    render() copies the parsed parts and joins them in one pass, and
+    partial() fills some slots ahead of time, merging them into the
+    surrounding literal text.
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source: Template text with {name} slots
+        """
+        parts, slots = [], []
+        for literal, field, _, _ in string.Formatter().parse(source):
+            self._append_literal(parts, slots, literal)
+            if field is not None:
+                slots.append((len(parts), field))
+                parts.append(None)
+        self._parts = parts
+        self._slots = slots
+
+    @staticmethod
+    def _append_literal(parts, slots, literal):
+        # Adjacent literals are merged so rendering joins as few strings as possible
+        if not literal:
+            return
+        if parts and (not slots or slots[-1][0] != len(parts) - 1):
+            parts[-1] += literal
+        else:
+            parts.append(literal)
+
+    @property
+    def fields(self):
+        """Names of the slots still to be filled"""
+        return [field for _, field in self._slots]
+
+    def render(self, values):
+        """
+        Fill every slot.
+
+        Args:
+            values: Dict mapping slot names to text
+
+        Returns:
+            Rendered text
+        """
+        parts = self._parts[:]
+        for position, field in self._slots:
+            parts[position] = values[field]
+        return "".join(parts)
+
+    def partial(self, values):
+        """
+        Fill the slots named in values and keep the others.
+
+        Args:
+            values: Dict mapping some slot names to text
+
+        Returns:
+            New CompiledTemplate with the remaining slots
+        """
+        template = CompiledTemplate.__new__(CompiledTemplate)
+        parts, slots = [], []
+        slot_names = dict(self._slots)
+        for position, part in enumerate(self._parts):
+            field = slot_names.get(position)
+            if field is None:
+                self._append_literal(parts, slots, part)
+            elif field in values:
+                self._append_literal(parts, slots, values[field])
+            else:
+                slots.append((len(parts), field))
+                parts.append(None)
+        template._parts = parts
+        template._slots = slots
+        return template
+
+# Email shell; {loans} receives the concatenated loan cards
+EMAIL_TEMPLATE = CompiledTemplate("""
+<!DOCTYPE html>
+<html>
+<head>
+  <style>
+    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+    .header {{ background-color: #3498db; color: white; padding: 20px; text-align: center; }}
+    .content {{ padding: 20px; }}
+    .loan-item {{ border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }}
+    .loan-name {{ color: #3498db; font-size: 18px; font-weight: bold; }}
+    .loan-provider {{ color: #777; }}
+    .loan-details {{ margin-top: 10px; }}
+    .loan-match {{ background-color: #f8f9fa; padding: 5px 10px; border-radius: 15px; font-size: 14px; }}
+    .footer {{ background-color: #f8f9fa; padding: 20px; text-align: center; font-size: 12px; color: #777; }}
+    .button {{ display: inline-block; background-color: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; }}
+  </style>
+</head>
+<body>
+  <div class="container">
+    <div class="header">
+      <h1>Loan Eligibility Results</h1>
+    </div>
+    <div class="content">
+      <p>Dear {name},</p>
+      <p>We're pleased to inform you that based on your financial profile, you may be eligible for the following loan products:</p>
+{loans}
+      <p>These matches are based on the information you provided. To proceed with any of these options, please visit the lender's website or contact them directly.</p>
+      <p>If you have any questions about these recommendations, feel free to contact our support team.</p>
+      <p>Best regards,<br>Loan Eligibility Engine Team</p>
+    </div>
+    <div class="footer">
+      <p>This is an automated email. Please do not reply directly to this message.</p>
+      <p>© 2023 Loan Eligibility Engine</p>
+    </div>
+  </div>
+</body>
+</html>
+""")
+
+# One loan card; everything but {match_score} depends on the product only
+LOAN_TEMPLATE = CompiledTemplate("""
+      <div class="loan-item">
+        <div class="loan-name">{product_name}</div>
+        <div class="loan-provider">from {provider_name}</div>
+        <div class="loan-details">
+          <p><strong>Interest Rate:</strong> {interest_rate}%</p>
+          <p><strong>Loan Amount:</strong> {min_loan_amount} - {max_loan_amount}</p>
+          <p><strong>Term:</strong> {loan_term_months} months</p>
+          <p><span class="loan-match">Match Score: {match_score}%</span></p>
+        </div>
+      </div>
+""")
+
+# multipart/mixed message with one HTML part, laid out like MIMEMultipart().as_string()
+MESSAGE_TEMPLATE = CompiledTemplate("""Content-Type: multipart/mixed; boundary="{boundary}"
+MIME-Version: 1.0
+Subject: {subject}
+From: {sender}
+To: {recipient}
+
+--{boundary}
+Content-Type: text/html; charset="{charset}"
+MIME-Version: 1.0
+Content-Transfer-Encoding: {encoding}
+
+{payload}
+--{boundary}--
+""")
+
+def format_currency(amount):
+    """Format a number as USD currency."""
+    if amount is None:
+        return "N/A"
+    return "${:,.0f}".format(float(amount))
+
+@lru_cache(maxsize=EMAIL_CARD_CACHE_SIZE)
+def product_card(product_name, provider_name, interest_rate, min_loan_amount, max_loan_amount, loan_term_months):
+    """Loan card of a product with only the match score left to fill"""
+    return LOAN_TEMPLATE.partial({
+        "product_name": str(product_name),
+        "provider_name": str(provider_name),
+        "interest_rate": str(interest_rate),
+        "min_loan_amount": format_currency(min_loan_amount),
+        "max_loan_amount": format_currency(max_loan_amount),
+        "loan_term_months": str(loan_term_months)
+    })
+
+def render_email(user, matches):
+    """
+    Render the subject and HTML body of a user's notification email.
+
+    Args:
+        user: Dict containing user information
+        matches: List of dicts containing loan product matches
+
+    Returns:
+        Tuple of (subject, html_body)
+    """
+    subject = f"Good news! We've found {len(matches)} loan {len(matches) == 1 and 'option' or 'options'} for you"
+
+    cards = []
+    for match in matches:
+        card = product_card(
+            match['product_name'], match['provider_name'], match['interest_rate'],
+            match['min_loan_amount'], match['max_loan_amount'], match['loan_term_months']
+        )
+        cards.append(card.render({"match_score": str(round(float(match['match_score'])))}))
+
+    html_body = EMAIL_TEMPLATE.render({
+        "name": user['email'].split('@')[0],
+        "loans": "".join(cards)
+    })
+    return subject, html_body
+
+def build_raw_message(sender, recipient, subject, html_body):
+    """
+    Build the raw MIME message SES sends for an HTML email.
+
+    Plain ASCII headers that need no folding are written straight from
+    MESSAGE_TEMPLATE; anything else goes through the email package.
+
+    Args:
+        sender: From address
+        recipient: To address
+        subject: Email subject line
+        html_body: HTML content of the email
+
+    Returns:
+        Message text
+    """
+    headers = {"Subject": subject, "From": sender, "To": recipient}
+    simple = all(
+        value.isascii() and "\n" not in value and "\r" not in value and len(name) + 2 + len(value) <= MAX_HEADER_LENGTH
+        for name, value in headers.items()
+    )
+    if not simple:
+        msg = MIMEMultipart()
+        for name, value in headers.items():
+            msg[name] = value
+        msg.attach(MIMEText(html_body, 'html'))
+        return msg.as_string()
+
+    if html_body.isascii():
+        charset, encoding = "us-ascii", "7bit"
+        payload = html_body
+    else:
+        charset, encoding = "utf-8", "base64"
+        payload = base64.encodebytes(html_body.encode("utf-8")).decode("ascii")
+
+    return MESSAGE_TEMPLATE.render({
+        "boundary": "=" * 15 + "%019d" % random.randrange(sys.maxsize) + "==",
+        "subject": subject,
+        "sender": sender,
+        "recipient": recipient,
+        "charset": charset,
+        "encoding": encoding,
+        "payload": payload
+    })
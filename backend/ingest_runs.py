@@ -0,0 +1,232 @@
+import os
+import json
+import uuid
+import logging
+from psycopg2.extras import RealDictCursor, execute_values
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Seconds a claimed range stays leased to its worker; longer than the worker Lambda's timeout
+INGEST_RANGE_LEASE_SECONDS = int(os.environ.get("INGEST_RANGE_LEASE_SECONDS", "360"))
+
+# Attempts of a range before its run is marked 'failed'; Lambda retries a failed asynchronous invocation twice
+INGEST_RANGE_MAX_ATTEMPTS = int(os.environ.get("INGEST_RANGE_MAX_ATTEMPTS", "3"))
+
+def find_run(conn, bucket, key, sequencer):
+    """
+    Look up the run recorded for an S3 upload event.
+
+    Args:
+        conn: Database connection
+        bucket: S3 bucket name
+        key: S3 object key
+        sequencer: Sequencer of the S3 event
+
+    Returns:
+        Dict with batch_id, header_line and status, or None
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT batch_id, header_line, status FROM ingest_runs
+            WHERE bucket = %s AND object_key = %s AND sequencer = %s
+        """, (bucket, key, sequencer))
+        row = cursor.fetchone()
+    conn.commit()
+    return dict(row) if row else None
+
+def register_run(conn, bucket, key, sequencer, header_line, ranges):
+    """
+    Record a split upload and its ranges, unless the event already has a run.
+
+    Args:
+        conn: Database connection
+        bucket: S3 bucket name
+        key: S3 object key
+        sequencer: Sequencer of the S3 event
+        header_line: CSV header line
+        ranges: List of (start, end) byte offsets
+
+    Returns:
+        Dict with batch_id, header_line and status of the event's run
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                INSERT INTO ingest_runs (batch_id, bucket, object_key, sequencer, header_line)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (bucket, object_key, sequencer) DO NOTHING
+                RETURNING batch_id
+            """, (str(uuid.uuid4()), bucket, key, sequencer, header_line))
+            row = cursor.fetchone()
+            if row:
+                execute_values(cursor, """
+                    INSERT INTO ingest_ranges (batch_id, range_start, range_end) VALUES %s
+                """, [(row[0], start, end) for start, end in ranges])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # A concurrent delivery of the same event registered it first
+    return find_run(conn, bucket, key, sequencer)
+
+def unstarted_ranges(conn, batch_id):
+    """
+    List the ranges of a run no worker has claimed yet.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the run
+
+    Returns:
+        List of (start, end) byte offsets
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT range_start, range_end FROM ingest_ranges
+            WHERE batch_id = %s AND status = 'pending'
+            ORDER BY range_start
+        """, (batch_id,))
+        ranges = [(start, end) for start, end in cursor.fetchall()]
+    conn.commit()
+    return ranges
+
+def claim_range(conn, batch_id, start, lease_seconds=INGEST_RANGE_LEASE_SECONDS):
+    """
+    Mark a range running for this attempt.
+
+    A range can be claimed when it is pending, failed, or running under an
+    expired lease (its worker timed out); a duplicate delivery of a range
+    that is done or still leased claims nothing.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the run
+        start: Start offset of the range
+        lease_seconds: Seconds after which a running range can be claimed again
+
+    Returns:
+        True when the range was claimed
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE ingest_ranges r
+                SET status = 'running', attempts = r.attempts + 1, started_at = NOW(), error = NULL
+                FROM ingest_runs u
+                WHERE r.batch_id = %s AND r.range_start = %s
+                AND u.batch_id = r.batch_id AND u.status = 'running'
+                AND (r.status IN ('pending', 'failed')
+                     OR (r.status = 'running' AND r.started_at < NOW() - make_interval(secs => %s)))
+            """, (batch_id, start, lease_seconds))
+            claimed = cursor.rowcount == 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return claimed
+
+def finish_range(conn, batch_id, start, summary):
+    """
+    Record the summary of a loaded range.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the run
+        start: Start offset of the range
+        summary: ingest_users summary of the range
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE ingest_ranges
+                SET status = 'done', summary = %s, finished_at = NOW()
+                WHERE batch_id = %s AND range_start = %s
+            """, (json.dumps(summary), batch_id, start))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def fail_range(conn, batch_id, start, error, max_attempts=INGEST_RANGE_MAX_ATTEMPTS):
+    """
+    Record a failed attempt; the run fails with it once the range has used max_attempts.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the run
+        start: Start offset of the range
+        error: Error message
+        max_attempts: Attempts before the run is marked 'failed'
+
+    Returns:
+        True when the run was marked 'failed'
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE ingest_ranges SET status = 'failed', error = %s, finished_at = NOW()
+                WHERE batch_id = %s AND range_start = %s
+                RETURNING attempts
+            """, (error, batch_id, start))
+            row = cursor.fetchone()
+            run_failed = bool(row) and row[0] >= max_attempts
+            if run_failed:
+                cursor.execute("""
+                    UPDATE ingest_runs SET status = 'failed', finished_at = NOW()
+                    WHERE batch_id = %s AND status = 'running'
+                """, (batch_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if run_failed:
+        logger.error(f"Ingest run {batch_id} failed: range at byte {start} failed {max_attempts} times: {error}")
+    return run_failed
+
+def complete_run(conn, batch_id, merge):
+    """
+    Close a run once all of its ranges are done.
+
+    Every worker calls this after finish_range. The run row is locked, so of
+    workers finishing together exactly one sees every range done and closes
+    the run.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the run
+        merge: Function combining the range summaries into one
+
+    Returns:
+        Merged summary when this call closed the run, otherwise None
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT 1 FROM ingest_runs WHERE batch_id = %s AND status = 'running' FOR UPDATE", (batch_id,))
+            if cursor.fetchone() is None:
+                conn.commit()
+                return None
+
+            cursor.execute("""
+                SELECT status, summary FROM ingest_ranges
+                WHERE batch_id = %s
+                ORDER BY range_start
+            """, (batch_id,))
+            ranges = cursor.fetchall()
+            if any(status != "done" for status, _ in ranges):
+                conn.commit()
+                return None
+
+            summary = merge([range_summary for _, range_summary in ranges])
+            cursor.execute("""
+                UPDATE ingest_runs SET status = 'done', summary = %s, finished_at = NOW()
+                WHERE batch_id = %s
+            """, (json.dumps(summary), batch_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return summary
@@ -0,0 +1,286 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional
+from token_bucket import TokenBucket
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Seconds to wait for a connection, and for each read of the response
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "30"))
+
+# Attempts per request, including the first
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "4"))
+
+# Exponential backoff between attempts: full jitter over base * 2^attempt seconds, capped at max.
+# A Retry-After longer than the cap is not waited for; the request fails as transient instead.
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "20"))
+
+# Per-minute budget shared by all threads of the container; 0 disables the limit
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "0"))
+
+# Consecutive failed attempts that open the circuit, and seconds it stays open before a trial request
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Statuses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+class TransientLLMError(Exception):
+    """The API could not answer now (timeout, rate limit, server error); the request can be retried later."""
+
+class CircuitOpenError(TransientLLMError):
+    """The circuit breaker is open, so the request was not sent."""
+
+class PermanentLLMError(Exception):
+    """The API rejected the request (bad credentials, malformed request) or cannot be called; retrying will not help."""
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker over consecutive failed attempts.
+
+    After failure_threshold consecutive failures the circuit opens and
+    allow() raises CircuitOpenError for reset_seconds. Then one trial
+    request is let through: its success closes the circuit, its failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit; 0 or less disables it
+            reset_seconds: Seconds the circuit stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half-open'"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self._opened_at < self.reset_seconds else "half-open"
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError(f"Circuit open for another {max(remaining, 0):.1f}s after {self._failures} consecutive failures")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+                if self._opened_at is None or self._trial:
+                    logger.warning(f"Opening the LLM circuit after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+class LLMClient:
+    """
+    Shared HTTP client for the AI APIs.
+
+    Requests go through one pooled keep-alive requests.Session with connect
+    and read timeouts. Timeouts, connection errors and RETRY_STATUSES are
+    retried with jittered exponential backoff, waiting at least the
+    Retry-After the API asks for; a 429 pauses every thread of the client,
+    not just the one that got it. Requests and tokens per minute are kept
+    under budget with token buckets, and a circuit breaker fails fast while
+    the API keeps failing. When a request cannot succeed now it raises
+    TransientLLMError, so the caller can leave the work queued; other HTTP
+    errors raise PermanentLLMError, so the caller can fail the work visibly.
+    """
+
+    def __init__(self, max_attempts: int = LLM_MAX_ATTEMPTS, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT, backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, breaker: Optional[CircuitBreaker] = None,
+                 pool_size: int = 10):
+        """
+        Args:
+            max_attempts: Attempts per request, including the first
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for each read of the response
+            backoff_base: Backoff ceiling of the first retry, doubled on each retry
+            backoff_max: Longest wait between attempts
+            requests_per_minute: Request budget; 0 disables it
+            tokens_per_minute: Prompt plus completion token budget; 0 disables it
+            breaker: Circuit breaker; defaults to one configured from the environment
+            pool_size: Keep-alive connections kept per host, at least the request concurrency
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = (connect_timeout, read_timeout)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.requests_budget = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tokens_budget = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Return attempt, retry, failure and wait counters accumulated since the last reset"""
+        with self._lock:
+            return dict(self.stats)
+
+    def reset_stats(self):
+        """Reset the attempt, retry, failure and wait counters"""
+        with self._lock:
+            self.stats = {
+                "attempts": 0,
+                "retries": 0,
+                "timeouts": 0,
+                "throttled": 0,
+                "server_errors": 0,
+                "transient_failures": 0,
+                "permanent_failures": 0,
+                "circuit_rejections": 0,
+                "budget_wait_seconds": 0.0,
+                "backoff_seconds": 0.0
+            }
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                  estimated_tokens: int = 0) -> Dict[str, Any]:
+        """
+        POST a JSON payload and return the decoded JSON answer.
+
+        Args:
+            url: Endpoint URL
+            payload: JSON request body
+            headers: Extra request headers
+            estimated_tokens: Tokens the request is expected to use, taken from the token budget
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            TransientLLMError: Retries are exhausted, Retry-After is too long or the circuit is open
+            PermanentLLMError: The API rejected the request with a status that is not worth retrying
+        """
+        error = "no attempt made"
+        for attempt in range(self.max_attempts):
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                self._count("circuit_rejections")
+                raise
+
+            self._wait_for_pause()
+            waited = self.requests_budget.acquire() + self._acquire_tokens(estimated_tokens)
+            self._count("budget_wait_seconds", waited)
+
+            self._count("attempts")
+            retry_after = None
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except requests.Timeout as e:
+                self._count("timeouts")
+                error = f"timeout: {e}"
+            except requests.ConnectionError as e:
+                error = f"connection error: {e}"
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    # Anything else is an answer: a permanent error says nothing about the API's health
+                    self.breaker.record_success()
+                    if response.status_code >= 400:
+                        self._count("permanent_failures")
+                        raise PermanentLLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                    return response.json()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    self._count("throttled")
+                    self._pause(retry_after)
+                else:
+                    self._count("server_errors")
+                error = f"HTTP {response.status_code}"
+
+            self.breaker.record_failure()
+            if attempt + 1 == self.max_attempts:
+                break
+            if retry_after is not None and retry_after > self.backoff_max:
+                error = f"{error}, Retry-After {retry_after:.0f}s is longer than {self.backoff_max:.0f}s"
+                break
+
+            delay = max(retry_after or 0.0, random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            self._count("retries")
+            self._count("backoff_seconds", delay)
+            time.sleep(delay)
+
+        self._count("transient_failures")
+        raise TransientLLMError(f"{error} after {attempt + 1} attempt(s)")
+
+    def record_tokens(self, estimated_tokens: int, actual_tokens: int):
+        """Take the tokens a request used beyond its estimate from the token budget"""
+        if actual_tokens > estimated_tokens:
+            self._count("budget_wait_seconds", self._acquire_tokens(actual_tokens - estimated_tokens))
+
+    def _acquire_tokens(self, tokens: int) -> float:
+        # A request bigger than the whole bucket only waits for a full bucket
+        return self.tokens_budget.acquire(min(tokens, self.tokens_budget.capacity)) if tokens else 0.0
+
+    def _pause(self, seconds: Optional[float]):
+        """Hold every thread back for seconds (at most backoff_max) after a 429"""
+        if not seconds:
+            return
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + min(seconds, self.backoff_max))
+
+    def _wait_for_pause(self):
+        with self._lock:
+            delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            self._count("budget_wait_seconds", delay)
+            time.sleep(delay)
@@ -0,0 +1,340 @@
+import os
+import logging
+import numpy as np
+from io import StringIO
+from psycopg2.extras import RealDictCursor, execute_values
+from product_index import BORDERLINE_CREDIT_BAND, BORDERLINE_INCOME_RATIO
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Seconds a claimed job stays leased to its worker; longer than a worker takes for one claim
+LLM_JOB_LEASE_SECONDS = int(os.environ.get("LLM_JOB_LEASE_SECONDS", "300"))
+
+# Attempts before a job the API keeps failing on is marked 'failed'
+LLM_JOB_MAX_ATTEMPTS = int(os.environ.get("LLM_JOB_MAX_ATTEMPTS", "5"))
+
+# Delay before retrying a deferred job, doubled per attempt up to an hour
+LLM_JOB_RETRY_SECONDS = int(os.environ.get("LLM_JOB_RETRY_SECONDS", "60"))
+
+# Days finished jobs are kept; a pair is not queued again while its job is kept
+LLM_JOB_RETENTION_DAYS = int(os.environ.get("LLM_JOB_RETENTION_DAYS", "7"))
+
+def enqueue_jobs(cursor, user_ids, product_ids, batch_id):
+    """
+    Queue pairs for LLM evaluation, skipping pairs that already have a job.
+
+    Runs in the caller's transaction, so jobs are queued atomically with the
+    matches of the same run. Pairs are streamed with COPY into a temporary
+    staging table, like matching_engine.insert_matches.
+
+    Args:
+        cursor: Database cursor
+        user_ids: Array of user IDs
+        product_ids: Array of product IDs
+        batch_id: Upload batch of the users
+
+    Returns:
+        Number of jobs queued
+    """
+    if not len(user_ids):
+        return 0
+
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS llm_jobs_staging (
+            user_id INTEGER,
+            product_id INTEGER
+        ) ON COMMIT DELETE ROWS
+    """)
+
+    buffer = StringIO()
+    np.savetxt(buffer, np.column_stack((user_ids, product_ids)), fmt="%d", delimiter=",")
+    buffer.seek(0)
+    cursor.copy_expert("COPY llm_jobs_staging (user_id, product_id) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    cursor.execute("""
+        INSERT INTO llm_jobs (user_id, product_id, batch_id)
+        SELECT user_id, product_id, %s FROM llm_jobs_staging
+        ORDER BY user_id, product_id
+        ON CONFLICT (user_id, product_id) DO NOTHING
+    """, (batch_id,))
+    queued = cursor.rowcount
+    cursor.execute("TRUNCATE llm_jobs_staging")
+    return queued
+
+def enqueue_borderline_jobs(cursor, batch_id):
+    """
+    Queue every borderline pair of a batch that has no match, in one statement.
+
+    Used with MATCHING_MODE=sql, where no pre-scorer runs at matching time:
+    the band is the one of matching_engine.find_borderline_pairs, and the
+    worker pre-scores the jobs before asking the LLM. Runs in the caller's
+    transaction.
+
+    Args:
+        cursor: Database cursor
+        batch_id: Upload batch of the users
+
+    Returns:
+        Number of jobs queued
+    """
+    cursor.execute("""
+        INSERT INTO llm_jobs (user_id, product_id, batch_id)
+        SELECT u.user_id, lp.product_id, u.batch_id
+        FROM users u
+        JOIN loan_products lp
+          ON u.credit_score BETWEEN lp.min_credit_score - %s AND lp.min_credit_score
+          AND u.monthly_income >= lp.min_monthly_income * %s
+        WHERE u.batch_id = %s
+        AND NOT EXISTS (
+            SELECT 1 FROM match_keys k
+            WHERE k.user_id = u.user_id AND k.product_id = lp.product_id
+        )
+        ORDER BY u.user_id, lp.product_id
+        ON CONFLICT (user_id, product_id) DO NOTHING
+    """, (BORDERLINE_CREDIT_BAND, BORDERLINE_INCOME_RATIO, batch_id))
+    return cursor.rowcount
+
+def release_expired_leases(conn):
+    """
+    Put running jobs whose lease expired back in the queue.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Number of jobs released
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE llm_jobs
+                SET status = 'pending', locked_by = NULL, locked_until = NULL
+                WHERE job_id IN (
+                    SELECT job_id FROM llm_jobs
+                    WHERE status = 'running' AND locked_until < NOW()
+                    FOR UPDATE SKIP LOCKED
+                )
+            """)
+            released = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if released:
+        logger.info(f"Released {released} LLM jobs with expired leases")
+    return released
+
+def claim_jobs(conn, worker_id, limit, lease_seconds=LLM_JOB_LEASE_SECONDS, batch_id=None):
+    """
+    Lease up to limit ready jobs to a worker, oldest first.
+
+    FOR UPDATE SKIP LOCKED makes concurrent claims take disjoint jobs without
+    waiting on each other. The claim is committed before the jobs are
+    processed, so no transaction stays open during the LLM calls.
+
+    Args:
+        conn: Database connection
+        worker_id: Identifier of the claiming worker
+        limit: Maximum number of jobs
+        lease_seconds: Seconds before unfinished jobs can be claimed by another worker
+        batch_id: Only claim jobs of this upload batch
+
+    Returns:
+        List of dicts with job_id, user_id, product_id and attempts
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        try:
+            cursor.execute("""
+                WITH claimable AS (
+                    SELECT job_id FROM llm_jobs
+                    WHERE status = 'pending' AND available_at <= NOW()
+                    AND (%s::varchar IS NULL OR batch_id = %s)
+                    ORDER BY available_at, job_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE llm_jobs j
+                SET status = 'running',
+                    locked_by = %s,
+                    locked_until = NOW() + make_interval(secs => %s),
+                    attempts = j.attempts + 1
+                FROM claimable c
+                WHERE j.job_id = c.job_id
+                RETURNING j.job_id, j.user_id, j.product_id, j.attempts
+            """, (batch_id, batch_id, limit, worker_id, lease_seconds))
+            jobs = [dict(row) for row in cursor.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return sorted(jobs, key=lambda job: job["job_id"])
+
+def complete_jobs(conn, worker_id, verdicts):
+    """
+    Record the verdicts of finished jobs still leased to the worker.
+
+    Args:
+        conn: Database connection
+        worker_id: Identifier of the worker that claimed the jobs
+        verdicts: List of (job_id, eligible, confidence, reason) tuples
+
+    Returns:
+        Number of jobs completed (jobs whose lease was taken over are skipped)
+    """
+    if not verdicts:
+        return 0
+
+    with conn.cursor() as cursor:
+        try:
+            execute_values(cursor, """
+                UPDATE llm_jobs AS j
+                SET status = 'done',
+                    eligible = v.eligible,
+                    confidence = v.confidence,
+                    reason = v.reason,
+                    locked_by = NULL,
+                    locked_until = NULL,
+                    finished_at = NOW()
+                FROM (VALUES %s) AS v (job_id, eligible, confidence, reason, worker_id)
+                WHERE j.job_id = v.job_id AND j.status = 'running' AND j.locked_by = v.worker_id
+            """, [(job_id, eligible, confidence, reason, worker_id) for job_id, eligible, confidence, reason in verdicts],
+                template="(%s::bigint, %s::boolean, %s::numeric, %s::text, %s::varchar)", page_size=1000)
+            completed = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return completed
+
+def retry_jobs(conn, worker_id, job_ids, error, max_attempts=LLM_JOB_MAX_ATTEMPTS, retry_seconds=LLM_JOB_RETRY_SECONDS):
+    """
+    Put jobs the API could not answer now back in the queue with backoff.
+
+    A job is retried retry_seconds * 2^(attempts - 1) seconds later, at most an
+    hour; once it has been attempted max_attempts times it is marked 'failed'
+    with the error instead.
+
+    Args:
+        conn: Database connection
+        worker_id: Identifier of the worker that claimed the jobs
+        job_ids: IDs of the jobs to retry
+        error: Reason the jobs could not be evaluated
+        max_attempts: Attempts before a job fails
+        retry_seconds: Delay before the first retry
+
+    Returns:
+        Tuple of (jobs requeued, jobs failed)
+    """
+    if not job_ids:
+        return 0, 0
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE llm_jobs
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    available_at = NOW() + make_interval(secs => LEAST(3600, %s * power(2, attempts - 1))),
+                    reason = %s,
+                    locked_by = NULL,
+                    locked_until = NULL,
+                    finished_at = CASE WHEN attempts >= %s THEN NOW() END
+                WHERE job_id = ANY(%s) AND status = 'running' AND locked_by = %s
+                RETURNING status
+            """, (max_attempts, retry_seconds, error, max_attempts, list(job_ids), worker_id))
+            statuses = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    failed = statuses.count("failed")
+    if failed:
+        logger.warning(f"{failed} LLM jobs failed after {max_attempts} attempts: {error}")
+    return len(statuses) - failed, failed
+
+def fail_jobs(conn, worker_id, job_ids, error):
+    """
+    Mark jobs that can never succeed as failed, e.g. when the user or product is gone.
+
+    Args:
+        conn: Database connection
+        worker_id: Identifier of the worker that claimed the jobs
+        job_ids: IDs of the jobs
+        error: Reason recorded on the jobs
+
+    Returns:
+        Number of jobs failed
+    """
+    if not job_ids:
+        return 0
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE llm_jobs
+                SET status = 'failed', reason = %s, locked_by = NULL, locked_until = NULL, finished_at = NOW()
+                WHERE job_id = ANY(%s) AND status = 'running' AND locked_by = %s
+            """, (error, list(job_ids), worker_id))
+            failed = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return failed
+
+def get_queue_stats(conn, batch_id=None):
+    """
+    Read queue depth and throughput from the llm_queue_stats view.
+
+    Args:
+        conn: Database connection
+        batch_id: Count only the jobs of this upload batch, by status
+
+    Returns:
+        Dict of counts
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        if batch_id is None:
+            cursor.execute("SELECT * FROM llm_queue_stats")
+            return dict(cursor.fetchone())
+
+        cursor.execute("""
+            SELECT status, COUNT(*) AS jobs FROM llm_jobs
+            WHERE batch_id = %s
+            GROUP BY status
+        """, (batch_id,))
+        counts = {row["status"]: row["jobs"] for row in cursor.fetchall()}
+        return {status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")}
+
+def purge_finished_jobs(conn, days=LLM_JOB_RETENTION_DAYS):
+    """
+    Delete done and failed jobs finished more than days ago.
+
+    Args:
+        conn: Database connection
+        days: Days finished jobs are kept
+
+    Returns:
+        Number of jobs deleted
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                DELETE FROM llm_jobs
+                WHERE status IN ('done', 'failed') AND finished_at < NOW() - make_interval(days => %s)
+            """, (days,))
+            purged = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if purged:
+        logger.info(f"Purged {purged} LLM jobs finished more than {days} days ago")
+    return purged
@@ -0,0 +1,247 @@
+import re
+import ast
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Outcomes of a parse, counted by AIEligibilityChecker as parse_<outcome>
+FAST = "fast"  # the answer was exactly the expected JSON
+FALLBACK = "fallback"  # recovered from a code fence, surrounding text, loose types or truncated output
+FAILED = "failed"  # no verdict could be read
+
+# Markdown code fence; blocks are found with str.find, which is several times faster than a lazy DOTALL pattern
+FENCE = "```"
+
+# Fields of a verdict written as JSON, or as a Python dict with single quotes
+ELIGIBLE_PATTERN = re.compile(r"""["']eligible["']\s*:\s*["']?(true|false|yes|no)\b""", re.IGNORECASE)
+CONFIDENCE_PATTERN = re.compile(r"""["']confidence["']\s*:\s*["']?(\d+(?:\.\d+)?)""", re.IGNORECASE)
+# The reason string up to its closing quote, or to the end of truncated output
+REASON_PATTERN = re.compile(r"""["']reason["']\s*:\s*"((?:[^"\\]|\\.)*)""", re.IGNORECASE | re.DOTALL)
+
+BOOLEAN_WORDS = {"true": True, "yes": True, "false": False, "no": False}
+
+DEFAULT_REASON = "No reason provided"
+
+_DECODER = json.JSONDecoder()
+
+# JSON Schema of a single verdict, for the APIs' structured-output modes
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "eligible": {"type": "boolean"},
+        "confidence": {"type": "number"},
+        "reason": {"type": "string"}
+    },
+    "required": ["eligible", "confidence", "reason"],
+    "additionalProperties": False
+}
+
+# JSON Schema of packed verdicts: an object, since JSON modes require one at the top level
+PACKED_VERDICTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdicts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, **VERDICT_SCHEMA["properties"]},
+                "required": ["id", *VERDICT_SCHEMA["required"]],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["verdicts"],
+    "additionalProperties": False
+}
+
+def gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a JSON Schema to the OpenAPI subset Gemini's responseSchema accepts"""
+    converted = {"type": schema["type"].upper()}
+    if "properties" in schema:
+        converted["properties"] = {name: gemini_schema(value) for name, value in schema["properties"].items()}
+        converted["required"] = list(schema["required"])
+    if "items" in schema:
+        converted["items"] = gemini_schema(schema["items"])
+    return converted
+
+def _coerce(item: Any) -> Optional[Tuple[Tuple[bool, float, str], bool]]:
+    """
+    Validate a decoded verdict object.
+
+    Returns:
+        Tuple of (eligible, confidence, reason) and whether the types were
+        already right, or None when eligible or a 0-100 confidence is missing
+    """
+    if not isinstance(item, dict):
+        return None
+
+    eligible = item.get("eligible")
+    confidence = item.get("confidence")
+    if type(eligible) is bool and type(confidence) in (int, float) and 0 <= confidence <= 100:
+        return (eligible, float(confidence), str(item.get("reason") or DEFAULT_REASON)), True
+
+    if isinstance(eligible, str):
+        eligible = BOOLEAN_WORDS.get(eligible.strip().lower())
+    if not isinstance(eligible, bool):
+        return None
+    if isinstance(confidence, str):
+        try:
+            confidence = float(confidence.strip().rstrip("%"))
+        except ValueError:
+            return None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 100:
+        return None
+
+    return (eligible, float(confidence), str(item.get("reason") or DEFAULT_REASON)), False
+
+def _fenced_blocks(content: str) -> Iterable[str]:
+    """Yield the body of each code fence, the last one possibly cut off before its closing fence"""
+    start = content.find(FENCE)
+    while start != -1:
+        body = start + len(FENCE)
+        line_end = content.find("\n", body)
+        # Skip a language tag such as json
+        if line_end != -1 and content[body:line_end].strip().isalpha():
+            body = line_end + 1
+        end = content.find(FENCE, body)
+        yield content[body:end if end != -1 else len(content)]
+        if end == -1:
+            return
+        start = content.find(FENCE, end + len(FENCE))
+
+def _candidates(content: str) -> Iterable[str]:
+    """Yield the texts a JSON answer may be hidden in: fenced blocks, then the outermost braces or brackets"""
+    yield from _fenced_blocks(content)
+    for opening, closing in ("{}", "[]"):
+        start, end = content.find(opening), content.rfind(closing)
+        if 0 <= start < end:
+            yield content[start:end + 1]
+
+def _loads(text: str) -> Tuple[Any, bool]:
+    """Decode text as JSON; returns (value, True) or (None, False)"""
+    try:
+        return _DECODER.decode(text), True
+    except ValueError:
+        return None, False
+
+def _loads_loose(text: str) -> Tuple[Any, bool]:
+    """Decode text as JSON, or as a Python literal (single quotes, True/False) some models print instead"""
+    value, decoded = _loads(text)
+    if decoded or "'" not in text:
+        return value, decoded
+    try:
+        return ast.literal_eval(text.strip()), True
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None, False
+
+def _starts_like_json(content: str) -> bool:
+    """Whether the answer is worth decoding as a whole; a failed decode of prose costs more than this check"""
+    return content[:1] in ("{", "[") or content.lstrip()[:1] in ("{", "[")
+
+def parse_verdict(content: str) -> Tuple[Optional[Tuple[bool, float, str]], str]:
+    """
+    Parse a single-pair verdict.
+
+    The fast path decodes the whole answer, which native JSON modes
+    guarantee. Otherwise the JSON is looked for in code fences and between
+    the outermost braces, and as a last resort the fields are read with
+    regular expressions, which also recovers output cut off mid-reason.
+
+    Args:
+        content: Text of the answer
+
+    Returns:
+        Tuple of ((eligible, confidence, reason) or None, outcome)
+    """
+    content = content or ""
+    if _starts_like_json(content):
+        value, decoded = _loads(content)
+        result = _coerce(value) if decoded else None
+        if result:
+            verdict, strict = result
+            return verdict, FAST if strict else FALLBACK
+
+    for candidate in _candidates(content):
+        value, decoded = _loads_loose(candidate)
+        result = _coerce(value) if decoded else None
+        if result:
+            return result[0], FALLBACK
+
+    eligible = ELIGIBLE_PATTERN.search(content)
+    if not eligible:
+        return None, FAILED
+    confidence = CONFIDENCE_PATTERN.search(content)
+    reason = REASON_PATTERN.search(content)
+    confidence = float(confidence.group(1)) if confidence else 0.0
+    if confidence > 100:
+        return None, FAILED
+    if reason:
+        reason_text, decoded = _loads(f'"{reason.group(1)}"')
+        reason = reason_text if decoded else reason.group(1)
+    return (BOOLEAN_WORDS[eligible.group(1).lower()], confidence, reason or DEFAULT_REASON), FALLBACK
+
+def _salvage_objects(content: str) -> List[Any]:
+    """Decode every complete JSON object in content, skipping a truncated tail"""
+    items = []
+    position = content.find("{")
+    while position != -1:
+        try:
+            item, end = _DECODER.raw_decode(content, position)
+        except ValueError:
+            position = content.find("{", position + 1)
+            continue
+        if isinstance(item, dict) and isinstance(item.get("verdicts"), list):
+            items.extend(item["verdicts"])
+        else:
+            items.append(item)
+        position = content.find("{", end)
+    return items
+
+def _verdict_items(value: Any) -> Optional[List[Any]]:
+    """Return the list of verdicts of a decoded packed answer: an array, or an object with a verdicts array"""
+    if isinstance(value, dict):
+        value = value.get("verdicts")
+    return value if isinstance(value, list) else None
+
+def parse_verdicts(content: str, case_ids: set) -> Tuple[Dict[str, Tuple[bool, float, str]], str]:
+    """
+    Parse packed verdicts, keeping only well-formed items for known case IDs.
+
+    Accepts a JSON array or an object with a verdicts array (the shape JSON
+    modes produce), bare or in a code fence. When the output was cut off,
+    the complete verdicts before the cut are kept.
+
+    Args:
+        content: Text of the answer
+        case_ids: IDs of the cases in the request
+
+    Returns:
+        Tuple of (dict mapping case ID to (eligible, confidence, reason), outcome)
+    """
+    content = content or ""
+    items = None
+    if _starts_like_json(content):
+        value, decoded = _loads(content)
+        items = _verdict_items(value) if decoded else None
+    outcome = FAST
+
+    if items is None:
+        outcome = FALLBACK
+        for candidate in _candidates(content):
+            value, decoded = _loads_loose(candidate)
+            items = _verdict_items(value) if decoded else None
+            if items is not None:
+                break
+        else:
+            items = _salvage_objects(content)
+
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("id") not in case_ids:
+            continue
+        result = _coerce(item)
+        if result:
+            verdicts[item["id"]] = result[0]
+            if not result[1]:
+                outcome = FALLBACK
+
+    return verdicts, outcome if verdicts else FAILED
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import logging
+from ai_eligibility_lambda import evaluate_pairs
+from llm_client import PermanentLLMError
+from llm_jobs import (
+    release_expired_leases, claim_jobs, complete_jobs, retry_jobs, fail_jobs,
+    get_queue_stats, purge_finished_jobs, LLM_JOB_LEASE_SECONDS
+)
+from db import get_db_connection, release_db_connection
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Jobs claimed and evaluated together; evaluate_pairs sends their AI requests concurrently
+LLM_JOB_CLAIM_SIZE = int(os.environ.get("LLM_JOB_CLAIM_SIZE", "50"))
+
+# A worker stops claiming when less than this many seconds of its invocation remain
+LLM_WORKER_STOP_SECONDS = float(os.environ.get("LLM_WORKER_STOP_SECONDS", "60"))
+
+def run_worker(conn, worker_id, batch_id=None, max_jobs=None, deadline=None,
+               claim_size=LLM_JOB_CLAIM_SIZE, lease_seconds=LLM_JOB_LEASE_SECONDS):
+    """
+    Drain the LLM job queue until it is empty, max_jobs are done or time runs out.
+
+    Each round releases expired leases, claims claim_size jobs and evaluates
+    them with evaluate_pairs. Eligible verdicts become matches; every verdict
+    is kept on its job, so ineligible pairs are not inserted as matches and
+    never notified. Jobs the API failed on transiently are requeued with
+    backoff; when the API rejects requests outright, e.g. for a bad key, the
+    round's jobs are failed with the error and the worker stops. Any number of workers can run at once: claims never overlap, and
+    a worker that dies leaves its jobs to be claimed again when the lease
+    expires. evaluate_pairs writes verdicts idempotently, and the verdict
+    cache answers a job evaluated twice.
+
+    Args:
+        conn: Database connection
+        worker_id: Identifier recorded on the claimed jobs
+        batch_id: Only process jobs of this upload batch
+        max_jobs: Stop after claiming this many jobs
+        deadline: time.monotonic() value to stop claiming at
+        claim_size: Jobs claimed per round
+        lease_seconds: Lease of each claim
+
+    Returns:
+        Dict of job counts, AI request counters and elapsed time
+    """
+    started = time.monotonic()
+    summary = {"claimed": 0, "completed": 0, "eligible": 0, "requeued": 0, "failed": 0, "rounds": 0}
+    ai_stats = {}
+
+    while max_jobs is None or summary["claimed"] < max_jobs:
+        if deadline is not None and deadline - time.monotonic() < LLM_WORKER_STOP_SECONDS:
+            logger.info(f"Worker {worker_id} stopping with {deadline - time.monotonic():.0f}s left")
+            break
+
+        release_expired_leases(conn)
+        limit = claim_size if max_jobs is None else min(claim_size, max_jobs - summary["claimed"])
+        jobs = claim_jobs(conn, worker_id, limit, lease_seconds, batch_id)
+        if not jobs:
+            break
+        summary["claimed"] += len(jobs)
+        summary["rounds"] += 1
+
+        job_ids = {(job["user_id"], job["product_id"]): job["job_id"] for job in jobs}
+        try:
+            result = evaluate_pairs(conn, list(job_ids), insert_ineligible=False)
+        except PermanentLLMError as e:
+            # Retrying cannot help: fail the jobs visibly instead of recording rejections
+            conn.rollback()
+            summary["failed"] += fail_jobs(conn, worker_id, list(job_ids.values()), f"AI API error: {e}")
+            logger.error(f"Worker {worker_id} stopping: {e}")
+            break
+        for name, value in result["ai_stats"].items():
+            if isinstance(value, (int, float)):
+                ai_stats[name] = ai_stats.get(name, 0) + value
+
+        verdicts = [
+            (job_ids[(item["user_id"], item["product_id"])], item["eligible"], item["confidence"], item["reason"])
+            for item in result["results"]
+        ]
+        summary["completed"] += complete_jobs(conn, worker_id, verdicts)
+        summary["eligible"] += result["eligible"]
+
+        requeued, failed = retry_jobs(
+            conn, worker_id,
+            [job_ids[(item["user_id"], item["product_id"])] for item in result["deferred"]],
+            "AI API temporarily unavailable"
+        )
+        summary["requeued"] += requeued
+        summary["failed"] += failed + fail_jobs(
+            conn, worker_id,
+            [job_ids[(item["user_id"], item["product_id"])] for item in result["not_found"]],
+            "User or loan product not found"
+        )
+
+        if result["deferred"] and not result["results"]:
+            # The API is down: leave the rest of the queue to a later invocation
+            logger.warning(f"Worker {worker_id} stopping: every AI request of the round was deferred")
+            break
+
+    summary["ai_stats"] = ai_stats
+    summary["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"Worker {worker_id} finished: {summary}")
+    return summary
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler for an LLM queue worker.
+
+    Runs every minute on a schedule, and on demand from the matches workflow,
+    which invokes it asynchronously and polls llm_jobs for its batch. Several
+    invocations can run at once; each works until the queue is empty or its
+    time is nearly up, then purges old finished jobs.
+
+    Args:
+        event: Scheduled event or request body; an optional batch_id limits the
+               worker to one upload batch and max_jobs caps the jobs claimed
+        context: AWS Lambda context
+
+    Returns:
+        Dict with status, the worker summary and the queue stats
+    """
+    try:
+        body = event.get("body", event)
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
+        batch_id = body.get("batch_id")
+        max_jobs = body.get("max_jobs")
+
+        worker_id = getattr(context, "aws_request_id", None) or f"worker-{os.getpid()}"
+        deadline = None
+        if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000
+
+        conn = get_db_connection()
+        try:
+            summary = run_worker(conn, worker_id, batch_id, int(max_jobs) if max_jobs else None, deadline)
+            purge_finished_jobs(conn)
+            queue = get_queue_stats(conn, batch_id)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "status": "success",
+                "worker_id": worker_id,
+                "batch_id": batch_id,
+                **summary,
+                "queue": queue
+            }, default=str)
+        }
+
+    except Exception as e:
+        logger.error(f"LLM worker error: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "status": "error",
+                "message": str(e)
+            })
+        }
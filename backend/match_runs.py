@@ -0,0 +1,72 @@
+import json
+import logging
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def start_run(conn, batch_id, run_id):
+    """
+    Record a matching run as running; a retried invocation restarts its run.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID being matched
+        run_id: Identifier of the run chosen by the caller
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                INSERT INTO match_runs (batch_id, run_id) VALUES (%s, %s)
+                ON CONFLICT (batch_id, run_id) DO UPDATE
+                SET status = 'running', summary = NULL, error = NULL,
+                    started_at = NOW(), finished_at = NULL
+            """, (batch_id, run_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def finish_run(conn, batch_id, run_id, summary):
+    """
+    Record the summary of a finished matching run.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID that was matched
+        run_id: Identifier of the run
+        summary: Matching summary
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE match_runs SET status = 'done', summary = %s, finished_at = NOW()
+                WHERE batch_id = %s AND run_id = %s
+            """, (json.dumps(summary), batch_id, run_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def fail_run(conn, batch_id, run_id, error):
+    """
+    Record the error of a failed matching run.
+
+    Args:
+        conn: Database connection
+        batch_id: Batch ID being matched
+        run_id: Identifier of the run
+        error: Error message
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                UPDATE match_runs SET status = 'failed', error = %s, finished_at = NOW()
+                WHERE batch_id = %s AND run_id = %s
+            """, (error, batch_id, run_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logger.error(f"Matching run {run_id} of batch {batch_id} failed: {error}")
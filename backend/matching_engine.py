@@ -0,0 +1,411 @@
+import os
+import json
+import logging
+import numpy as np
+from io import StringIO
+from product_index import ProductIndex, BORDERLINE_CREDIT_BAND, BORDERLINE_INCOME_RATIO
+from pre_scorer import score_pairs, triage, employment_points, APPROVE, ASK_LLM, PRE_SCORE_REASON
+from llm_jobs import enqueue_jobs, enqueue_borderline_jobs
+from match_runs import start_run, finish_run, fail_run
+from db import get_db_connection, release_db_connection
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 'engine' evaluates the rules in this Lambda, 'sql' runs the match_batch() function in PostgreSQL
+MATCHING_MODE = os.environ.get("MATCHING_MODE", "engine")
+
+# Upper bound on user x product cells evaluated at once, which caps the memory of the rule masks
+MATCH_BLOCK_CELLS = int(os.environ.get("MATCH_BLOCK_CELLS", "4000000"))
+
+MATCH_REASON = "Pre-filtered match based on credit score, income, and age criteria"
+
+# (credit score margin over the product minimum, match score), checked in order
+SCORE_TIERS = [(50, 90), (30, 80), (10, 70), (0, 60)]
+DEFAULT_SCORE = 50
+
+def _column(rows, index, default=np.nan):
+    """Return one column of fetched rows as a float array, with default in place of NULL"""
+    return np.array([default if row[index] is None else float(row[index]) for row in rows], dtype=np.float64)
+
+def load_products(cursor):
+    """
+    Load the loan product criteria as column arrays.
+    
+    NULL criteria become NaN, so comparisons against them are False exactly
+    like comparisons against NULL in SQL.
+    
+    Args:
+        cursor: Database cursor
+    
+    Returns:
+        Dict of numpy arrays keyed by column name
+    """
+    cursor.execute("""
+        SELECT product_id, min_credit_score, min_monthly_income, min_age, max_age, max_debt_to_income
+        FROM loan_products
+        ORDER BY product_id
+    """)
+    rows = cursor.fetchall()
+    
+    return {
+        "product_id": np.array([row[0] for row in rows], dtype=np.int64),
+        "min_credit_score": _column(rows, 1),
+        "min_monthly_income": _column(rows, 2),
+        "min_age": _column(rows, 3),
+        "max_age": _column(rows, 4),
+        "max_debt_to_income": _column(rows, 5)
+    }
+
+def load_users(cursor, batch_id):
+    """
+    Load the matching attributes of every user in a batch as column arrays.
+    
+    Args:
+        cursor: Database cursor
+        batch_id: Batch ID of the users to load
+    
+    Returns:
+        Dict of numpy arrays keyed by column name
+    """
+    cursor.execute("""
+        SELECT user_id, credit_score, monthly_income, age, debt_to_income_ratio,
+               employment_status, existing_loans
+        FROM users
+        WHERE batch_id = %s
+        ORDER BY user_id
+    """, (batch_id,))
+    rows = cursor.fetchall()
+    
+    return {
+        "user_id": np.array([row[0] for row in rows], dtype=np.int64),
+        "credit_score": _column(rows, 1),
+        "monthly_income": _column(rows, 2),
+        "age": _column(rows, 3),
+        # A missing ratio counts as no debt
+        "debt_to_income_ratio": _column(rows, 4, default=0.0),
+        "employment_points": employment_points(row[5] for row in rows),
+        "existing_loans": _column(rows, 6, default=0.0)
+    }
+
+def _credit_sorted_blocks(users, index):
+    """Yield (user positions, credit scores) for blocks of users in credit score order"""
+    order = np.argsort(users["credit_score"], kind="stable")
+    block_size = max(1, MATCH_BLOCK_CELLS // max(1, len(index)))
+    for start in range(0, len(order), block_size):
+        positions = order[start:start + block_size]
+        yield positions, users["credit_score"][positions]
+
+def match_users(users, index):
+    """
+    Evaluate the eligibility rules and score tiers for every user/product pair.
+    
+    A user matches a product when their credit score, monthly income and age
+    reach the product minimums, their age is within max_age and their
+    debt-to-income ratio is within max_debt_to_income (a NULL maximum always
+    passes). Users are taken in credit score order, in blocks bounded by
+    MATCH_BLOCK_CELLS, and each block is only compared with the products
+    whose min_credit_score its best score reaches.
+    
+    Args:
+        users: Column arrays from load_users
+        index: ProductIndex over the product catalog
+    
+    Yields:
+        Tuples of (user_ids, product_ids, match_scores) arrays, one per block
+    """
+    if not len(index) or not len(users["user_id"]):
+        return
+    
+    for positions, credit in _credit_sorted_blocks(users, index):
+        end = index.credit_prefix(credit[-1])
+        if not end:
+            continue
+        
+        eligible = index.eligible_mask(
+            0, end,
+            credit[:, np.newaxis],
+            users["monthly_income"][positions, np.newaxis],
+            users["age"][positions, np.newaxis],
+            users["debt_to_income_ratio"][positions, np.newaxis]
+        )
+        user_index, product_index = np.nonzero(eligible)
+        if not len(user_index):
+            continue
+        
+        margin = credit[user_index] - index.min_credit_score[product_index]
+        scores = np.select(
+            [margin >= threshold for threshold, _ in SCORE_TIERS],
+            [score for _, score in SCORE_TIERS],
+            DEFAULT_SCORE
+        )
+        
+        yield users["user_id"][positions[user_index]], index.product_id[product_index], scores
+
+def find_borderline_pairs(users, index):
+    """
+    Select user/product pairs that narrowly miss the rules and pre-score them.
+    
+    Same band as llm_jobs.enqueue_borderline_jobs: credit score at most
+    BORDERLINE_CREDIT_BAND points below the product minimum and income at
+    least BORDERLINE_INCOME_RATIO of the minimum, excluding pairs that match.
+    Every pair in the band is scored with pre_scorer, so only the ones it
+    cannot decide need the LLM.
+    
+    Args:
+        users: Column arrays from load_users
+        index: ProductIndex over the product catalog
+    
+    Yields:
+        Tuples of (user_ids, product_ids, scores, decisions) arrays, one per block
+    """
+    if not len(index) or not len(users["user_id"]):
+        return
+    
+    for positions, credit in _credit_sorted_blocks(users, index):
+        start, _ = index.borderline_range(credit[0])
+        _, end = index.borderline_range(credit[-1])
+        if start >= end:
+            continue
+        
+        credit_column = credit[:, np.newaxis]
+        income = users["monthly_income"][positions, np.newaxis]
+        min_credit = index.min_credit_score[start:end]
+        borderline = (
+            (credit_column >= min_credit - BORDERLINE_CREDIT_BAND)
+            & (credit_column <= min_credit)
+            & (income >= index.min_monthly_income[start:end] * BORDERLINE_INCOME_RATIO)
+            & ~index.eligible_mask(
+                start, end, credit_column, income,
+                users["age"][positions, np.newaxis],
+                users["debt_to_income_ratio"][positions, np.newaxis]
+            )
+        )
+        user_index, product_index = np.nonzero(borderline)
+        if not len(user_index):
+            continue
+        
+        user_positions = positions[user_index]
+        product_positions = start + product_index
+        scores = score_pairs(
+            users["credit_score"][user_positions],
+            users["monthly_income"][user_positions],
+            users["debt_to_income_ratio"][user_positions],
+            users["existing_loans"][user_positions],
+            users["employment_points"][user_positions],
+            index.min_credit_score[product_positions],
+            index.min_monthly_income[product_positions],
+            index.max_debt_to_income[product_positions]
+        )
+        
+        yield users["user_id"][user_positions], index.product_id[product_positions], scores, triage(scores)
+
+def insert_matches(cursor, user_ids, product_ids, scores, reason=MATCH_REASON):
+    """
+    Bulk insert one block of matches, keeping existing pairs.
+    
+    The block is streamed with COPY into a temporary staging table and
+    merged with a single statement that adds the pairs' keys to match_keys
+    and inserts only the matches whose key is new. match_keys stands in for
+    the UNIQUE(user_id, product_id) constraint the partitioned matches table
+    cannot have (see migration 008); a concurrent writer of the same pair
+    waits for this transaction, and no other.
+    
+    Args:
+        cursor: Database cursor
+        user_ids: Array of user IDs
+        product_ids: Array of product IDs
+        scores: Array of match scores
+        reason: match_reason of the inserted rows
+    
+    Returns:
+        Number of matches inserted
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS matches_staging (
+            user_id INTEGER,
+            product_id INTEGER,
+            match_score NUMERIC(5, 2)
+        ) ON COMMIT DELETE ROWS
+    """)
+    
+    buffer = StringIO()
+    np.savetxt(buffer, np.column_stack((user_ids, product_ids, scores)), fmt="%d", delimiter=",")
+    buffer.seek(0)
+    cursor.copy_expert("COPY matches_staging (user_id, product_id, match_score) FROM STDIN WITH (FORMAT csv)", buffer)
+    
+    cursor.execute("""
+        WITH new_keys AS (
+            INSERT INTO match_keys (user_id, product_id)
+            SELECT user_id, product_id FROM matches_staging
+            ORDER BY user_id, product_id
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, product_id
+        )
+        INSERT INTO matches (user_id, product_id, match_score, match_reason)
+        SELECT s.user_id, s.product_id, s.match_score, %s
+        FROM matches_staging s
+        JOIN new_keys k ON k.user_id = s.user_id AND k.product_id = s.product_id
+    """, (reason,))
+    inserted = cursor.rowcount
+    cursor.execute("TRUNCATE matches_staging")
+    return inserted
+
+def run_matching(conn, batch_id):
+    """
+    Match every user of a batch against the product catalog and store the matches.
+    
+    Borderline pairs the pre-scorer approves are stored as matches too, those
+    it rejects are dropped, and the rest are queued as LLM jobs in the same
+    transaction, for llm_worker to evaluate.
+    
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the users to match
+    
+    Returns:
+        Dict with the number of users, products, eligible pairs and inserted
+        matches, the borderline pairs by pre-score decision and the LLM
+        jobs queued
+    """
+    cursor = conn.cursor()
+    
+    try:
+        index = ProductIndex(load_products(cursor))
+        users = load_users(cursor, batch_id)
+        
+        eligible_pairs = 0
+        inserted = 0
+        for user_ids, product_ids, scores in match_users(users, index):
+            eligible_pairs += len(user_ids)
+            inserted += insert_matches(cursor, user_ids, product_ids, scores)
+        
+        borderline = {"pairs": 0, "approved": 0, "rejected": 0, "ask_llm": 0}
+        llm_jobs_queued = 0
+        for user_ids, product_ids, scores, decisions in find_borderline_pairs(users, index):
+            approved = decisions == APPROVE
+            ask_llm = decisions == ASK_LLM
+            borderline["pairs"] += len(user_ids)
+            borderline["approved"] += int(approved.sum())
+            borderline["ask_llm"] += int(ask_llm.sum())
+            if approved.any():
+                inserted += insert_matches(cursor, user_ids[approved], product_ids[approved], scores[approved], PRE_SCORE_REASON)
+            llm_jobs_queued += enqueue_jobs(cursor, user_ids[ask_llm], product_ids[ask_llm], batch_id)
+        borderline["rejected"] = borderline["pairs"] - borderline["approved"] - borderline["ask_llm"]
+        
+        conn.commit()
+        
+        logger.info(f"Batch {batch_id}: {len(users['user_id'])} users, {eligible_pairs} eligible pairs, {inserted} new matches, borderline pairs {borderline}, {llm_jobs_queued} LLM jobs queued")
+        return {
+            "users": len(users["user_id"]),
+            "products": len(index),
+            "eligible_pairs": eligible_pairs,
+            "matches_inserted": inserted,
+            "borderline_pairs": borderline,
+            "llm_jobs_queued": llm_jobs_queued
+        }
+    
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+def run_sql_matching(conn, batch_id):
+    """
+    Match a batch with the set-based match_batch() function from schema.sql.
+    
+    The batch's borderline pairs are queued as LLM jobs in the same
+    transaction; llm_worker pre-scores them.
+    
+    Args:
+        conn: Database connection
+        batch_id: Batch ID of the users to match
+    
+    Returns:
+        Dict with the number of inserted matches and LLM jobs queued
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT match_batch(%s)", (batch_id,))
+        inserted = cursor.fetchone()[0]
+        llm_jobs_queued = enqueue_borderline_jobs(cursor, batch_id)
+        conn.commit()
+        
+        logger.info(f"Batch {batch_id}: {inserted} new matches from match_batch(), {llm_jobs_queued} LLM jobs queued")
+        return {"matches_inserted": inserted, "llm_jobs_queued": llm_jobs_queued}
+    
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler that runs the rule-based matching for a batch.
+    
+    Accepts either a direct invocation payload or an API Gateway request
+    whose JSON body carries the batch_id. The HTTP endpoint invokes this
+    asynchronously, so the run and its summary are also recorded in
+    match_runs under the caller's run_id, for the caller to poll.
+    
+    Args:
+        event: Dict containing batch_id and an optional run_id, directly or in a JSON body
+        context: AWS Lambda context
+    
+    Returns:
+        Dict with status and matching summary
+    """
+    try:
+        body = event.get("body", event)
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
+        batch_id = body.get("batch_id")
+        run_id = body.get("run_id") or getattr(context, "aws_request_id", None) or batch_id
+        
+        if not batch_id:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({
+                    "status": "error",
+                    "message": "Missing required parameter: batch_id"
+                })
+            }
+        
+        conn = get_db_connection()
+        try:
+            start_run(conn, batch_id, run_id)
+            try:
+                if MATCHING_MODE == "sql":
+                    summary = run_sql_matching(conn, batch_id)
+                else:
+                    summary = run_matching(conn, batch_id)
+            except Exception as e:
+                fail_run(conn, batch_id, run_id, str(e))
+                raise
+            finish_run(conn, batch_id, run_id, summary)
+        finally:
+            release_db_connection(conn)
+        
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "status": "success",
+                "batch_id": batch_id,
+                "run_id": run_id,
+                **summary
+            })
+        }
+    
+    except Exception as e:
+        logger.error(f"Matching error: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "status": "error",
+                "message": f"Matching error: {str(e)}"
+            })
+        }
@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+from db import get_db_connection, release_db_connection
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Months of partitions created ahead of the current one; inserts fail once they run out
+PARTITION_PREMAKE_MONTHS = int(os.environ.get("PARTITION_PREMAKE_MONTHS", "3"))
+# Months of matches kept attached, counting the current month
+MATCHES_RETENTION_MONTHS = int(os.environ.get("MATCHES_RETENTION_MONTHS", "24"))
+# Months of notification log kept attached, counting the current month
+NOTIFICATIONS_RETENTION_MONTHS = int(os.environ.get("NOTIFICATIONS_RETENTION_MONTHS", "12"))
+# 'archive' moves detached partitions to the archive schema, 'drop' deletes them
+PARTITION_ARCHIVE_MODE = os.environ.get("PARTITION_ARCHIVE_MODE", "archive")
+
+# Partitioned table -> retention in months (0 keeps every partition)
+PARTITIONED_TABLES = {
+    "matches": MATCHES_RETENTION_MONTHS,
+    "notifications": NOTIFICATIONS_RETENTION_MONTHS
+}
+
+def maintain_partitions(conn, tables=None, premake_months=PARTITION_PREMAKE_MONTHS, drop=None):
+    """
+    Create the coming monthly partitions and retire the expired ones.
+
+    Each table is handled in its own transaction with the
+    create_month_partitions() and archive_month_partitions() functions from
+    migration 002. Rows that landed in the table's default partition, dated
+    outside the existing partitions, are moved to monthly partitions created
+    for them by drain_default_partition() (migration 009). Detaching briefly
+    locks the parent table.
+
+    Args:
+        conn: Database connection
+        tables: Dict of table name -> retention months, defaults to PARTITIONED_TABLES
+        premake_months: Months of partitions to keep ready ahead of the current one
+        drop: Drop retired partitions instead of archiving them; defaults to PARTITION_ARCHIVE_MODE
+
+    Returns:
+        Dict of table name -> {"created": [...], "drained": [...], "retired": [...]}
+    """
+    if tables is None:
+        tables = PARTITIONED_TABLES
+    if drop is None:
+        drop = PARTITION_ARCHIVE_MODE == "drop"
+
+    cursor = conn.cursor()
+    summary = {}
+
+    try:
+        for table, retention_months in tables.items():
+            cursor.execute("""
+                SELECT create_month_partitions(
+                    %s, CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date
+                )
+            """, (table, premake_months))
+            created = [row[0] for row in cursor.fetchall()]
+
+            cursor.execute("SELECT drain_default_partition(%s)", (table,))
+            drained = [row[0] for row in cursor.fetchall()]
+            if drained:
+                logger.warning(f"{table}: moved rows out of the default partition into {drained}")
+
+            retired = []
+            if retention_months > 0:
+                cursor.execute("""
+                    SELECT archive_month_partitions(
+                        %s, (date_trunc('month', CURRENT_DATE) - make_interval(months => %s - 1))::date, %s
+                    )
+                """, (table, retention_months, drop))
+                retired = [row[0] for row in cursor.fetchall()]
+
+            conn.commit()
+            logger.info(f"{table}: created partitions {created or 'none'}, "
+                        f"{'dropped' if drop else 'archived'} {retired or 'none'}")
+            summary[table] = {"created": created, "drained": drained, "retired": retired}
+
+        return summary
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler for the daily partition maintenance run.
+
+    Args:
+        event: Scheduled event; an optional premake_months overrides
+               PARTITION_PREMAKE_MONTHS
+        context: AWS Lambda context
+
+    Returns:
+        Dict with status and the partitions created and retired per table
+    """
+    try:
+        body = event.get("body", event)
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
+        premake_months = int(body.get("premake_months", PARTITION_PREMAKE_MONTHS))
+
+        conn = get_db_connection()
+        try:
+            summary = maintain_partitions(conn, premake_months=premake_months)
+        finally:
+            release_db_connection(conn)
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "status": "success",
+                "partitions": summary
+            })
+        }
+
+    except Exception as e:
+        logger.error(f"Error maintaining partitions: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "status": "error",
+                "message": str(e)
+            })
+        }
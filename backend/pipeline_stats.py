@@ -0,0 +1,114 @@
+import json
+import logging
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def get_system_stats(conn):
+    """
+    Read the system-wide counters kept by the triggers of migration 003.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Dict with total_users, total_products, total_matches and total_notifications
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT total_users, total_products, total_matches, total_notifications
+            FROM system_stats
+        """)
+        return dict(cursor.fetchone())
+
+def get_batch_stats(conn, batch_id):
+    """
+    Read the counters of one upload batch.
+
+    Args:
+        conn: Database connection
+        batch_id: Upload batch
+
+    Returns:
+        Dict with batch_id, users, matches and llm_matches (zeros for an unknown batch)
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT users, matches, llm_matches
+            FROM batch_stats
+            WHERE batch_id = %s
+        """, (batch_id,))
+        row = cursor.fetchone()
+    stats = dict(row) if row else {"users": 0, "matches": 0, "llm_matches": 0}
+    return {"batch_id": batch_id, **stats}
+
+def refresh_stats(conn):
+    """
+    Recount every counter with refresh_pipeline_stats().
+
+    Scans all four tables and blocks their writers until it commits, so only
+    use it to repair counters that have drifted.
+
+    Args:
+        conn: Database connection
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT refresh_pipeline_stats()")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    logger.info("Recounted pipeline stats")
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler returning the pipeline counters.
+
+    Args:
+        event: Request with an optional batch_id for the counters of that batch;
+               a direct invocation (not through API Gateway) may also set
+               refresh to recount everything first
+        context: AWS Lambda context
+
+    Returns:
+        Dict with status and the requested counters
+    """
+    try:
+        body = event.get("body", event) or {}
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
+        batch_id = body.get("batch_id")
+
+        # The recount blocks writes to the counted tables, so it is never
+        # offered on the public HTTP endpoint
+        refresh = "body" not in event and bool(event.get("refresh"))
+
+        conn = get_db_connection()
+        try:
+            if refresh:
+                refresh_stats(conn)
+            stats = get_batch_stats(conn, batch_id) if batch_id else get_system_stats(conn)
+        finally:
+            release_db_connection(conn)
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "status": "success",
+                "stats": stats
+            })
+        }
+
+    except Exception as e:
+        logger.error(f"Error reading pipeline stats: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "status": "error",
+                "message": str(e)
+            })
+        }
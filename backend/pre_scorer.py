@@ -0,0 +1,150 @@
+import os
+import numpy as np
+
+# Pairs scoring at least this are approved without asking the LLM
+PRE_SCORE_APPROVE = float(os.environ.get("PRE_SCORE_APPROVE", "80"))
+
+# Pairs scoring at most this are rejected without asking the LLM; set it below 0
+# and PRE_SCORE_APPROVE above 100 to send every pair to the LLM
+PRE_SCORE_REJECT = float(os.environ.get("PRE_SCORE_REJECT", "30"))
+
+# Decisions returned by triage
+APPROVE = 1
+ASK_LLM = 0
+REJECT = -1
+
+# Recorded as the match_reason of pairs approved by the pre-scorer, and as the
+# prefix of its verdict reasons, so they are never mistaken for LLM verdicts
+PRE_SCORE_REASON = "Pre-score: borderline case approved on DTI, employment and existing loans"
+PRE_SCORE_PREFIX = "Pre-score"
+
+BASE_SCORE = 50.0
+# Points per credit score point above (or below) the product minimum, and the margin counted
+CREDIT_POINTS = 0.8
+CREDIT_MARGIN_CAP = 40
+# Points per 10% of income above (or below) the product minimum, capped at INCOME_POINTS_CAP either way
+INCOME_POINTS = 5.0
+INCOME_POINTS_CAP = 15.0
+# Points for a DTI of zero; a DTI at the product maximum scores 0 and every 10% over it costs DTI_OVER_POINTS
+DTI_POINTS = 20.0
+DTI_OVER_POINTS = 10.0
+# Maximum assumed for products without max_debt_to_income
+DEFAULT_MAX_DTI = 0.43
+# Points by employment status, for the statuses the sample data uses
+EMPLOYMENT_POINTS = {"employed": 10.0, "self-employed": 0.0, "retired": -5.0, "unemployed": -30.0}
+UNKNOWN_EMPLOYMENT_POINTS = -10.0
+# Points lost per existing loan beyond the first, up to LOAN_PENALTY_CAP
+LOAN_PENALTY = 5.0
+LOAN_PENALTY_CAP = 15.0
+
+def employment_points(statuses):
+    """
+    Map employment statuses to their points.
+
+    Called once per user, so score_pairs only indexes the result per pair.
+
+    Args:
+        statuses: Iterable of employment status strings (None when missing)
+
+    Returns:
+        Float array of points
+    """
+    return np.array([
+        EMPLOYMENT_POINTS.get(str(status).strip().lower(), UNKNOWN_EMPLOYMENT_POINTS) if status else UNKNOWN_EMPLOYMENT_POINTS
+        for status in statuses
+    ], dtype=np.float64)
+
+def score_pairs(credit_score, monthly_income, debt_to_income_ratio, existing_loans, employment,
+                min_credit_score, min_monthly_income, max_debt_to_income):
+    """
+    Score user/product pairs from 0 (clearly ineligible) to 100 (clearly eligible).
+
+    Uses the fields _create_prompt gives the LLM: the margin to the product's
+    credit score and income minimums, DTI headroom under the product maximum,
+    employment status and existing loans. All arguments are arrays of one
+    value per pair (or scalars); NaN criteria contribute no points.
+
+    Args:
+        credit_score, monthly_income, debt_to_income_ratio, existing_loans: User columns
+        employment: Employment points from employment_points
+        min_credit_score, min_monthly_income, max_debt_to_income: Product columns
+
+    Returns:
+        Float array of scores
+    """
+    credit_margin = np.clip(credit_score - min_credit_score, -CREDIT_MARGIN_CAP, CREDIT_MARGIN_CAP)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        income_ratio = monthly_income / min_monthly_income
+        max_dti = np.where(np.isnan(max_debt_to_income), DEFAULT_MAX_DTI, max_debt_to_income)
+        dti_headroom = 1 - np.nan_to_num(debt_to_income_ratio) / max_dti
+    income = np.clip((income_ratio - 1) * 10 * INCOME_POINTS, -INCOME_POINTS_CAP, INCOME_POINTS_CAP)
+    dti = np.where(dti_headroom >= 0, dti_headroom * DTI_POINTS, dti_headroom * 10 * DTI_OVER_POINTS)
+    loans = np.minimum(np.maximum(np.nan_to_num(existing_loans) - 1, 0) * LOAN_PENALTY, LOAN_PENALTY_CAP)
+
+    scores = (
+        BASE_SCORE
+        + np.nan_to_num(credit_margin) * CREDIT_POINTS
+        + np.nan_to_num(income, posinf=INCOME_POINTS_CAP)
+        + np.nan_to_num(dti)
+        + employment
+        - loans
+    )
+    return np.clip(scores, 0, 100)
+
+def triage(scores, approve=PRE_SCORE_APPROVE, reject=PRE_SCORE_REJECT):
+    """
+    Decide each pair from its score.
+
+    Args:
+        scores: Array from score_pairs
+        approve: Lowest score approved locally
+        reject: Highest score rejected locally
+
+    Returns:
+        Int array of APPROVE, REJECT or ASK_LLM
+    """
+    return np.select([scores >= approve, scores <= reject], [APPROVE, REJECT], ASK_LLM)
+
+def verdict(decision, score):
+    """
+    Express a local decision like an AIEligibilityChecker verdict.
+
+    Args:
+        decision: APPROVE or REJECT
+        score: Pre-score of the pair
+
+    Returns:
+        Tuple of (eligible, confidence, reason)
+    """
+    eligible = bool(decision == APPROVE)
+    confidence = round(float(score if eligible else 100 - score), 1)
+    outcome = "clearly eligible" if eligible else "clearly ineligible"
+    return eligible, confidence, f"{PRE_SCORE_PREFIX} {float(score):.0f}/100: {outcome} on credit, income, DTI, employment and existing loans"
+
+def _field(rows, name):
+    """Return one field of user or product dicts as a float array, NaN where missing"""
+    return np.array([np.nan if row.get(name) is None else float(row[name]) for row in rows], dtype=np.float64)
+
+def score_dict_pairs(pairs):
+    """
+    Score (user_data, loan_product) dict pairs shaped like the checker's input.
+
+    Args:
+        pairs: List of (user_data, loan_product) tuples
+
+    Returns:
+        Float array of scores
+    """
+    users = [user for user, _ in pairs]
+    products = [product for _, product in pairs]
+    return score_pairs(
+        _field(users, "credit_score"),
+        _field(users, "monthly_income"),
+        _field(users, "debt_to_income_ratio"),
+        _field(users, "existing_loans"),
+        employment_points(user.get("employment_status") for user in users),
+        _field(products, "min_credit_score"),
+        _field(products, "min_monthly_income"),
+        _field(products, "max_debt_to_income")
+    )
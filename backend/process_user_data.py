@@ -2,12 +2,17 @@ import json
 import os
 import csv
 import boto3
-import psycopg2
 import uuid
 import logging
 import urllib.parse
 import requests
-from io import StringIO
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from io import BytesIO, StringIO
+from concurrent.futures import ProcessPoolExecutor
+from csv_validator import ChunkStream, RejectReport, iter_valid_batches, MAX_REJECT_SAMPLES
+from db import get_db_connection, release_db_connection
+from ingest_runs import find_run, register_run, unstarted_ranges, claim_range, finish_range, fail_range, complete_run
 
 # Configure logging
 logger = logging.getLogger()
@@ -15,53 +20,149 @@ logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
 s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
 
-def get_db_connection():
-    """Establish a connection to the PostgreSQL database"""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['DB_HOST'],
-            database=os.environ['DB_NAME'],
-            user=os.environ['DB_USER'],
-            password=os.environ['DB_PASSWORD']
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise e
+# Number of validated rows flushed to the database per transaction
+INGEST_CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', '5000'))
+# Bytes requested from S3 per network read while streaming a CSV
+S3_READ_SIZE = 1024 * 1024
+# Loader used for each chunk: 'copy' (COPY + set-based merge) or 'rows' (one INSERT per user)
+INGEST_LOAD_MODE = os.environ.get('INGEST_LOAD_MODE', 'copy')
+# Objects larger than this are split into newline-aligned byte ranges loaded in parallel
+INGEST_SPLIT_THRESHOLD_BYTES = int(os.environ.get('INGEST_SPLIT_THRESHOLD_BYTES', str(256 * 1024 * 1024)))
+# Number of byte ranges (and concurrent workers) used for split ingestion
+INGEST_PARALLELISM = int(os.environ.get('INGEST_PARALLELISM', '4'))
+# Lambda invoked asynchronously once per byte range; when unset, ranges run in a local process pool
+INGEST_WORKER_FUNCTION = os.environ.get('INGEST_WORKER_FUNCTION')
+# Bytes fetched when probing for the header or the next newline after a split point
+SPLIT_PROBE_SIZE = 64 * 1024
+
+# Columns staged through COPY, in the order they are written to the COPY stream
+USER_STAGING_COLUMNS = [
+    'row_number', 'user_id', 'email', 'monthly_income', 'credit_score',
+    'employment_status', 'age', 'debt_to_income_ratio', 'existing_loans'
+]
+
+def iter_user_batches(chunks, report, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Lazily parse and validate CSV data into Arrow batches of at most chunk_size users.
+    
+    Args:
+        chunks: Iterable of CSV bytes or text (S3 body chunks, lines, ...)
+        report: RejectReport collecting rejected rows
+        chunk_size: Maximum number of rows per yielded batch
+        
+    Yields:
+        Arrow RecordBatch of valid users (see csv_validator.OUTPUT_COLUMNS)
+    """
+    for batch in iter_valid_batches(ChunkStream(chunks), report):
+        for offset in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(offset, chunk_size)
+
+def iter_users(chunks, report=None):
+    """
+    Lazily parse and validate CSV rows.
+    
+    Args:
+        chunks: Iterable of CSV bytes or text (file object, lines, ...)
+        report: Optional RejectReport; when omitted rejects are logged as a summary
+        
+    Yields:
+        Dict for each valid user row
+    """
+    own_report = report is None
+    report = report or RejectReport()
+    
+    for batch in iter_user_batches(chunks, report):
+        yield from batch.to_pylist()
+    
+    if own_report and report.total:
+        logger.warning(f"Skipped {report.total} invalid rows: {report.reasons}")
 
 def process_csv(file_content):
     """Process CSV content and return structured data"""
-    csv_reader = csv.DictReader(StringIO(file_content))
-    users = []
-    
-    for row in csv_reader:
-        # Validate required fields for the new format
-        required_fields = ['email', 'monthly_income', 'credit_score', 'employment_status', 'age']
-        if not all(field in row for field in required_fields):
-            logger.warning(f"Skipping row due to missing required fields: {row}")
-            continue
+    return list(iter_users([file_content]))
+
+def iter_chunks(items, chunk_size):
+    """Group an iterable into lists of at most chunk_size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_s3_chunks(bucket, key, start=None, end=None, read_size=S3_READ_SIZE, client=None):
+    """
+    Stream an S3 object, or its bytes [start, end), as raw byte chunks.
+    
+    The body is pulled from the network in read_size pieces as the CSV
+    parser consumes it, so only the current piece is held in memory rather
+    than the whole object.
+    """
+    params = {'Bucket': bucket, 'Key': key}
+    if start is not None:
+        params['Range'] = f"bytes={start}-{end - 1}"
+    response = (client or s3_client).get_object(**params)
+    return response['Body'].iter_chunks(read_size)
+
+def ingest_users(chunks, batch_id, chunk_size=INGEST_CHUNK_SIZE, load_mode=INGEST_LOAD_MODE):
+    """
+    Stream validated users from CSV data into the database in bounded chunks.
+    
+    Each chunk is committed before the next one is parsed, so peak memory is
+    bounded by chunk_size and the first rows are visible while the rest of
+    the file is still being read.
+    
+    Args:
+        chunks: Iterable of CSV bytes or text
+        batch_id: Batch identifier to stamp on every user
+        chunk_size: Maximum number of rows per transaction
+        load_mode: 'copy' for bulk_upsert_users, 'rows' for insert_users_to_db
+        
+    Returns:
+        Dict with processed, loaded (inserted + updated), inserted, updated
+        and rejected counts, rejects per reason and a capped list of reject_samples
+    """
+    report = RejectReport()
+    summary = {
+        'processed': 0,
+        'loaded': 0,
+        'inserted': 0,
+        'updated': 0
+    }
+    conn = None
+    
+    try:
+        for batch in iter_user_batches(chunks, report, chunk_size):
+            # Connect lazily so files without valid rows never touch the database
+            if conn is None:
+                conn = get_db_connection()
             
-        # Clean and validate data
-        try:
-            user = {
-                # Use provided user_id if available, otherwise it will be auto-generated by DB
-                'user_id': row.get('user_id'),
-                'email': row['email'].strip().lower(),
-                'monthly_income': float(row['monthly_income']),
-                'credit_score': int(row['credit_score']),
-                'employment_status': row['employment_status'].strip(),
-                'age': int(row['age']),
-                # Optional fields with defaults
-                'debt_to_income_ratio': float(row.get('debt_to_income_ratio', 0)),
-                'existing_loans': int(row.get('existing_loans', 0))
-            }
-            users.append(user)
-        except (ValueError, TypeError) as e:
-            logger.warning(f"Skipping row due to data validation error: {str(e)}, row: {row}")
-            continue
+            if load_mode == 'rows':
+                loaded_count = insert_users_to_db(conn, batch.to_pylist(), batch_id)
+                summary['loaded'] += loaded_count
+            else:
+                inserted_count, updated_count, rejects = bulk_upsert_users(conn, batch, batch_id)
+                summary['loaded'] += inserted_count + updated_count
+                summary['inserted'] += inserted_count
+                summary['updated'] += updated_count
+                for reject in rejects:
+                    report.add(reject['row_number'], reject['reason'])
+            
+            summary['processed'] += batch.num_rows
+            logger.info(f"Committed chunk of {batch.num_rows} users ({summary['processed']} so far)")
+    finally:
+        if conn is not None:
+            release_db_connection(conn)
+    
+    if report.total:
+        logger.warning(f"Rejected {report.total} rows: {report.reasons}, first rejects: {report.samples[:10]}")
     
-    return users
+    summary.update(report.as_dict())
+    return summary
 
 def insert_users_to_db(conn, users, batch_id):
     """Insert processed user data into the database"""
@@ -138,6 +239,412 @@ def insert_users_to_db(conn, users, batch_id):
     conn.commit()
     return inserted_count
 
+def _copy_users_to_staging(cursor, users):
+    """Stream a chunk of users into the users_staging temp table with COPY FROM STDIN"""
+    if isinstance(users, pa.RecordBatch):
+        # Columnar batches are serialized by Arrow without building per-row objects
+        buffer = BytesIO()
+        table = pa.Table.from_batches([users]).select(USER_STAGING_COLUMNS)
+        pacsv.write_csv(table, buffer, write_options=pacsv.WriteOptions(include_header=False))
+    else:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        for user in users:
+            # Empty unquoted CSV fields are loaded as NULL
+            writer.writerow([user.get(column) for column in USER_STAGING_COLUMNS])
+    buffer.seek(0)
+    
+    cursor.copy_expert(
+        f"COPY users_staging ({', '.join(USER_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def bulk_upsert_users(conn, users, batch_id):
+    """
+    Bulk load users with COPY and merge them with set-based upserts.
+    
+    The chunk is copied into a session-scoped staging table, rows that the
+    users table would refuse are flagged with a reason, and the remaining
+    rows are merged with one INSERT ... SELECT ... ON CONFLICT per conflict
+    path (user_id when provided, email otherwise). Duplicate keys inside a
+    chunk keep the last row, matching the row-by-row loop.
+    
+    Args:
+        conn: Database connection
+        users: Arrow batch from iter_user_batches or list of user dicts
+        batch_id: Batch identifier to stamp on every user
+        
+    Returns:
+        Tuple of (inserted_count, updated_count, rejects) where rejects is a
+        list of dicts with row_number, email and reason
+    """
+    cursor = conn.cursor()
+    
+    try:
+        # Rows are cleared on every commit, so the table is reused across chunks
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS users_staging (
+                row_number INTEGER,
+                user_id TEXT,
+                email TEXT,
+                monthly_income NUMERIC,
+                credit_score BIGINT,
+                employment_status TEXT,
+                age BIGINT,
+                debt_to_income_ratio NUMERIC,
+                existing_loans BIGINT,
+                reject_reason TEXT
+            ) ON COMMIT DELETE ROWS
+        """)
+        
+        _copy_users_to_staging(cursor, users)
+        
+        # Flag rows the users table would refuse, so one bad row cannot fail the chunk
+        cursor.execute("""
+            UPDATE users_staging s
+            SET reject_reason = CASE
+                WHEN s.user_id IS NOT NULL AND s.user_id !~ '^\\s*[0-9]{1,9}\\s*$' THEN 'invalid user_id'
+                WHEN length(s.email) > 255 THEN 'email longer than 255 characters'
+                WHEN length(s.employment_status) > 50 THEN 'employment_status longer than 50 characters'
+                WHEN abs(s.monthly_income) >= 1e10 THEN 'monthly_income out of range'
+                WHEN abs(s.debt_to_income_ratio) >= 1e3 THEN 'debt_to_income_ratio out of range'
+                WHEN greatest(abs(s.credit_score), abs(s.age), abs(s.existing_loans)) > 2147483647
+                    THEN 'integer field out of range'
+            END
+        """)
+        cursor.execute("""
+            UPDATE users_staging s
+            SET reject_reason = 'superseded by row ' || d.last_row || ' with the same key'
+            FROM (
+                SELECT row_number,
+                       last_value(row_number) OVER (
+                           PARTITION BY CASE WHEN user_id IS NULL THEN 'email:' || email
+                                             ELSE 'user_id:' || trim(user_id)::INTEGER END
+                           ORDER BY row_number
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                       ) AS last_row
+                FROM users_staging
+                WHERE reject_reason IS NULL
+            ) d
+            WHERE s.row_number = d.row_number AND d.row_number <> d.last_row
+        """)
+        cursor.execute("""
+            UPDATE users_staging s
+            SET reject_reason = 'email already belongs to user_id ' || u.user_id
+            FROM users u
+            WHERE s.reject_reason IS NULL
+              AND s.user_id IS NOT NULL
+              AND u.email = s.email
+              AND u.user_id <> CASE WHEN s.reject_reason IS NULL THEN trim(s.user_id)::INTEGER END
+        """)
+        cursor.execute("""
+            UPDATE users_staging s
+            SET reject_reason = 'email already used by row ' || d.first_row
+            FROM (
+                SELECT row_number,
+                       first_value(row_number) OVER (
+                           PARTITION BY email
+                           ORDER BY row_number
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                       ) AS first_row
+                FROM users_staging
+                WHERE reject_reason IS NULL AND user_id IS NOT NULL
+            ) d
+            WHERE s.row_number = d.row_number AND d.row_number <> d.first_row
+        """)
+        
+        # Merge rows that carry a user_id
+        cursor.execute("""
+            INSERT INTO users (user_id, email, monthly_income, credit_score, employment_status, age,
+                               debt_to_income_ratio, existing_loans, batch_id)
+            SELECT trim(user_id)::INTEGER, email, monthly_income, credit_score, employment_status, age,
+                   debt_to_income_ratio, existing_loans, %s
+            FROM users_staging
+            WHERE reject_reason IS NULL AND user_id IS NOT NULL
+            ON CONFLICT (user_id) DO UPDATE SET
+                email = EXCLUDED.email,
+                monthly_income = EXCLUDED.monthly_income,
+                credit_score = EXCLUDED.credit_score,
+                employment_status = EXCLUDED.employment_status,
+                age = EXCLUDED.age,
+                debt_to_income_ratio = EXCLUDED.debt_to_income_ratio,
+                existing_loans = EXCLUDED.existing_loans,
+                updated_at = CURRENT_TIMESTAMP,
+                batch_id = EXCLUDED.batch_id
+            RETURNING user_id, (xmax = 0) AS inserted
+        """, (batch_id,))
+        explicit_rows = cursor.fetchall()
+        merged = [inserted for _, inserted in explicit_rows]
+        
+        # Explicit ids do not advance the SERIAL sequence, so move it past them
+        # before generating ids for the email-keyed rows
+        if explicit_rows:
+            max_user_id = max(user_id for user_id, _ in explicit_rows)
+            cursor.execute("""
+                SELECT setval(seq, %s)
+                FROM (SELECT pg_get_serial_sequence('users', 'user_id')::regclass AS seq) s
+                WHERE %s > COALESCE(pg_sequence_last_value(seq), 0)
+            """, (max_user_id, max_user_id))
+        
+        # Merge rows keyed on email
+        cursor.execute("""
+            INSERT INTO users (email, monthly_income, credit_score, employment_status, age,
+                               debt_to_income_ratio, existing_loans, batch_id)
+            SELECT email, monthly_income, credit_score, employment_status, age,
+                   debt_to_income_ratio, existing_loans, %s
+            FROM users_staging
+            WHERE reject_reason IS NULL AND user_id IS NULL
+            ON CONFLICT (email) DO UPDATE SET
+                monthly_income = EXCLUDED.monthly_income,
+                credit_score = EXCLUDED.credit_score,
+                employment_status = EXCLUDED.employment_status,
+                age = EXCLUDED.age,
+                debt_to_income_ratio = EXCLUDED.debt_to_income_ratio,
+                existing_loans = EXCLUDED.existing_loans,
+                updated_at = CURRENT_TIMESTAMP,
+                batch_id = EXCLUDED.batch_id
+            RETURNING (xmax = 0) AS inserted
+        """, (batch_id,))
+        merged.extend(row[0] for row in cursor.fetchall())
+        
+        cursor.execute("""
+            SELECT row_number, email, reject_reason
+            FROM users_staging
+            WHERE reject_reason IS NOT NULL
+            ORDER BY row_number
+        """)
+        rejects = [
+            {'row_number': row_number, 'email': email, 'reason': reason}
+            for row_number, email, reason in cursor.fetchall()
+        ]
+        
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error bulk loading {len(users)} users: {str(e)}")
+        raise e
+    finally:
+        cursor.close()
+    
+    inserted_count = sum(1 for inserted in merged if inserted)
+    return inserted_count, len(merged) - inserted_count, rejects
+
+def _find_newline_after(bucket, key, offset, size, client):
+    """Return the offset just past the first newline at or after offset, or size if there is none"""
+    while offset < size:
+        end = min(offset + SPLIT_PROBE_SIZE, size)
+        response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{end - 1}")
+        probe = response['Body'].read()
+        newline = probe.find(b'\n')
+        if newline >= 0:
+            return offset + newline + 1
+        offset = end
+    return size
+
+def find_split_ranges(bucket, key, size, parts, client=None):
+    """
+    Split an S3 CSV object into newline-aligned byte ranges.
+    
+    Only small probes around each split point are downloaded. Quoted fields
+    containing newlines are not supported, which holds for the user upload
+    template.
+    
+    Args:
+        bucket: S3 bucket name
+        key: S3 object key
+        size: Object size in bytes
+        parts: Desired number of ranges
+        client: S3 client (defaults to the module client)
+        
+    Returns:
+        Tuple of (header_line, ranges) where ranges is a list of
+        (start, end) byte offsets covering the data rows
+    """
+    client = client or s3_client
+    data_start = _find_newline_after(bucket, key, 0, size, client)
+    response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{data_start - 1}")
+    header_line = response['Body'].read().decode('utf-8')
+    
+    boundaries = [data_start]
+    step = max((size - data_start) // max(parts, 1), 1)
+    for i in range(1, parts):
+        boundary = _find_newline_after(bucket, key, data_start + i * step - 1, size, client)
+        if boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    if size > boundaries[-1]:
+        boundaries.append(size)
+    
+    return header_line, list(zip(boundaries, boundaries[1:]))
+
+def process_range(bucket, key, start, end, header_line, batch_id, client=None):
+    """
+    Load one byte range of a split CSV object.
+    
+    Runs inside a pool process or a worker Lambda invocation, with its own
+    database connection. Row numbers in the rejects are relative to the range.
+    
+    Returns:
+        ingest_users summary for the range, with the range offsets added
+    """
+    chunks = iter_s3_chunks(bucket, key, start, end, client=client)
+    summary = ingest_users(_prepend(header_line, chunks), batch_id)
+    summary['range'] = [start, end]
+    return summary
+
+def _prepend(first, rest):
+    """Yield first followed by every item of rest"""
+    yield first
+    yield from rest
+
+def merge_summaries(summaries):
+    """Combine per-range ingest summaries into one"""
+    merged = {
+        'processed': 0,
+        'loaded': 0,
+        'inserted': 0,
+        'updated': 0,
+        'rejected': 0,
+        'reject_reasons': {},
+        'reject_samples': []
+    }
+    for summary in summaries:
+        for field in ('processed', 'loaded', 'inserted', 'updated', 'rejected'):
+            merged[field] += summary[field]
+        for reason, count in summary['reject_reasons'].items():
+            merged['reject_reasons'][reason] = merged['reject_reasons'].get(reason, 0) + count
+        room = MAX_REJECT_SAMPLES - len(merged['reject_samples'])
+        merged['reject_samples'].extend(
+            dict(reject, range=summary.get('range')) for reject in summary['reject_samples'][:room]
+        )
+    return merged
+
+def _invoke_range_worker(bucket, key, start, end, header_line, batch_id):
+    """Start process_range in an asynchronous invocation of the worker Lambda"""
+    lambda_client.invoke(
+        FunctionName=INGEST_WORKER_FUNCTION,
+        InvocationType='Event',
+        Payload=json.dumps({
+            'ingest_range': {
+                'bucket': bucket,
+                'key': key,
+                'start': start,
+                'end': end,
+                'header_line': header_line,
+                'batch_id': batch_id
+            }
+        })
+    )
+
+def dispatch_ranges(bucket, key, size, sequencer, workers=INGEST_PARALLELISM, client=None):
+    """
+    Split a large S3 CSV object into byte ranges loaded by asynchronous worker invocations.
+    
+    The run and its ranges are recorded in ingest_runs and ingest_ranges, and
+    one worker Lambda is started per range without waiting for it, so worker
+    time never counts against this invocation's timeout. The worker finishing
+    the last range triggers the matching workflow (see load_range_task). When
+    the S3 event is delivered again, its run is found by the event sequencer
+    and only ranges no worker has claimed are started again.
+    
+    Args:
+        bucket: S3 bucket name
+        key: S3 object key
+        size: Object size in bytes
+        sequencer: Sequencer of the S3 event
+        workers: Number of ranges
+        client: S3 client (defaults to the module client)
+        
+    Returns:
+        Tuple of (batch_id, number of ranges started)
+    """
+    conn = get_db_connection()
+    try:
+        run = find_run(conn, bucket, key, sequencer)
+        if run is None:
+            header_line, ranges = find_split_ranges(bucket, key, size, workers, client)
+            run = register_run(conn, bucket, key, sequencer, header_line, ranges)
+            logger.info(f"Split {key} ({size} bytes) into {len(ranges)} ranges for batch {run['batch_id']}")
+        else:
+            logger.info(f"Event for {key} already has batch {run['batch_id']} ({run['status']}), resuming it")
+        pending = unstarted_ranges(conn, run['batch_id']) if run['status'] == 'running' else []
+    finally:
+        release_db_connection(conn)
+    
+    for start, end in pending:
+        _invoke_range_worker(bucket, key, start, end, run['header_line'], run['batch_id'])
+    return run['batch_id'], len(pending)
+
+def load_range_task(task):
+    """
+    Load one byte range in a worker invocation started by dispatch_ranges.
+    
+    The range is claimed first, so a duplicate delivery of a range that is
+    done or still being loaded does nothing. A failed attempt is recorded and
+    re-raised, so Lambda retries the invocation. The worker that completes
+    the run triggers the matching workflow.
+    
+    Args:
+        task: Payload of the invocation with bucket, key, start, end, header_line and batch_id
+        
+    Returns:
+        ingest_users summary of the range, or None when it was not claimed
+    """
+    batch_id, start = task['batch_id'], task['start']
+    conn = get_db_connection()
+    try:
+        if not claim_range(conn, batch_id, start):
+            logger.info(f"Range at byte {start} of batch {batch_id} is done or claimed by another worker, skipping")
+            return None
+        
+        try:
+            summary = process_range(task['bucket'], task['key'], start, task['end'], task['header_line'], batch_id)
+        except Exception as e:
+            fail_range(conn, batch_id, start, str(e))
+            raise
+        
+        finish_range(conn, batch_id, start, summary)
+        merged = complete_run(conn, batch_id, merge_summaries)
+    finally:
+        release_db_connection(conn)
+    
+    if merged is not None:
+        logger.info(f"Batch {batch_id} complete: {merged['processed']} valid rows, {merged['loaded']} users loaded, {merged['rejected']} rejected")
+        if merged['processed']:
+            trigger_n8n_webhook(batch_id)
+    return summary
+
+def ingest_object_parallel(bucket, key, size, batch_id, workers=INGEST_PARALLELISM, client=None):
+    """
+    Load a large S3 CSV object by processing newline-aligned byte ranges in a local process pool.
+    
+    Used when INGEST_WORKER_FUNCTION is unset; on Lambda, which has no shared
+    memory for multiprocessing, dispatch_ranges fans the ranges out to worker
+    invocations instead. All ranges share the same batch_id and their
+    summaries are merged.
+    
+    Args:
+        bucket: S3 bucket name
+        key: S3 object key
+        size: Object size in bytes
+        batch_id: Batch identifier to stamp on every user
+        workers: Number of ranges processed concurrently
+        client: S3 client (must be picklable)
+        
+    Returns:
+        Merged ingest summary
+    """
+    header_line, ranges = find_split_ranges(bucket, key, size, workers, client)
+    logger.info(f"Split {key} ({size} bytes) into {len(ranges)} ranges")
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_range, bucket, key, start, end, header_line, batch_id, client)
+            for start, end in ranges
+        ]
+        summaries = [future.result() for future in futures]
+    
+    return merge_summaries(summaries)
+
 def trigger_n8n_webhook(batch_id):
     """Trigger the n8n webhook to start the matching workflow"""
     webhook_url = os.environ.get('N8N_WEBHOOK_URL')
@@ -161,6 +668,15 @@ def trigger_n8n_webhook(batch_id):
 
 def handler(event, context):
     """Lambda handler function"""
+    # Asynchronous worker invocation from dispatch_ranges: load one byte range only.
+    # Errors propagate so Lambda retries the invocation.
+    if 'ingest_range' in event:
+        summary = load_range_task(event['ingest_range'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'summary': summary})
+        }
+    
     # Generate a unique batch ID for this processing run
     batch_id = str(uuid.uuid4())
     
@@ -171,30 +687,38 @@ def handler(event, context):
     logger.info(f"Processing file {key} from bucket {bucket}")
     
     try:
-        # Get the CSV file from S3
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        file_content = response['Body'].read().decode('utf-8')
+        size = event['Records'][0]['s3']['object'].get('size')
+        if size is None:
+            size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
         
-        # Process the CSV data
-        users = process_csv(file_content)
-        logger.info(f"Processed {len(users)} valid user records from CSV")
+        if size > INGEST_SPLIT_THRESHOLD_BYTES and INGEST_PARALLELISM > 1 and INGEST_WORKER_FUNCTION:
+            # Fan large objects out to asynchronous range workers; the last one triggers matching
+            sequencer = event['Records'][0]['s3']['object'].get('sequencer') or batch_id
+            batch_id, started = dispatch_ranges(bucket, key, size, sequencer)
+            return {
+                'statusCode': 202,
+                'body': json.dumps({
+                    'message': 'CSV split into byte ranges loaded by worker invocations',
+                    'batch_id': batch_id,
+                    'ranges_started': started
+                })
+            }
+        
+        if size > INGEST_SPLIT_THRESHOLD_BYTES and INGEST_PARALLELISM > 1:
+            # Fan large objects out over byte ranges under the same batch_id
+            summary = ingest_object_parallel(bucket, key, size, batch_id)
+        else:
+            # Stream the CSV file from S3 and flush users in bounded chunks
+            summary = ingest_users(iter_s3_chunks(bucket, key), batch_id)
+        logger.info(f"Processed {summary['processed']} valid user records from CSV")
+        logger.info(f"Inserted/updated {summary['loaded']} users in the database")
         
-        if not users:
+        if not summary['processed']:
             return {
                 'statusCode': 400,
                 'body': json.dumps({'message': 'No valid user records found in CSV'})
             }
         
-        # Connect to the database
-        conn = get_db_connection()
-        
-        # Insert users into the database
-        inserted_count = insert_users_to_db(conn, users, batch_id)
-        logger.info(f"Inserted/updated {inserted_count} users in the database")
-        
-        # Close database connection
-        conn.close()
-        
         # Trigger n8n webhook to start the matching workflow
         webhook_triggered = trigger_n8n_webhook(batch_id)
         
@@ -202,8 +726,11 @@ def handler(event, context):
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'CSV processing completed successfully',
-                'processed_records': len(users),
-                'inserted_records': inserted_count,
+                'processed_records': summary['processed'],
+                'inserted_records': summary['loaded'],
+                'rejected_records': summary['rejected'],
+                'reject_reasons': summary['reject_reasons'],
+                'rejects': summary['reject_samples'],
                 'batch_id': batch_id,
                 'webhook_triggered': webhook_triggered
             })
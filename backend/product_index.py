@@ -0,0 +1,105 @@
+import numpy as np
+
+# Borderline band used by the LLM case selection: credit score up to this many points below the minimum...
+BORDERLINE_CREDIT_BAND = 30
+# ...and monthly income at least this fraction of the minimum
+BORDERLINE_INCOME_RATIO = 0.9
+
+class ProductIndex:
+    """
+    Loan product criteria sorted by min_credit_score.
+
+    Products without a min_credit_score can never match (NULL comparisons are
+    false in SQL), so they are left out. The products a user can qualify for
+    on credit score are then a prefix of the sorted arrays, and the borderline
+    products are a contiguous slice, both found by binary search in O(log P).
+    The remaining criteria are checked on that range only.
+    """
+
+    def __init__(self, products):
+        """
+        Args:
+            products: Dict of numpy column arrays as returned by matching_engine.load_products
+        """
+        credit = products["min_credit_score"]
+        keep = np.flatnonzero(~np.isnan(credit))
+        order = keep[np.argsort(credit[keep], kind="stable")]
+
+        self.product_id = products["product_id"][order]
+        self.min_credit_score = products["min_credit_score"][order]
+        self.min_monthly_income = products["min_monthly_income"][order]
+        self.min_age = products["min_age"][order]
+        self.max_age = products["max_age"][order]
+        self.max_debt_to_income = products["max_debt_to_income"][order]
+
+    def __len__(self):
+        return len(self.product_id)
+
+    def credit_prefix(self, credit_score):
+        """Return the end of the prefix of products whose min_credit_score is <= credit_score"""
+        return int(np.searchsorted(self.min_credit_score, credit_score, side="right"))
+
+    def borderline_range(self, credit_score, band=BORDERLINE_CREDIT_BAND):
+        """Return (start, end) of the products whose min_credit_score is in [credit_score, credit_score + band]"""
+        start = int(np.searchsorted(self.min_credit_score, credit_score, side="left"))
+        end = int(np.searchsorted(self.min_credit_score, credit_score + band, side="right"))
+        return start, end
+
+    def eligible_mask(self, start, end, credit_score, monthly_income, age, debt_to_income_ratio):
+        """
+        Evaluate the strict eligibility rules for products[start:end].
+
+        Scalars or column vectors of users broadcast against the product range.
+        """
+        products = slice(start, end)
+        max_age = self.max_age[products]
+        max_dti = self.max_debt_to_income[products]
+        return (
+            (credit_score >= self.min_credit_score[products])
+            & (monthly_income >= self.min_monthly_income[products])
+            & (age >= self.min_age[products])
+            & (np.isnan(max_age) | (age <= max_age))
+            & (np.isnan(max_dti) | (debt_to_income_ratio <= max_dti))
+        )
+
+    def eligible(self, credit_score, monthly_income, age, debt_to_income_ratio=None):
+        """
+        Return the IDs of the products a user is strictly eligible for.
+
+        Args:
+            credit_score: User credit score
+            monthly_income: User monthly income
+            age: User age
+            debt_to_income_ratio: User DTI; None counts as 0
+
+        Returns:
+            Array of product IDs
+        """
+        end = self.credit_prefix(credit_score)
+        mask = self.eligible_mask(0, end, credit_score, monthly_income, age, debt_to_income_ratio or 0.0)
+        return self.product_id[:end][mask]
+
+    def borderline(self, credit_score, monthly_income, age, debt_to_income_ratio=None,
+                   band=BORDERLINE_CREDIT_BAND, income_ratio=BORDERLINE_INCOME_RATIO):
+        """
+        Return the IDs of the products a user is borderline for.
+
+        Borderline means the credit score is at most band points below the
+        minimum, the income is at least income_ratio of the minimum, and the
+        user is not strictly eligible.
+
+        Args:
+            credit_score: User credit score
+            monthly_income: User monthly income
+            age: User age
+            debt_to_income_ratio: User DTI; None counts as 0
+            band: Credit score band below the minimum
+            income_ratio: Fraction of the minimum income required
+
+        Returns:
+            Array of product IDs
+        """
+        start, end = self.borderline_range(credit_score, band)
+        mask = monthly_income >= self.min_monthly_income[start:end] * income_ratio
+        mask &= ~self.eligible_mask(start, end, credit_score, monthly_income, age, debt_to_income_ratio or 0.0)
+        return self.product_id[start:end][mask]
@@ -1,51 +1,73 @@
 import os
 import json
+import time
 import logging
 import boto3
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from botocore.exceptions import ClientError
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import hashlib
+from itertools import groupby, islice
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from db import get_db_connection, release_db_connection
+from token_bucket import TokenBucket
+from email_templates import EMAIL_TEMPLATE_VERSION, render_email, build_raw_message
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Database connection parameters
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME")
-DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
-DB_PORT = os.environ.get("DB_PORT", "5432")
-
 # Email configuration
 SENDER_EMAIL = os.environ.get("SENDER_EMAIL", "notifications@loaneligibility.example.com")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
-# Initialize AWS SES client
-ses_client = boto3.client('ses', region_name=AWS_REGION)
+# Override to send through a local SES stand-in such as tools/mock_ses_server.py
+SES_ENDPOINT_URL = os.environ.get("SES_ENDPOINT_URL") or None
 
-def get_db_connection():
-    """Create a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise e
+# Maximum emails per second, matching the account's SES sending quota
+SES_MAX_SEND_RATE = float(os.environ.get("SES_MAX_SEND_RATE", "14"))
+
+# SES requests in flight at once
+SES_MAX_CONCURRENCY = int(os.environ.get("SES_MAX_CONCURRENCY", "10"))
+
+# Threads rendering email bodies ahead of the senders
+EMAIL_RENDER_WORKERS = int(os.environ.get("EMAIL_RENDER_WORKERS", "2"))
+
+# Match rows fetched per keyset page of unnotified matches
+NOTIFY_FETCH_SIZE = int(os.environ.get("NOTIFY_FETCH_SIZE", "2000"))
+
+# Users claimed in the outbox together; their notification records are flushed at least once per group
+NOTIFY_COMMIT_EVERY = int(os.environ.get("NOTIFY_COMMIT_EVERY", "500"))
+
+# Seconds of sending between flushes: emails are handed to SES in waves of this many seconds at SES_MAX_SEND_RATE
+NOTIFY_FLUSH_SECONDS = float(os.environ.get("NOTIFY_FLUSH_SECONDS", "10"))
+
+# No more emails are claimed or sent when less than this many seconds of the invocation remain
+NOTIFY_STOP_SECONDS = float(os.environ.get("NOTIFY_STOP_SECONDS", "30"))
+
+# Age after which an outbox claim still 'sending' belongs to a dead run; above the Lambda timeout
+NOTIFY_CLAIM_STALE_SECONDS = int(os.environ.get("NOTIFY_CLAIM_STALE_SECONDS", "1800"))
+
+# 'compact' logs each email's template version, products and content hash; 'full' also keeps the HTML
+NOTIFICATION_LOG_MODE = os.environ.get("NOTIFICATION_LOG_MODE", "compact")
 
-def format_currency(amount):
-    """Format a number as USD currency."""
-    if amount is None:
-        return "N/A"
-    return "${:,.0f}".format(float(amount))
+# Minimum hours between two digest emails to the same user
+NOTIFY_DIGEST_HOURS = float(os.environ.get("NOTIFY_DIGEST_HOURS", "24"))
+
+# Days of unnotified matches a digest covers, skipping older partitions of matches; 0 covers them all
+NOTIFY_DIGEST_LOOKBACK_DAYS = int(os.environ.get("NOTIFY_DIGEST_LOOKBACK_DAYS", "0"))
+
+# Attempts per email when SES reports that the sending rate was exceeded
+SES_THROTTLE_RETRIES = int(os.environ.get("SES_THROTTLE_RETRIES", "3"))
+
+# Initialize AWS SES client, with a connection per concurrent sender
+ses_client = boto3.client(
+    'ses',
+    region_name=AWS_REGION,
+    endpoint_url=SES_ENDPOINT_URL,
+    config=Config(max_pool_connections=max(10, SES_MAX_CONCURRENCY))
+)
 
 def send_email(recipient, subject, html_body):
     """
@@ -60,20 +82,14 @@ def send_email(recipient, subject, html_body):
         Dict with status and message
     """
     # Create a multipart message
-    msg = MIMEMultipart()
-    msg['Subject'] = subject
-    msg['From'] = SENDER_EMAIL
-    msg['To'] = recipient
-    
-    # Add HTML body
-    msg.attach(MIMEText(html_body, 'html'))
+    raw_message = build_raw_message(SENDER_EMAIL, recipient, subject, html_body)
     
     try:
         # Send the email
         response = ses_client.send_raw_email(
             Source=SENDER_EMAIL,
             Destinations=[recipient],
-            RawMessage={'Data': msg.as_string()}
+            RawMessage={'Data': raw_message}
         )
         
         logger.info(f"Email sent! Message ID: {response['MessageId']}")
@@ -86,13 +102,25 @@ def send_email(recipient, subject, html_body):
         logger.error(f"Error sending email: {e.response['Error']['Message']}")
         return {
             "status": "error",
+            "code": e.response['Error'].get('Code'),
             "message": e.response['Error']['Message']
         }
+    except BotoCoreError as e:
+        # Timeouts, connection and credential errors never reach SES as a request
+        logger.error(f"Error sending email: {str(e)}")
+        return {
+            "status": "error",
+            "code": type(e).__name__,
+            "message": str(e)
+        }
 
 def generate_email_content(user, matches):
     """
     Generate personalized email content based on user data and loan matches.
     
+    The HTML shell and loan cards are precompiled in email_templates, and
+    each product's card is rendered once and shared by all its matches.
+    
     Args:
         user: Dict containing user information
         matches: List of dicts containing loan product matches
@@ -100,84 +128,562 @@ def generate_email_content(user, matches):
     Returns:
         Tuple of (subject, html_body)
     """
-    # Generate the email subject
-    subject = f"Good news! We've found {len(matches)} loan {len(matches) == 1 and 'option' or 'options'} for you"
-    
-    # Generate the email body
-    html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-  <style>
-    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-    .header {{ background-color: #3498db; color: white; padding: 20px; text-align: center; }}
-    .content {{ padding: 20px; }}
-    .loan-item {{ border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }}
-    .loan-name {{ color: #3498db; font-size: 18px; font-weight: bold; }}
-    .loan-provider {{ color: #777; }}
-    .loan-details {{ margin-top: 10px; }}
-    .loan-match {{ background-color: #f8f9fa; padding: 5px 10px; border-radius: 15px; font-size: 14px; }}
-    .footer {{ background-color: #f8f9fa; padding: 20px; text-align: center; font-size: 12px; color: #777; }}
-    .button {{ display: inline-block; background-color: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; }}
-  </style>
-</head>
-<body>
-  <div class="container">
-    <div class="header">
-      <h1>Loan Eligibility Results</h1>
-    </div>
-    <div class="content">
-      <p>Dear {user['email'].split('@')[0]},</p>
-      <p>We're pleased to inform you that based on your financial profile, you may be eligible for the following loan products:</p>
-"""
+    return render_email(user, matches)
+
+def iter_unnotified_matches(conn, batch_id=None, user_id=None, digest_hours=None, lookback_days=None):
+    """
+    Stream users and their unnotified matches, a keyset page at a time.
+    
+    Rows are read NOTIFY_FETCH_SIZE at a time in (user_id, match_id) order,
+    each page starting after the last row of the previous one, and grouped
+    by user, so memory stays bounded however large the batch is. Every page
+    is its own short query, so the commits made while the groups are
+    processed end no cursor, and nothing is materialized on the server as a
+    WITH HOLD cursor would be at the first commit. Rows keep their column
+    types, which the email templates rely on, unlike a json_agg of the matches.
+    
+    Args:
+        conn: Database connection
+        batch_id: Batch whose users to notify
+        user_id: Single user to notify, instead of a batch
+        digest_hours: Skip users sent an email within this many hours; their
+                      matches from every batch wait for the next digest
+        lookback_days: Only consider matches created within this many days
+        
+    Users with an unconfirmed send in notification_outbox are skipped, and
+    so are matches the AI found ineligible.
+    matches is partitioned by created_at, and created_at is bounded by the
+    users' creation time, as no match is older than its user: a user or
+    batch only reads the partitions from then on. A digest of every user
+    reads the unnotified index of each partition, unless lookback_days cuts
+    off the older partitions.
+        
+    Yields:
+        (user, matches) tuples, matches best match_score first
+    """
+    conditions = [
+        "m.notified = FALSE",
+        # Matches the AI found ineligible only record its verdict
+        "m.ai_eligible IS NOT FALSE",
+        """NOT EXISTS (
+                SELECT 1 FROM notification_outbox o
+                WHERE o.user_id = u.user_id
+                AND o.status = 'sending'
+            )"""
+    ]
+    params = []
+    if user_id is not None:
+        conditions.append("u.user_id = %s")
+        conditions.append("m.created_at >= (SELECT created_at FROM users WHERE user_id = %s)")
+        params.extend([user_id, user_id])
+    elif batch_id is not None:
+        conditions.append("u.batch_id = %s")
+        conditions.append("m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %s)")
+        params.extend([batch_id, batch_id])
+    else:
+        conditions.append("m.created_at >= u.created_at")
+    if lookback_days is not None:
+        conditions.append("m.created_at > NOW() - make_interval(days => %s)")
+        params.append(lookback_days)
+    if digest_hours is not None:
+        conditions.append("""NOT EXISTS (
+                SELECT 1 FROM notifications n
+                WHERE n.user_id = u.user_id
+                AND n.status = 'sent'
+                AND n.sent_at > NOW() - make_interval(secs => %s)
+            )""")
+        params.append(digest_hours * 3600)
+    
+    conditions.append("(m.user_id, m.match_id) > (%s, %s)")
+    query = """
+            SELECT u.user_id, u.email, u.monthly_income, u.credit_score,
+                   m.match_id, m.created_at, m.product_id, m.match_score,
+                   lp.provider_name, lp.product_name, lp.interest_rate,
+                   lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+            FROM users u
+            JOIN matches m ON m.user_id = u.user_id
+            JOIN loan_products lp ON m.product_id = lp.product_id
+            WHERE """ + " AND ".join(conditions) + """
+            ORDER BY m.user_id, m.match_id
+            LIMIT %s
+        """
+    
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    after = (0, 0)
+    # Rows of the last user of a page, whose matches may go on in the next page
+    pending = []
+    
+    try:
+        while True:
+            cursor.execute(query, params + [*after, NOTIFY_FETCH_SIZE])
+            rows = cursor.fetchall()
+            
+            for user_id, group in groupby(rows, key=itemgetter('user_id')):
+                if pending and pending[0]['user_id'] != user_id:
+                    yield user_matches(pending)
+                    pending = []
+                pending.extend(group)
+            
+            if len(rows) < NOTIFY_FETCH_SIZE:
+                break
+            after = (rows[-1]['user_id'], rows[-1]['match_id'])
+        
+        if pending:
+            yield user_matches(pending)
+    finally:
+        cursor.close()
+
+def user_matches(rows):
+    """
+    Build the (user, matches) tuple of one user's match rows.
+    
+    Args:
+        rows: Match rows of one user, with the user's columns
+        
+    Returns:
+        (user, matches) tuple, matches best match_score first, unscored first
+        as in ORDER BY match_score DESC
+    """
+    matches = sorted(rows, key=lambda match: (
+        match['match_score'] is not None, -(match['match_score'] or 0), match['match_id']
+    ))
+    user = {
+        "user_id": matches[0]['user_id'],
+        "email": matches[0]['email'],
+        "monthly_income": matches[0]['monthly_income'],
+        "credit_score": matches[0]['credit_score']
+    }
+    return user, matches
+
+def deliver_email(rate_limiter, recipient, subject, html_body):
+    """
+    Send one email within the SES sending rate, retrying when SES throttles.
+    
+    Args:
+        rate_limiter: TokenBucket shared by all senders
+        recipient: Email address of the recipient
+        subject: Email subject line
+        html_body: HTML content of the email
+        
+    Returns:
+        Dict with status and message, as returned by send_email; SES and
+        botocore errors come back as an error status, never raised
+    """
+    for attempt in range(SES_THROTTLE_RETRIES):
+        rate_limiter.acquire()
+        email_result = send_email(recipient, subject, html_body)
+        if email_result.get('code') != 'Throttling':
+            break
+        # Back off only when another attempt follows
+        if attempt < SES_THROTTLE_RETRIES - 1:
+            time.sleep(2 ** attempt)
+    return email_result
+
+def notification_key(user, matches):
+    """Idempotency key of the email notifying a user about a set of matches"""
+    match_ids = ",".join(str(match_id) for match_id in sorted(match['match_id'] for match in matches))
+    return hashlib.sha256(f"{user['user_id']}:{match_ids}".encode("utf-8")).hexdigest()
+
+def claim_notifications(cursor, window):
+    """
+    Record the emails about to be sent in the outbox, before sending them.
+    
+    The caller commits the claims before any email goes out. An email is
+    only sent if its claim is new, so a repeated or concurrent run never
+    sends the same email twice.
+    
+    Args:
+        cursor: Database cursor
+        window: List of (user, matches) tuples
+        
+    Returns:
+        Set of idempotency keys claimed by this call
+    """
+    rows = [
+        (notification_key(user, matches), user['user_id'], [match['match_id'] for match in matches])
+        for user, matches in window
+    ]
+    claimed = execute_values(cursor, """
+        INSERT INTO notification_outbox (idempotency_key, user_id, match_ids)
+        VALUES %s
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING idempotency_key
+    """, rows, page_size=len(rows), fetch=True)
+    return {row[0] for row in claimed}
+
+def mark_attempted(cursor, keys):
+    """
+    Record that the emails of outbox claims are being handed to SES.
+    
+    The caller commits before sending, so a claim left 'sending' by a dead
+    run without attempted_at is known never to have been sent.
+    
+    Args:
+        cursor: Database cursor
+        keys: Idempotency keys of the emails about to be sent
+    """
+    cursor.execute("""
+        UPDATE notification_outbox SET attempted_at = NOW()
+        WHERE idempotency_key = ANY(%s) AND status = 'sending'
+    """, (list(keys),))
+
+def release_claims(cursor, keys):
+    """
+    Delete outbox claims whose emails were not sent, so a later run retries them.
+    
+    Args:
+        cursor: Database cursor
+        keys: Idempotency keys of the unsent emails
+    """
+    cursor.execute("""
+        DELETE FROM notification_outbox
+        WHERE idempotency_key = ANY(%s) AND status = 'sending'
+    """, (list(keys),))
+
+def reconcile_stale_claims(conn, stale_seconds=NOTIFY_CLAIM_STALE_SECONDS):
+    """
+    Settle outbox claims left 'sending' by runs that died.
+    
+    Users with a 'sending' claim are skipped by iter_unnotified_matches, so
+    stale claims must not stay. A claim never attempted was not sent and is
+    deleted, so its matches are notified by a later run. A claim attempted
+    may have been delivered: it is marked 'unconfirmed' and its matches
+    notified, so the email is never sent twice.
+    
+    Args:
+        conn: Database connection
+        stale_seconds: Age of a claim, or of its attempt, after which its run is dead
+        
+    Returns:
+        Tuple of (claims released, claims marked unconfirmed)
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("""
+                DELETE FROM notification_outbox
+                WHERE status = 'sending' AND attempted_at IS NULL
+                AND claimed_at < NOW() - make_interval(secs => %s)
+            """, (stale_seconds,))
+            released = cursor.rowcount
+            
+            cursor.execute("""
+                UPDATE notification_outbox SET status = 'unconfirmed'
+                WHERE status = 'sending'
+                AND attempted_at < NOW() - make_interval(secs => %s)
+                RETURNING match_ids, claimed_at
+            """, (stale_seconds,))
+            settled = cursor.fetchall()
+            if settled:
+                # No match is newer than the claim on it
+                execute_values(cursor, """
+                    UPDATE matches AS m
+                    SET notified = TRUE
+                    FROM (VALUES %s) AS v(match_ids, claimed_at)
+                    WHERE m.match_id = ANY(v.match_ids)
+                    AND m.created_at <= v.claimed_at
+                """, settled, template="(%s::integer[], %s::timestamp)", page_size=len(settled))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    if released or settled:
+        logger.warning(f"Reconciled stale outbox claims: {released} released, {len(settled)} unconfirmed")
+    return released, len(settled)
+
+def flush_notifications(cursor, sent, failed_keys):
+    """
+    Record a group of sends with one statement per table.
+    
+    Matches of sent emails are flagged notified through a VALUES join on
+    (match_id, created_at), which reads only the partitions of matches from
+    the oldest of them on; the emails are logged with one multi-row INSERT
+    and their outbox claims are confirmed. Claims of failed sends are
+    released so a later run retries them. The caller commits, making all of
+    it atomic.
+    
+    The log entry keeps the template version, the products with their match
+    scores and a SHA-256 of the HTML, from which reconstruct_notification
+    renders the email again. The HTML itself is only stored when
+    NOTIFICATION_LOG_MODE is 'full'.
+    
+    Args:
+        cursor: Database cursor
+        sent: List of (key, user, matches, subject, html_body, message_id) tuples
+        failed_keys: Idempotency keys of emails SES did not accept
+    """
+    if sent:
+        match_keys = [(match['match_id'], match['created_at']) for _, _, matches, _, _, _ in sent for match in matches]
+        execute_values(cursor, """
+            WITH v (match_id, created_at) AS (
+                VALUES %s
+            )
+            UPDATE matches AS m
+            SET notified = TRUE
+            FROM v
+            WHERE m.match_id = v.match_id
+            AND m.created_at = v.created_at
+            AND m.created_at >= (SELECT MIN(created_at) FROM v)
+        """, match_keys, template="(%s::integer, %s::timestamp)", page_size=len(match_keys))
+        
+        execute_values(cursor, """
+            INSERT INTO notifications
+            (user_id, email_subject, email_body, status, template_version, match_items, content_hash)
+            VALUES %s
+        """, [
+            (
+                user['user_id'],
+                subject,
+                html_body if NOTIFICATION_LOG_MODE == "full" else None,
+                'sent',
+                EMAIL_TEMPLATE_VERSION,
+                Json([{"product_id": match['product_id'], "match_score": float(match['match_score'])} for match in matches]),
+                hashlib.sha256(html_body.encode("utf-8")).hexdigest()
+            )
+            for _, user, matches, subject, html_body, _ in sent
+        ], page_size=len(sent))
+        
+        execute_values(cursor, """
+            UPDATE notification_outbox AS o
+            SET status = 'sent', message_id = v.message_id, sent_at = NOW()
+            FROM (VALUES %s) AS v(idempotency_key, message_id)
+            WHERE o.idempotency_key = v.idempotency_key
+        """, [(key, message_id) for key, _, _, _, _, message_id in sent], page_size=len(sent))
+    
+    if failed_keys:
+        release_claims(cursor, failed_keys)
 
-    # Add each loan product to the email
-    for match in matches:
-        match_score = round(float(match['match_score']))
-        html_body += f"""
-      <div class="loan-item">
-        <div class="loan-name">{match['product_name']}</div>
-        <div class="loan-provider">from {match['provider_name']}</div>
-        <div class="loan-details">
-          <p><strong>Interest Rate:</strong> {match['interest_rate']}%</p>
-          <p><strong>Loan Amount:</strong> {format_currency(match['min_loan_amount'])} - {format_currency(match['max_loan_amount'])}</p>
-          <p><strong>Term:</strong> {match['loan_term_months']} months</p>
-          <p><span class="loan-match">Match Score: {match_score}%</span></p>
-        </div>
-      </div>
-"""
+def reconstruct_notification(conn, notification_id, sent_on=None):
+    """
+    Render a logged notification email again.
+    
+    Compact entries are rendered from their template version, products and
+    match scores, using the current product details; verified tells whether
+    the result still hashes to the content that was sent.
+    
+    Args:
+        conn: Database connection
+        notification_id: ID of the notifications row
+        sent_on: Optional date (YYYY-MM-DD) the email was sent on, so that
+                 only the partition of notifications holding it is searched
+        
+    Returns:
+        Dict with the subject, HTML body and verification status, or None if
+        the notification does not exist
+        
+    Raises:
+        ValueError: If the entry cannot be rendered with the current templates
+    """
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    try:
+        cursor.execute("""
+            SELECT n.notification_id, n.user_id, u.email, n.email_subject, n.email_body,
+                   n.template_version, n.match_items, n.content_hash, n.sent_at
+            FROM notifications n
+            JOIN users u ON u.user_id = n.user_id
+            WHERE n.notification_id = %s
+            AND (%s::date IS NULL OR (n.sent_at >= %s::date AND n.sent_at < %s::date + 1))
+        """, (notification_id, sent_on, sent_on, sent_on))
+        notification = cursor.fetchone()
+        
+        if not notification:
+            return None
+        
+        html_body = notification['email_body']
+        if html_body is None:
+            if notification['template_version'] != EMAIL_TEMPLATE_VERSION or notification['match_items'] is None:
+                raise ValueError(f"Notification {notification_id} was rendered with template version {notification['template_version']}")
+            
+            items = notification['match_items']
+            cursor.execute("""
+                SELECT product_id, provider_name, product_name, interest_rate,
+                       min_loan_amount, max_loan_amount, loan_term_months
+                FROM loan_products
+                WHERE product_id = ANY(%s)
+            """, ([item['product_id'] for item in items],))
+            products = {product['product_id']: product for product in cursor.fetchall()}
+            
+            missing = [item['product_id'] for item in items if item['product_id'] not in products]
+            if missing:
+                raise ValueError(f"Loan products {missing} of notification {notification_id} no longer exist")
+            
+            matches = [dict(products[item['product_id']], match_score=item['match_score']) for item in items]
+            _, html_body = render_email(notification, matches)
+        
+        content_hash = hashlib.sha256(html_body.encode("utf-8")).hexdigest()
+        return {
+            "notification_id": notification['notification_id'],
+            "user_id": notification['user_id'],
+            "email": notification['email'],
+            "subject": notification['email_subject'],
+            "html_body": html_body,
+            "sent_at": notification['sent_at'].isoformat() if notification['sent_at'] else None,
+            "verified": content_hash == notification['content_hash'] if notification['content_hash'] else None
+        }
+    finally:
+        cursor.close()
 
-    # Complete the email
-    html_body += f"""
-      <p>These matches are based on the information you provided. To proceed with any of these options, please visit the lender's website or contact them directly.</p>
-      <p>If you have any questions about these recommendations, feel free to contact our support team.</p>
-      <p>Best regards,<br>Loan Eligibility Engine Team</p>
-    </div>
-    <div class="footer">
-      <p>This is an automated email. Please do not reply directly to this message.</p>
-      <p>© {2023} Loan Eligibility Engine</p>
-    </div>
-  </div>
-</body>
-</html>
-"""
-    
-    return subject, html_body
+def notify_users(conn, groups, deadline=None):
+    """
+    Render and send the notification emails of many users.
+    
+    Emails are rendered by a pool of EMAIL_RENDER_WORKERS threads and sent by
+    up to SES_MAX_CONCURRENCY threads, together limited to SES_MAX_SEND_RATE
+    emails per second.
+    
+    Users are taken NOTIFY_COMMIT_EVERY at a time. Each group is claimed in
+    notification_outbox and committed before sending. Its emails are then
+    handed to SES in waves of NOTIFY_FLUSH_SECONDS of sending: each wave's
+    claims are marked attempted in the commit that flushes the previous
+    wave's results. Claims whose emails were not handed to SES, because
+    time ran out or an error stopped the run, are released on the way out.
+    If the Lambda dies mid-wave, reconcile_stale_claims settles its claims
+    once they are stale.
+    
+    Args:
+        conn: Database connection
+        groups: Iterable of (user, matches) tuples, e.g. from iter_unnotified_matches
+        deadline: time.monotonic() value to stop claiming and sending at,
+                  NOTIFY_STOP_SECONDS ahead of it
+        
+    Returns:
+        Tuple of (list of per-user result dicts, number of commits made)
+    """
+    results = []
+    rate_limiter = TokenBucket(SES_MAX_SEND_RATE)
+    groups = iter(groups)
+    cursor = conn.cursor()
+    commits = 0
+    wave_size = max(SES_MAX_CONCURRENCY, int(SES_MAX_SEND_RATE * NOTIFY_FLUSH_SECONDS))
+    # Claimed keys whose emails were not handed to SES yet
+    unsent = set()
+    
+    def render(group):
+        return generate_email_content(*group)
+    
+    def out_of_time():
+        return deadline is not None and deadline - time.monotonic() < NOTIFY_STOP_SECONDS
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, EMAIL_RENDER_WORKERS)) as render_pool, \
+             ThreadPoolExecutor(max_workers=max(1, SES_MAX_CONCURRENCY)) as send_pool:
+            while not out_of_time():
+                window = list(islice(groups, NOTIFY_COMMIT_EVERY))
+                if not window:
+                    break
+                
+                claimed = claim_notifications(cursor, window)
+                conn.commit()
+                commits += 1
+                unsent.update(claimed)
+                
+                claimed_window = []
+                for user, matches in window:
+                    if notification_key(user, matches) in claimed:
+                        claimed_window.append((user, matches))
+                    else:
+                        results.append({
+                            "user_id": user['user_id'],
+                            "email": user['email'],
+                            "status": "skipped",
+                            "reason": "Already being notified by another run"
+                        })
+                
+                # Rendering runs ahead of the waves of sends
+                rendered = zip(claimed_window, render_pool.map(render, claimed_window))
+                sent, failed_keys = [], []
+                while True:
+                    wave = list(islice(rendered, wave_size))
+                    if not wave:
+                        break
+                    if out_of_time():
+                        logger.info(f"Stopping with {deadline - time.monotonic():.0f}s left; releasing {len(unsent)} unsent claims")
+                        break
+                    
+                    keys = [notification_key(user, matches) for (user, matches), _ in wave]
+                    flush_notifications(cursor, sent, failed_keys)
+                    mark_attempted(cursor, keys)
+                    conn.commit()
+                    commits += 1
+                    unsent.difference_update(keys)
+                    
+                    sends = [
+                        (key, user, matches, subject, html_body,
+                         send_pool.submit(deliver_email, rate_limiter, user['email'], subject, html_body))
+                        for key, ((user, matches), (subject, html_body)) in zip(keys, wave)
+                    ]
+                    
+                    sent, failed_keys = [], []
+                    for key, user, matches, subject, html_body, future in sends:
+                        email_result = future.result()
+                        
+                        if email_result['status'] == 'success':
+                            sent.append((key, user, matches, subject, html_body, email_result.get('message_id')))
+                            results.append({
+                                "user_id": user['user_id'],
+                                "email": user['email'],
+                                "status": "sent",
+                                "matches_count": len(matches),
+                                "message_id": email_result.get('message_id')
+                            })
+                        else:
+                            failed_keys.append(key)
+                            results.append({
+                                "user_id": user['user_id'],
+                                "email": user['email'],
+                                "status": "error",
+                                "reason": email_result.get('message')
+                            })
+                
+                if sent or failed_keys:
+                    flush_notifications(cursor, sent, failed_keys)
+                    conn.commit()
+                    commits += 1
+                
+                logger.info(f"Processed {len(results)} users with {commits} commits")
+    finally:
+        try:
+            if unsent:
+                # Nothing is left uncommitted but after an error
+                conn.rollback()
+                release_claims(cursor, unsent)
+                conn.commit()
+                commits += 1
+        finally:
+            cursor.close()
+            # Close the groups' cursor before the caller commits or rolls back
+            if hasattr(groups, "close"):
+                groups.close()
+    
+    return results, commits
 
 def lambda_handler(event, context):
     """
     AWS Lambda handler for sending loan match notifications via email.
     
     This function:
-    1. Receives user_id from the event
-    2. Retrieves user data and their loan matches from the database
-    3. Generates a personalized email
-    4. Sends the email using AWS SES
+    1. Receives user_id, batch_id or digest from the event
+    2. Retrieves the users and all of their loan matches from the database
+    3. Generates personalized emails
+    4. Sends the emails using AWS SES, several at a time within the sending rate
     5. Updates the notification status in the database
     
+    In digest mode, every user with unnotified matches from any batch gets
+    one email covering all of them, unless an email was sent to that user in
+    the last NOTIFY_DIGEST_HOURS; those users are picked up by a later
+    digest. When NOTIFY_DIGEST_LOOKBACK_DAYS is set, digests only cover
+    matches from that many last days.
+    A notification_id (optionally with the sent_on date) instead returns that
+    logged email, rendered again from the compact log.
+    
+    Sending runs settle stale outbox claims of dead runs first, and stop
+    NOTIFY_STOP_SECONDS before the invocation times out; the users left are
+    notified by a later run.
+    
     Args:
-        event: Dict containing user_id
+        event: Dict containing user_id, batch_id, digest (optionally with
+               batch_id) or notification_id, directly or in a JSON body
         context: AWS Lambda context
         
     Returns:
@@ -185,16 +691,21 @@ def lambda_handler(event, context):
     """
     try:
         # Extract parameters from the event
-        body = json.loads(event.get("body", "{}"))
+        body = event.get("body", event)
+        if isinstance(body, str):
+            body = json.loads(body or "{}")
         user_id = body.get("user_id")
         batch_id = body.get("batch_id")
+        digest = bool(body.get("digest"))
+        notification_id = body.get("notification_id")
+        sent_on = body.get("sent_on")
         
-        if not (user_id or batch_id):
+        if not (user_id or batch_id or digest or notification_id):
             return {
                 "statusCode": 400,
                 "body": json.dumps({
                     "status": "error",
-                    "message": "Missing required parameters: either user_id or batch_id"
+                    "message": "Missing required parameters: one of user_id, batch_id, digest or notification_id"
                 })
             }
         
@@ -203,6 +714,25 @@ def lambda_handler(event, context):
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
+            if notification_id:
+                notification = reconstruct_notification(conn, notification_id, sent_on)
+                if not notification:
+                    return {
+                        "statusCode": 404,
+                        "body": json.dumps({
+                            "status": "error",
+                            "message": f"Notification with ID {notification_id} not found"
+                        })
+                    }
+                
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps({
+                        "status": "success",
+                        **notification
+                    })
+                }
+            
             if user_id:
                 # Get user data for a specific user
                 cursor.execute("""
@@ -210,9 +740,9 @@ def lambda_handler(event, context):
                     FROM users
                     WHERE user_id = %s
                 """, (user_id,))
-                users = [cursor.fetchone()]
+                user = cursor.fetchone()
                 
-                if not users[0]:
+                if not user:
                     return {
                         "statusCode": 404,
                         "body": json.dumps({
@@ -220,96 +750,47 @@ def lambda_handler(event, context):
                             "message": f"User with ID {user_id} not found"
                         })
                     }
-            else:
-                # Get all users in a batch
-                cursor.execute("""
-                    SELECT DISTINCT u.user_id, u.email, u.monthly_income, u.credit_score
-                    FROM users u
-                    JOIN matches m ON u.user_id = m.user_id
-                    WHERE u.batch_id = %s
-                    AND m.notified = FALSE
-                """, (batch_id,))
-                users = cursor.fetchall()
-                
-                if not users:
-                    return {
-                        "statusCode": 200,
-                        "body": json.dumps({
-                            "status": "success",
-                            "message": f"No users found with unnotified matches in batch {batch_id}"
-                        })
-                    }
             
-            results = []
+            reconcile_stale_claims(conn)
+            deadline = None
+            if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+                deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000
             
-            # Process each user
-            for user in users:
-                # Get user's matches
-                cursor.execute("""
-                    SELECT m.match_id, m.user_id, m.product_id, m.match_score,
-                           lp.provider_name, lp.product_name, lp.interest_rate,
-                           lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
-                    FROM matches m
-                    JOIN loan_products lp ON m.product_id = lp.product_id
-                    WHERE m.user_id = %s
-                    AND m.notified = FALSE
-                    ORDER BY m.match_score DESC
-                """, (user['user_id'],))
-                matches = cursor.fetchall()
-                
-                if not matches:
-                    results.append({
+            # Every user's matches come from keyset-paged queries instead of a query per user
+            groups = iter_unnotified_matches(
+                conn,
+                batch_id=batch_id,
+                user_id=user_id,
+                digest_hours=NOTIFY_DIGEST_HOURS if digest else None,
+                lookback_days=(NOTIFY_DIGEST_LOOKBACK_DAYS or None) if digest and not (batch_id or user_id) else None
+            )
+            results, commits = notify_users(conn, groups, deadline)
+            
+            if not results:
+                if user_id:
+                    results = [{
                         "user_id": user['user_id'],
                         "email": user['email'],
                         "status": "skipped",
                         "reason": "No matches found"
-                    })
-                    continue
-                
-                # Generate email content
-                subject, html_body = generate_email_content(user, matches)
-                
-                # Send email
-                email_result = send_email(user['email'], subject, html_body)
-                
-                if email_result['status'] == 'success':
-                    # Update matches as notified
-                    match_ids = [match['match_id'] for match in matches]
-                    cursor.execute("""
-                        UPDATE matches
-                        SET notified = TRUE
-                        WHERE match_id = ANY(%s)
-                    """, (match_ids,))
-                    
-                    # Log notification
-                    cursor.execute("""
-                        INSERT INTO notifications (user_id, email_subject, email_body, status)
-                        VALUES (%s, %s, %s, 'sent')
-                    """, (user['user_id'], subject, html_body))
-                    
-                    conn.commit()
-                    
-                    results.append({
-                        "user_id": user['user_id'],
-                        "email": user['email'],
-                        "status": "sent",
-                        "matches_count": len(matches),
-                        "message_id": email_result.get('message_id')
-                    })
+                    }]
                 else:
-                    results.append({
-                        "user_id": user['user_id'],
-                        "email": user['email'],
-                        "status": "error",
-                        "reason": email_result.get('message')
-                    })
+                    return {
+                        "statusCode": 200,
+                        "body": json.dumps({
+                            "status": "success",
+                            "message": "No users due a digest email" if digest
+                                       else f"No users found with unnotified matches in batch {batch_id}"
+                        })
+                    }
             
             # Return the results
             return {
                 "statusCode": 200,
                 "body": json.dumps({
                     "status": "success",
-                    "users_processed": len(users),
+                    "users_processed": len(results),
+                    "commits": commits,
                     "results": results
                 })
             }
@@ -326,7 +807,7 @@ def lambda_handler(event, context):
             }
         finally:
             cursor.close()
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Lambda error: {str(e)}")
@@ -336,4 +817,4 @@ def lambda_handler(event, context):
                 "status": "error",
                 "message": f"Lambda error: {str(e)}"
             })
-        }
+        }
\ No newline at end of file
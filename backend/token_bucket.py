@@ -0,0 +1,52 @@
+import time
+import threading
+from typing import Optional
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the rate of outgoing API calls.
+
+    The bucket holds up to capacity tokens and refills at rate tokens per
+    second. acquire() blocks until enough tokens are available, so callers
+    on any number of threads together stay under the rate, with bursts of
+    at most capacity calls.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second; 0 or less disables limiting
+            capacity: Maximum burst size; defaults to one second of tokens
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, waiting for them if necessary.
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
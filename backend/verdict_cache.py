@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Maximum number of verdicts kept in the in-process LRU tier
+VERDICT_CACHE_SIZE = int(os.environ.get("VERDICT_CACHE_SIZE", "10000"))
+
+# Hours a cached verdict stays valid, in both tiers
+VERDICT_CACHE_TTL_HOURS = float(os.environ.get("VERDICT_CACHE_TTL_HOURS", "168"))
+
+# Optional bucket sizes for user fields in the cache key, e.g. "credit_score=10,monthly_income=250".
+# Users in the same buckets share cached verdicts; empty keeps exact values.
+VERDICT_CACHE_BUCKETS = os.environ.get("VERDICT_CACHE_BUCKETS", "")
+
+# Fields rendered into the AI prompt; only these take part in the cache key
+USER_KEY_FIELDS = [
+    "monthly_income", "credit_score", "employment_status",
+    "age", "debt_to_income_ratio", "existing_loans"
+]
+PRODUCT_KEY_FIELDS = [
+    "product_id", "provider_name", "product_name", "interest_rate",
+    "min_credit_score", "min_monthly_income", "max_debt_to_income",
+    "min_loan_amount", "max_loan_amount", "loan_term_months"
+]
+
+def parse_buckets(spec: str) -> Dict[str, float]:
+    """Parse a "field=size,field=size" bucket spec"""
+    buckets = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        field, size = item.split("=")
+        buckets[field.strip()] = float(size)
+    return buckets
+
+def _normalize(value: Any, bucket: Optional[float] = None) -> Any:
+    """Canonical JSON value: numbers as rounded floats (optionally bucketed), text trimmed and lowercased"""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        number = float(value)
+        if bucket:
+            number = (number // bucket) * bucket
+        return round(number, 4)
+    return str(value).strip().lower()
+
+class VerdictCache:
+    """
+    Two-tier cache of AI eligibility verdicts.
+
+    Verdicts are keyed on a SHA-256 of the prompt-relevant user and product
+    fields, the model and the prompt version. The first tier is a bounded
+    in-process LRU that survives warm Lambda invocations; the second is the
+    ai_verdict_cache table, whose rows for a product are deleted by a trigger
+    when that loan_products row changes.
+    """
+
+    def __init__(self, model: str, prompt_version: str, max_entries: int = VERDICT_CACHE_SIZE,
+                 ttl_hours: float = VERDICT_CACHE_TTL_HOURS, buckets: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            model: Model name the verdicts come from
+            prompt_version: Version of the prompts the verdicts come from
+            max_entries: Maximum number of verdicts kept in memory
+            ttl_hours: Hours a verdict stays valid
+            buckets: Bucket sizes per user field; defaults to VERDICT_CACHE_BUCKETS
+        """
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_hours * 3600
+        self.buckets = parse_buckets(VERDICT_CACHE_BUCKETS) if buckets is None else buckets
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the hit/miss counters"""
+        self.metrics = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit/miss counters and the overall hit rate"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        lookups = metrics["memory_hits"] + metrics["db_hits"] + metrics["misses"]
+        metrics["hit_rate"] = round((lookups - metrics["misses"]) / lookups, 4) if lookups else 0.0
+        metrics["memory_entries"] = len(self._entries)
+        return metrics
+
+    def key(self, user_data: Dict[str, Any], loan_product: Dict[str, Any], model: Optional[str] = None) -> str:
+        """
+        Build the cache key of a user/loan product pair.
+
+        Args:
+            user_data: Dictionary containing user financial information
+            loan_product: Dictionary containing loan product details
+            model: Model the verdict comes from, when a call overrides the
+                   route; defaults to the cache's model
+
+        Returns:
+            Hex SHA-256 of the canonical key document
+        """
+        document = {
+            "user": {field: _normalize(user_data.get(field), self.buckets.get(field)) for field in USER_KEY_FIELDS},
+            "product": {field: _normalize(loan_product.get(field)) for field in PRODUCT_KEY_FIELDS},
+            "model": model or self.model,
+            "prompt_version": self.prompt_version
+        }
+        canonical = json.dumps(document, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, conn=None) -> Optional[Tuple[bool, float, str]]:
+        """
+        Look up one verdict, in memory first and then in the database.
+
+        Args:
+            key: Cache key from key()
+            conn: Optional database connection for the Postgres tier
+
+        Returns:
+            (is_eligible, confidence_score, reason) or None on a miss
+        """
+        return self.get_many([key], conn).get(key)
+
+    def get_many(self, keys: Iterable[str], conn=None) -> Dict[str, Tuple[bool, float, str]]:
+        """
+        Look up several verdicts with at most one database query.
+
+        Args:
+            keys: Cache keys from key()
+            conn: Optional database connection for the Postgres tier
+
+        Returns:
+            Dict mapping each found key to (is_eligible, confidence_score, reason)
+        """
+        found = {}
+        remaining = []
+        now = time.monotonic()
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.metrics["memory_hits"] += 1
+                else:
+                    if entry:
+                        del self._entries[key]
+                    remaining.append(key)
+
+        if remaining and conn is not None:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT cache_key, eligible, confidence, reason,
+                           EXTRACT(EPOCH FROM expires_at - NOW())
+                    FROM ai_verdict_cache
+                    WHERE cache_key = ANY(%s) AND expires_at > NOW()
+                """, (remaining,))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+            with self._lock:
+                for key, eligible, confidence, reason, seconds_left in rows:
+                    verdict = (eligible, float(confidence), reason)
+                    found[key] = verdict
+                    self._remember(key, verdict, now + float(seconds_left))
+                    self.metrics["db_hits"] += 1
+
+        with self._lock:
+            self.metrics["misses"] += len(remaining) - sum(1 for key in remaining if key in found)
+
+        return found
+
+    def put(self, key: str, product_id: Optional[int], verdict: Tuple[bool, float, str], conn=None,
+            model: Optional[str] = None):
+        """
+        Store a verdict in memory and, with a connection, in the database.
+
+        The database write joins the caller's transaction; the caller commits.
+
+        Args:
+            key: Cache key from key()
+            product_id: Product the verdict is about, used for invalidation
+            verdict: (is_eligible, confidence_score, reason)
+            conn: Optional database connection for the Postgres tier
+            model: Model the key was built with; defaults to the cache's model
+        """
+        self.put_many([(key, product_id, verdict)], conn, model)
+
+    def put_many(self, entries: Iterable[Tuple[str, Optional[int], Tuple[bool, float, str]]], conn=None,
+                 model: Optional[str] = None):
+        """
+        Store several (key, product_id, verdict) entries with one database statement.
+
+        model is the one the keys were built with and defaults to the cache's.
+
+        The database write joins the caller's transaction; the caller commits.
+        """
+        entries = list(entries)
+        if not entries:
+            return
+
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, _, verdict in entries:
+                self._remember(key, verdict, expires)
+            self.metrics["stores"] += len(entries)
+
+        if conn is not None:
+            # Imported here so the in-memory tier works without psycopg2
+            from psycopg2.extras import execute_values
+
+            cursor = conn.cursor()
+            try:
+                execute_values(cursor, """
+                    INSERT INTO ai_verdict_cache
+                        (cache_key, product_id, eligible, confidence, reason, model, prompt_version, expires_at)
+                    VALUES %s
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        eligible = EXCLUDED.eligible,
+                        confidence = EXCLUDED.confidence,
+                        reason = EXCLUDED.reason,
+                        created_at = CURRENT_TIMESTAMP,
+                        expires_at = EXCLUDED.expires_at
+                """, [
+                    (key, product_id, bool(verdict[0]), verdict[1], verdict[2], model or self.model, self.prompt_version, self.ttl_seconds)
+                    for key, product_id, verdict in entries
+                ], template="(%s, %s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))")
+            finally:
+                cursor.close()
+
+    def _remember(self, key: str, verdict: Tuple[bool, float, str], expires: float):
+        """Add a verdict to the LRU tier, evicting the least recently used; caller holds the lock"""
+        self._entries[key] = (verdict, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+def is_cacheable(verdict: Tuple[bool, float, str]) -> bool:
+    """Verdicts produced by failed API calls must not be cached"""
+    reason = verdict[2] or ""
+    return not (reason.startswith("API error") or reason == "API key not configured")
@@ -126,6 +126,9 @@ if [ "$SKIP_AWS" = false ]; then
   # Apply the schema
   psql -h $RDS_ENDPOINT -p $RDS_PORT -U admin -d loaneligibility -f schema.sql
   
+  # Apply the versioned migrations on top of it
+  DB_HOST=$RDS_ENDPOINT DB_PORT=$RDS_PORT DB_USER=admin DB_PASSWORD=$DB_PASSWORD python ../tools/migrate.py
+  
   print_message "Database schema initialized!"
   
   cd ..
@@ -0,0 +1,38 @@
+-- migrate: no-transaction
+-- Indexes matching the filters of the pipeline's hot queries, plus the columns
+-- main_workflow.json already reads but schema.sql never declared.
+-- Runs outside a transaction so the indexes are built CONCURRENTLY, without
+-- blocking uploads or matching; every statement is safe to re-run.
+
+-- Users already loaded before this migration count as processed
+ALTER TABLE users ADD COLUMN IF NOT EXISTS processed BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE users ALTER COLUMN processed SET DEFAULT FALSE;
+
+-- Existing products keep their last update time as creation time
+ALTER TABLE loan_products ADD COLUMN IF NOT EXISTS created_at TIMESTAMP;
+UPDATE loan_products SET created_at = last_updated WHERE created_at IS NULL;
+ALTER TABLE loan_products ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+
+-- "Check for New Users": batches that still have unprocessed users
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_unprocessed ON users(batch_id) WHERE processed = FALSE;
+
+-- Unnotified matches per user, best score first: notification scans and
+-- "Check for Unnotified Matches" touch only the small pending fraction of matches
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_unnotified ON matches(user_id, match_score DESC, match_id) WHERE notified = FALSE;
+
+-- Matched pairs still waiting for an AI verdict
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_ai_pending ON matches(user_id) WHERE ai_evaluated_at IS NULL;
+
+-- "Count New Products"
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_products_created_at ON loan_products(created_at);
+
+-- Covering index for the product-criteria predicates of batch_match_candidates(),
+-- replacing the plain two-column criteria index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_products_criteria_covering
+    ON loan_products(min_credit_score, min_monthly_income)
+    INCLUDE (product_id, min_age, max_age, max_debt_to_income);
+DROP INDEX CONCURRENTLY IF EXISTS idx_loan_products_criteria;
+
+-- "Count Sent Emails" filters on status as well as sent_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_sent ON notifications(sent_at) WHERE status = 'sent';
+DROP INDEX CONCURRENTLY IF EXISTS idx_notifications_sent_at;
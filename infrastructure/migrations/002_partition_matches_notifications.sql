@@ -0,0 +1,164 @@
+-- Range partitioning of matches by created_at month and notifications by sent_at
+-- month. Monthly partitions are named <table>_YYYY_MM; backend/partition_maintenance.py
+-- creates them ahead of time and archives old ones with the functions below.
+--
+-- Both tables are rebuilt and their rows copied in this transaction, which holds
+-- an exclusive lock on them until it commits: run it in a maintenance window.
+--
+-- A partitioned table's unique constraints must include the partition key, so
+-- matches can no longer enforce UNIQUE(user_id, product_id). Writers instead
+-- take the advisory lock pg_advisory_xact_lock(hashtext('matches')) and skip
+-- pairs that already exist (see match_batch below).
+
+-- Create the monthly partitions of p_parent covering p_from through p_to
+CREATE OR REPLACE FUNCTION create_month_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from);
+    v_partition TEXT;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        v_partition := p_parent || '_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_partition) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           v_partition, p_parent, v_month, (v_month + INTERVAL '1 month')::date);
+            RETURN NEXT v_partition;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach the monthly partitions of p_parent that end on or before p_before, then
+-- move them to the archive schema (or drop them when p_drop)
+CREATE OR REPLACE FUNCTION archive_month_partitions(p_parent TEXT, p_before DATE, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(p_parent)
+        AND c.relname ~ ('^' || p_parent || '_\d{4}_\d{2}$')
+        AND to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_parent, v_partition);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+        ELSE
+            CREATE SCHEMA IF NOT EXISTS archive;
+            EXECUTE format('DROP TABLE IF EXISTS archive.%I', v_partition);
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archive', v_partition);
+        END IF;
+        RETURN NEXT v_partition;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- matches
+ALTER TABLE matches RENAME TO matches_unpartitioned;
+ALTER SEQUENCE matches_match_id_seq OWNED BY NONE;
+
+CREATE TABLE matches (
+    match_id INTEGER NOT NULL DEFAULT nextval('matches_match_id_seq'),
+    user_id INTEGER,
+    product_id INTEGER,
+    match_score NUMERIC(5, 2), -- Confidence score for the match (0-100)
+    match_reason TEXT, -- Explanation of why this match was made
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Partition key
+    notified BOOLEAN DEFAULT FALSE, -- Whether user has been notified about this match
+    ai_eligible BOOLEAN, -- AI verdict written by ai_eligibility_lambda
+    ai_confidence NUMERIC(5, 2), -- AI confidence in the verdict (0-100)
+    ai_reason TEXT, -- AI explanation of the verdict
+    ai_evaluated_at TIMESTAMP -- When the AI verdict was recorded; NULL until evaluated
+) PARTITION BY RANGE (created_at);
+
+SELECT create_month_partitions(
+    'matches',
+    COALESCE((SELECT MIN(created_at) FROM matches_unpartitioned)::date, CURRENT_DATE),
+    GREATEST((SELECT MAX(created_at) FROM matches_unpartitioned)::date, (CURRENT_DATE + INTERVAL '3 months')::date)
+);
+
+INSERT INTO matches (match_id, user_id, product_id, match_score, match_reason, created_at, notified,
+                     ai_eligible, ai_confidence, ai_reason, ai_evaluated_at)
+SELECT match_id, user_id, product_id, match_score, match_reason, COALESCE(created_at, CURRENT_TIMESTAMP), notified,
+       ai_eligible, ai_confidence, ai_reason, ai_evaluated_at
+FROM matches_unpartitioned;
+
+DROP TABLE matches_unpartitioned;
+ALTER SEQUENCE matches_match_id_seq OWNED BY matches.match_id;
+
+-- Indexes and keys are built after the copy, once per partition
+ALTER TABLE matches ADD PRIMARY KEY (match_id, created_at);
+ALTER TABLE matches ADD FOREIGN KEY (user_id) REFERENCES users(user_id);
+ALTER TABLE matches ADD FOREIGN KEY (product_id) REFERENCES loan_products(product_id);
+
+-- Existence checks of (user_id, product_id) pairs, and lookups by user_id
+CREATE INDEX idx_matches_user_product ON matches(user_id, product_id);
+CREATE INDEX idx_matches_unnotified ON matches(user_id, match_score DESC, match_id) WHERE notified = FALSE;
+CREATE INDEX idx_matches_ai_pending ON matches(user_id) WHERE ai_evaluated_at IS NULL;
+
+-- notifications
+ALTER TABLE notifications RENAME TO notifications_unpartitioned;
+ALTER SEQUENCE notifications_notification_id_seq OWNED BY NONE;
+
+CREATE TABLE notifications (
+    notification_id INTEGER NOT NULL DEFAULT nextval('notifications_notification_id_seq'),
+    user_id INTEGER,
+    email_subject VARCHAR(255),
+    email_body TEXT, -- Full HTML; NULL for compact entries, which are rendered again on demand
+    sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Partition key
+    status VARCHAR(50), -- 'sent', 'failed', etc.
+    template_version VARCHAR(20), -- Email template version the email was rendered with
+    match_items JSONB, -- [{"product_id": ..., "match_score": ...}] in email order
+    content_hash CHAR(64) -- SHA-256 of the HTML that was sent
+) PARTITION BY RANGE (sent_at);
+
+SELECT create_month_partitions(
+    'notifications',
+    COALESCE((SELECT MIN(sent_at) FROM notifications_unpartitioned)::date, CURRENT_DATE),
+    GREATEST((SELECT MAX(sent_at) FROM notifications_unpartitioned)::date, (CURRENT_DATE + INTERVAL '3 months')::date)
+);
+
+INSERT INTO notifications (notification_id, user_id, email_subject, email_body, sent_at, status,
+                           template_version, match_items, content_hash)
+SELECT notification_id, user_id, email_subject, email_body, COALESCE(sent_at, CURRENT_TIMESTAMP), status,
+       template_version, match_items, content_hash
+FROM notifications_unpartitioned;
+
+DROP TABLE notifications_unpartitioned;
+ALTER SEQUENCE notifications_notification_id_seq OWNED BY notifications.notification_id;
+
+ALTER TABLE notifications ADD PRIMARY KEY (notification_id, sent_at);
+ALTER TABLE notifications ADD FOREIGN KEY (user_id) REFERENCES users(user_id);
+
+CREATE INDEX idx_notifications_user_sent ON notifications(user_id, sent_at);
+CREATE INDEX idx_notifications_sent ON notifications(sent_at) WHERE status = 'sent';
+
+-- Match a whole batch in one statement; returns the number of new matches.
+-- Pairs already matched in any partition since the users were created are skipped.
+CREATE OR REPLACE FUNCTION match_batch(p_batch_id VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+    inserted INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('matches'));
+
+    INSERT INTO matches (user_id, product_id, match_score, match_reason)
+    SELECT c.user_id, c.product_id, c.match_score,
+           'Pre-filtered match based on credit score, income, and age criteria'
+    FROM batch_match_candidates(p_batch_id) c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM matches m
+        WHERE m.user_id = c.user_id
+        AND m.product_id = c.product_id
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = p_batch_id)
+    );
+
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
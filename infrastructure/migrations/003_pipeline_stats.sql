@@ -0,0 +1,235 @@
+-- Row counters kept by statement-level triggers, so the daily summary and the
+-- per-batch counts of workflow B read a handful of rows instead of COUNT(*)
+-- over users, loan_products, matches and notifications.
+--
+-- pipeline_stats holds system-wide totals under scope '' and per-batch counts
+-- under the batch_id. Each counter is split into shards picked by backend pid,
+-- so concurrent writers (such as parallel ingestion workers) rarely wait on
+-- each other's counter rows; readers sum the shards through the system_stats
+-- and batch_stats views.
+--
+-- Counters follow INSERT and DELETE on all four tables, and batch_id changes of
+-- users. Matches count towards the batch their user was in when they were
+-- inserted. Updates of matches.user_id, matches.match_reason or
+-- notifications.status are not tracked (nothing in the pipeline makes them);
+-- refresh_pipeline_stats() recounts everything if counters ever drift.
+
+CREATE TABLE pipeline_stats (
+    scope VARCHAR(36) NOT NULL, -- '' for system-wide totals, otherwise a batch_id
+    stat VARCHAR(50) NOT NULL, -- users, loan_products, matches, llm_matches or notifications_sent
+    shard SMALLINT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, stat, shard)
+);
+
+CREATE TYPE stat_delta AS (scope VARCHAR(36), stat VARCHAR(50), delta BIGINT);
+
+-- Add deltas to the caller's shard of each counter. Rows are upserted in key
+-- order so two writers touching the same counters cannot deadlock.
+CREATE OR REPLACE FUNCTION add_pipeline_stats(p_deltas stat_delta[])
+RETURNS VOID AS $$
+    INSERT INTO pipeline_stats AS s (scope, stat, shard, value)
+    SELECT d.scope, d.stat, pg_backend_pid() % 16, SUM(d.delta)
+    FROM unnest(p_deltas) d
+    GROUP BY d.scope, d.stat
+    HAVING SUM(d.delta) <> 0
+    ORDER BY d.scope, d.stat
+    ON CONFLICT (scope, stat, shard) DO UPDATE SET value = s.value + EXCLUDED.value;
+$$ LANGUAGE sql;
+
+-- Each function below serves both the INSERT and the DELETE trigger of its
+-- table: the inserted or deleted rows are the transition table changed_rows.
+
+-- users: totals and per-batch counts, moved between batches when a re-upload changes batch_id
+CREATE OR REPLACE FUNCTION count_users_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_sign INTEGER := CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM add_pipeline_stats(ARRAY(
+            SELECT ROW(c.batch_id, 'users', c.delta)::stat_delta
+            FROM old_rows o
+            JOIN new_rows n ON n.user_id = o.user_id,
+            LATERAL (VALUES (o.batch_id, -1), (n.batch_id, 1)) c(batch_id, delta)
+            WHERE o.batch_id IS DISTINCT FROM n.batch_id
+            AND c.batch_id IS NOT NULL
+        ));
+    ELSE
+        PERFORM add_pipeline_stats(ARRAY(
+            SELECT ROW('', 'users', v_sign * COUNT(*))::stat_delta FROM changed_rows
+            UNION ALL
+            SELECT ROW(batch_id, 'users', v_sign * COUNT(*))::stat_delta
+            FROM changed_rows WHERE batch_id IS NOT NULL GROUP BY batch_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_stats_insert AFTER INSERT ON users
+REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_users_stats();
+CREATE TRIGGER users_stats_update AFTER UPDATE ON users
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_users_stats();
+CREATE TRIGGER users_stats_delete AFTER DELETE ON users
+REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_users_stats();
+
+-- loan_products: total only
+CREATE OR REPLACE FUNCTION count_loan_products_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM add_pipeline_stats(ARRAY(
+        SELECT ROW('', 'loan_products', CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END * COUNT(*))::stat_delta
+        FROM changed_rows
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_products_stats_insert AFTER INSERT ON loan_products
+REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_loan_products_stats();
+CREATE TRIGGER loan_products_stats_delete AFTER DELETE ON loan_products
+REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_loan_products_stats();
+
+-- matches: total, and per batch of the matched user all matches and those added by the LLM (workflow B)
+CREATE OR REPLACE FUNCTION count_matches_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_sign INTEGER := CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END;
+BEGIN
+    PERFORM add_pipeline_stats(ARRAY(
+        SELECT ROW('', 'matches', v_sign * COUNT(*))::stat_delta FROM changed_rows
+        UNION ALL
+        SELECT ROW(u.batch_id, s.stat, v_sign * COUNT(*))::stat_delta
+        FROM changed_rows m
+        JOIN users u ON u.user_id = m.user_id,
+        LATERAL (VALUES ('matches'), ('llm_matches')) s(stat)
+        WHERE u.batch_id IS NOT NULL
+        AND (s.stat = 'matches' OR m.match_reason LIKE 'LLM Evaluation:%')
+        GROUP BY u.batch_id, s.stat
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER matches_stats_insert AFTER INSERT ON matches
+REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_matches_stats();
+CREATE TRIGGER matches_stats_delete AFTER DELETE ON matches
+REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_matches_stats();
+
+-- notifications: emails sent
+CREATE OR REPLACE FUNCTION count_notifications_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM add_pipeline_stats(ARRAY(
+        SELECT ROW('', 'notifications_sent', CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END * COUNT(*))::stat_delta
+        FROM changed_rows WHERE status = 'sent'
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notifications_stats_insert AFTER INSERT ON notifications
+REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_notifications_stats();
+CREATE TRIGGER notifications_stats_delete AFTER DELETE ON notifications
+REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION count_notifications_stats();
+
+-- Recount every counter from the tables, counting matches towards their
+-- user's current batch. Blocks writers to the counted tables while it runs,
+-- so keep it for backfills and repairs.
+CREATE OR REPLACE FUNCTION refresh_pipeline_stats()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE users, loan_products, matches, notifications IN SHARE MODE;
+    DELETE FROM pipeline_stats;
+
+    INSERT INTO pipeline_stats (scope, stat, shard, value)
+    SELECT '', 'users', 0, COUNT(*) FROM users
+    UNION ALL
+    SELECT '', 'loan_products', 0, COUNT(*) FROM loan_products
+    UNION ALL
+    SELECT '', 'matches', 0, COUNT(*) FROM matches
+    UNION ALL
+    SELECT '', 'notifications_sent', 0, COUNT(*) FROM notifications WHERE status = 'sent'
+    UNION ALL
+    SELECT batch_id, 'users', 0, COUNT(*) FROM users WHERE batch_id IS NOT NULL GROUP BY batch_id
+    UNION ALL
+    SELECT u.batch_id, 'matches', 0, COUNT(*)
+    FROM matches m JOIN users u ON u.user_id = m.user_id
+    WHERE u.batch_id IS NOT NULL GROUP BY u.batch_id
+    UNION ALL
+    SELECT u.batch_id, 'llm_matches', 0, COUNT(*)
+    FROM matches m JOIN users u ON u.user_id = m.user_id
+    WHERE u.batch_id IS NOT NULL AND m.match_reason LIKE 'LLM Evaluation:%'
+    GROUP BY u.batch_id;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_pipeline_stats();
+
+-- Partitions leave through DETACH, which fires no triggers: take their rows
+-- off the system-wide totals first. Per-batch counts keep them.
+CREATE OR REPLACE FUNCTION forget_partition_stats(p_parent TEXT, p_partition TEXT)
+RETURNS VOID AS $$
+DECLARE
+    v_rows BIGINT;
+BEGIN
+    IF p_parent = 'matches' THEN
+        EXECUTE format('SELECT COUNT(*) FROM %I', p_partition) INTO v_rows;
+        PERFORM add_pipeline_stats(ARRAY[ROW('', 'matches', -v_rows)::stat_delta]);
+    ELSIF p_parent = 'notifications' THEN
+        EXECUTE format('SELECT COUNT(*) FROM %I WHERE status = ''sent''', p_partition) INTO v_rows;
+        PERFORM add_pipeline_stats(ARRAY[ROW('', 'notifications_sent', -v_rows)::stat_delta]);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_month_partitions(p_parent TEXT, p_before DATE, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(p_parent)
+        AND c.relname ~ ('^' || p_parent || '_\d{4}_\d{2}$')
+        AND to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_partition);
+        PERFORM forget_partition_stats(p_parent, v_partition);
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_parent, v_partition);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+        ELSE
+            CREATE SCHEMA IF NOT EXISTS archive;
+            EXECUTE format('DROP TABLE IF EXISTS archive.%I', v_partition);
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archive', v_partition);
+        END IF;
+        RETURN NEXT v_partition;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Counters for the daily summary (main workflow)
+CREATE VIEW system_stats AS
+SELECT
+    COALESCE(SUM(value) FILTER (WHERE stat = 'users'), 0)::BIGINT AS total_users,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'loan_products'), 0)::BIGINT AS total_products,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'matches'), 0)::BIGINT AS total_matches,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'notifications_sent'), 0)::BIGINT AS total_notifications
+FROM pipeline_stats
+WHERE scope = '';
+
+-- Counters per upload batch (workflow B); filter on batch_id
+CREATE VIEW batch_stats AS
+SELECT
+    scope AS batch_id,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'users'), 0)::BIGINT AS users,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'matches'), 0)::BIGINT AS matches,
+    COALESCE(SUM(value) FILTER (WHERE stat = 'llm_matches'), 0)::BIGINT AS llm_matches
+FROM pipeline_stats
+WHERE scope <> ''
+GROUP BY scope;
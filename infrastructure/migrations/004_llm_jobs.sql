@@ -0,0 +1,50 @@
+-- Durable queue of borderline (user_id, product_id) pairs waiting for an LLM
+-- verdict, filled by the matching engine and drained by backend/llm_worker.py.
+--
+-- A worker claims pending jobs with FOR UPDATE SKIP LOCKED, so concurrent
+-- workers never take the same job, and marks them 'running' under a lease
+-- before calling the LLM. Jobs whose lease expires (the worker crashed or
+-- timed out) go back to 'pending' and are claimed again; verdicts are written
+-- idempotently, so a job processed twice leaves the same matches. Jobs the
+-- API failed on transiently are retried later with backoff, and become
+-- 'failed' after too many attempts.
+
+CREATE TABLE llm_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL REFERENCES loan_products(product_id) ON DELETE CASCADE,
+    batch_id VARCHAR(36), -- upload batch of the user when queued
+    status VARCHAR(10) NOT NULL DEFAULT 'pending', -- pending, running, done or failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- not claimed before this time
+    locked_by VARCHAR(100), -- worker holding the lease
+    locked_until TIMESTAMP, -- lease expiry of a running job
+    eligible BOOLEAN, -- verdict of a done job, also kept when it was not eligible
+    confidence NUMERIC(5, 2),
+    reason TEXT, -- verdict reason, or the last error of a failed job
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    UNIQUE (user_id, product_id)
+);
+
+-- Claim order: ready pending jobs, oldest first
+CREATE INDEX idx_llm_jobs_pending ON llm_jobs(available_at, job_id) WHERE status = 'pending';
+-- Expired leases
+CREATE INDEX idx_llm_jobs_running ON llm_jobs(locked_until) WHERE status = 'running';
+-- Throughput over recent windows
+CREATE INDEX idx_llm_jobs_done ON llm_jobs(finished_at) WHERE status = 'done';
+CREATE INDEX idx_llm_jobs_failed ON llm_jobs(job_id) WHERE status = 'failed';
+CREATE INDEX idx_llm_jobs_batch ON llm_jobs(batch_id);
+
+-- Queue depth and throughput. Each count reads only its partial index, so the
+-- view stays cheap however many finished jobs are kept.
+CREATE OR REPLACE VIEW llm_queue_stats AS
+SELECT
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'pending') AS pending,
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'pending' AND available_at <= NOW()) AS ready,
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'running') AS running,
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'failed') AS failed,
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'done' AND finished_at >= NOW() - INTERVAL '1 minute') AS done_last_minute,
+    (SELECT COUNT(*) FROM llm_jobs WHERE status = 'done' AND finished_at >= NOW() - INTERVAL '1 hour') AS done_last_hour,
+    (SELECT EXTRACT(EPOCH FROM NOW() - MIN(available_at))::INTEGER
+     FROM llm_jobs WHERE status = 'pending' AND available_at <= NOW()) AS oldest_ready_seconds;
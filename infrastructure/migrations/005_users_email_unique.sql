@@ -0,0 +1,56 @@
+-- Unique index on users.email, the ON CONFLICT (email) target of the bulk CSV
+-- loader (process_user_data.bulk_upsert_users), replacing the plain
+-- idx_users_email of the original schema.
+--
+-- Databases created before the index may hold several users with one email.
+-- Each email keeps its lowest user_id, the row the per-row loader has always
+-- updated; the matches, notifications and outbox claims of the other rows move
+-- to it (a product matched more than once keeps its oldest match) and the other
+-- rows are deleted, with their queued LLM jobs.
+--
+-- Writers to users are blocked until this transaction commits, so no duplicate
+-- can slip in between the clean-up and the index build.
+
+LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TEMP TABLE users_email_duplicates ON COMMIT DROP AS
+SELECT user_id, MIN(user_id) OVER (PARTITION BY email) AS keep_id
+FROM users
+WHERE email IN (SELECT email FROM users GROUP BY email HAVING COUNT(*) > 1);
+
+DELETE FROM matches m
+USING users_email_duplicates d
+WHERE m.user_id = d.user_id
+AND m.match_id <> (
+    SELECT MIN(o.match_id)
+    FROM matches o
+    JOIN users_email_duplicates od ON od.user_id = o.user_id
+    WHERE od.keep_id = d.keep_id AND o.product_id = m.product_id
+);
+
+UPDATE matches m SET user_id = d.keep_id
+FROM users_email_duplicates d
+WHERE m.user_id = d.user_id AND d.user_id <> d.keep_id;
+
+UPDATE notifications n SET user_id = d.keep_id
+FROM users_email_duplicates d
+WHERE n.user_id = d.user_id AND d.user_id <> d.keep_id;
+
+UPDATE notification_outbox o SET user_id = d.keep_id
+FROM users_email_duplicates d
+WHERE o.user_id = d.user_id AND d.user_id <> d.keep_id;
+
+DELETE FROM users u
+USING users_email_duplicates d
+WHERE u.user_id = d.user_id AND d.user_id <> d.keep_id;
+
+-- Matches changed users without the counters following them
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM users_email_duplicates) THEN
+        PERFORM refresh_pipeline_stats();
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_unique ON users(email);
+DROP INDEX IF EXISTS idx_users_email;
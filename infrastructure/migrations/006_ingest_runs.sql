@@ -0,0 +1,38 @@
+-- Progress of CSV uploads split into byte ranges (process_user_data.dispatch_ranges).
+--
+-- The S3-triggered invocation records the run and its ranges, invokes one
+-- worker per range asynchronously and returns, so worker time never counts
+-- against its timeout. A worker claims its range under a lease, loads it and
+-- records its summary; the worker that finishes the last range merges the
+-- summaries and triggers the matching workflow. A retried S3 event finds its
+-- run again by the event's sequencer and only re-invokes ranges never started,
+-- instead of loading the file again under a new batch_id.
+
+CREATE TABLE ingest_runs (
+    batch_id VARCHAR(36) PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    sequencer VARCHAR(64) NOT NULL, -- S3 event sequencer, the same for every delivery of one upload event
+    header_line TEXT NOT NULL, -- CSV header prepended to every range
+    status VARCHAR(10) NOT NULL DEFAULT 'running', -- running, done or failed
+    summary JSONB, -- merged ingest summary once every range is done
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    UNIQUE (bucket, object_key, sequencer)
+);
+
+CREATE TABLE ingest_ranges (
+    batch_id VARCHAR(36) NOT NULL REFERENCES ingest_runs(batch_id) ON DELETE CASCADE,
+    range_start BIGINT NOT NULL, -- byte offsets of the range's rows in the object
+    range_end BIGINT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending', -- pending, running, done or failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMP, -- start of the current attempt; a running range older than the lease can be claimed again
+    finished_at TIMESTAMP,
+    summary JSONB, -- ingest summary of the range
+    error TEXT, -- last error of a failed attempt
+    PRIMARY KEY (batch_id, range_start)
+);
+
+-- Runs still in progress, for monitoring stuck uploads
+CREATE INDEX idx_ingest_runs_running ON ingest_runs(created_at) WHERE status = 'running';
@@ -0,0 +1,11 @@
+-- Reconciliation of notification_outbox claims left 'sending' by a dead run.
+--
+-- send_email_notification.notify_users sets attempted_at on its claims, and
+-- commits it, right before handing their emails to SES. A claim still
+-- 'sending' without attempted_at was never sent and is released; one with it
+-- may have been delivered before the run died, so it is settled as
+-- 'unconfirmed' and its matches are marked notified, never sending the email
+-- twice. reconcile_stale_claims does both once a claim is older than any run
+-- can be. Outbox statuses are now 'sending', 'sent' and 'unconfirmed'.
+
+ALTER TABLE notification_outbox ADD COLUMN attempted_at TIMESTAMP; -- when the email was handed to SES
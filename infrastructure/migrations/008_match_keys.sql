@@ -0,0 +1,117 @@
+-- Uniqueness of (user_id, product_id) matches without a global lock.
+--
+-- A partitioned table's unique constraints must include the partition key, so
+-- since migration 002 matches cannot enforce UNIQUE(user_id, product_id), and
+-- every match writer took pg_advisory_xact_lock(hashtext('matches')) for its
+-- whole transaction: matching runs, AI evaluations and workflow B's LLM matches
+-- all waited on each other. match_keys is an unpartitioned table holding one
+-- row per matched pair. Writers insert a pair's key ON CONFLICT DO NOTHING in
+-- the transaction inserting its match, and only insert the matches whose key
+-- they added, so two writers only wait on each other for the same pair.
+--
+-- Keys leave with their matches: deleted matches through the trigger below,
+-- detached partitions in archive_month_partitions. Updates of matches.user_id
+-- or matches.product_id are not tracked (nothing in the pipeline makes them).
+
+-- Writers still on the advisory lock cannot add matches while keys are backfilled
+LOCK TABLE matches IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE match_keys (
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, product_id)
+);
+
+INSERT INTO match_keys (user_id, product_id)
+SELECT DISTINCT user_id, product_id
+FROM matches
+WHERE user_id IS NOT NULL AND product_id IS NOT NULL;
+
+-- Free the keys of deleted pairs, unless another match of the pair is left
+CREATE OR REPLACE FUNCTION forget_match_keys()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM match_keys k
+    USING deleted_rows d
+    WHERE k.user_id = d.user_id
+    AND k.product_id = d.product_id
+    AND NOT EXISTS (
+        SELECT 1 FROM matches m
+        WHERE m.user_id = d.user_id AND m.product_id = d.product_id
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER matches_keys_delete AFTER DELETE ON matches
+REFERENCING OLD TABLE AS deleted_rows FOR EACH STATEMENT EXECUTE FUNCTION forget_match_keys();
+
+-- Detached partitions of matches take their keys with them
+CREATE OR REPLACE FUNCTION archive_month_partitions(p_parent TEXT, p_before DATE, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(p_parent)
+        AND c.relname ~ ('^' || p_parent || '_\d{4}_\d{2}$')
+        AND to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_partition);
+        PERFORM forget_partition_stats(p_parent, v_partition);
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_parent, v_partition);
+        IF p_parent = 'matches' THEN
+            EXECUTE format($sql$
+                DELETE FROM match_keys k
+                USING %I d
+                WHERE k.user_id = d.user_id
+                AND k.product_id = d.product_id
+                AND NOT EXISTS (
+                    SELECT 1 FROM matches m
+                    WHERE m.user_id = d.user_id AND m.product_id = d.product_id
+                )
+            $sql$, v_partition);
+        END IF;
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+        ELSE
+            CREATE SCHEMA IF NOT EXISTS archive;
+            EXECUTE format('DROP TABLE IF EXISTS archive.%I', v_partition);
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archive', v_partition);
+        END IF;
+        RETURN NEXT v_partition;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Match a whole batch in one statement; returns the number of new matches.
+-- Pairs that already have a key in match_keys are skipped. Keys are added in
+-- key order, so two runs sharing pairs cannot deadlock.
+CREATE OR REPLACE FUNCTION match_batch(p_batch_id VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+    inserted INTEGER;
+BEGIN
+    WITH candidates AS MATERIALIZED (
+        SELECT user_id, product_id, match_score FROM batch_match_candidates(p_batch_id)
+    ), new_keys AS (
+        INSERT INTO match_keys (user_id, product_id)
+        SELECT user_id, product_id FROM candidates
+        ORDER BY user_id, product_id
+        ON CONFLICT DO NOTHING
+        RETURNING user_id, product_id
+    )
+    INSERT INTO matches (user_id, product_id, match_score, match_reason)
+    SELECT c.user_id, c.product_id, c.match_score,
+           'Pre-filtered match based on credit score, income, and age criteria'
+    FROM candidates c
+    JOIN new_keys k ON k.user_id = c.user_id AND k.product_id = c.product_id;
+
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
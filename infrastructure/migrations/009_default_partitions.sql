@@ -0,0 +1,63 @@
+-- Default partitions of matches and notifications.
+--
+-- Without them an insert dated outside the monthly partitions fails, e.g. when
+-- partition maintenance has not run for PARTITION_PREMAKE_MONTHS. Such rows now
+-- land in <table>_default. A monthly partition cannot be attached while the
+-- default partition holds rows of its month, so create_month_partitions builds
+-- each new partition detached, moves the month's rows out of the default
+-- partition into it and then attaches it. drain_default_partition creates the
+-- partitions of every month found in the default partition;
+-- backend/partition_maintenance.py runs it daily.
+--
+-- Rows are moved with DML on the partitions themselves, which fires none of the
+-- statement triggers of the parent tables: pipeline_stats counters and
+-- match_keys are left alone, as the rows stay in the table.
+
+CREATE TABLE matches_default PARTITION OF matches DEFAULT;
+CREATE TABLE notifications_default PARTITION OF notifications DEFAULT;
+
+-- Create the monthly partitions of p_parent covering p_from through p_to,
+-- taking their rows out of the default partition
+CREATE OR REPLACE FUNCTION create_month_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from);
+    v_partition TEXT;
+    v_key TEXT := substring(pg_get_partkeydef(to_regclass(p_parent)) FROM '\((\w+)\)');
+BEGIN
+    WHILE v_month <= p_to LOOP
+        v_partition := p_parent || '_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_partition) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', v_partition, p_parent);
+            IF to_regclass(p_parent || '_default') IS NOT NULL THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    p_parent || '_default', v_key, v_month, v_key, (v_month + INTERVAL '1 month')::date, v_partition);
+            END IF;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           p_parent, v_partition, v_month, (v_month + INTERVAL '1 month')::date);
+            RETURN NEXT v_partition;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Move every row of p_parent's default partition to its monthly partition,
+-- creating the partitions it needs
+CREATE OR REPLACE FUNCTION drain_default_partition(p_parent TEXT)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_month DATE;
+    v_key TEXT := substring(pg_get_partkeydef(to_regclass(p_parent)) FROM '\((\w+)\)');
+BEGIN
+    IF to_regclass(p_parent || '_default') IS NULL THEN
+        RETURN;
+    END IF;
+    FOR v_month IN
+        EXECUTE format('SELECT DISTINCT date_trunc(''month'', %I)::date FROM %I ORDER BY 1', v_key, p_parent || '_default')
+    LOOP
+        RETURN QUERY SELECT create_month_partitions(p_parent, v_month, v_month);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,17 @@
+-- Progress of matching runs (matching_engine.lambda_handler).
+--
+-- API Gateway ends requests after 29 s, far less than matching a large batch
+-- takes, so workflow B invokes the matchUsers Lambda asynchronously with a
+-- run_id of its own and polls this table until the run is done or failed.
+-- The summary the Lambda used to return is recorded on the run.
+
+CREATE TABLE match_runs (
+    batch_id VARCHAR(36) NOT NULL,
+    run_id VARCHAR(64) NOT NULL, -- chosen by the caller (the n8n execution id), or the Lambda request id
+    status VARCHAR(10) NOT NULL DEFAULT 'running', -- running, done or failed
+    summary JSONB, -- matching summary once done
+    error TEXT, -- error of a failed run
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    PRIMARY KEY (batch_id, run_id)
+);
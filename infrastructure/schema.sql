@@ -1,4 +1,12 @@
 -- Database schema for Loan Eligibility Engine
+-- Later changes are versioned migrations in migrations/, applied with tools/migrate.py
+--
+-- This file is the baseline the migrations start from, not the current layout:
+-- a database is only complete once tools/migrate.py has run, and the migrations
+-- are authoritative wherever they differ from this file. In particular, matches
+-- and notifications are rebuilt as tables partitioned by month (002) with default
+-- partitions (009), and one match per (user_id, product_id) is enforced by the
+-- match_keys table (008) instead of the UNIQUE constraint below.
 
 -- Users table to store user information from CSV uploads
 CREATE TABLE IF NOT EXISTS users (
@@ -15,8 +23,11 @@ CREATE TABLE IF NOT EXISTS users (
     batch_id VARCHAR(36) -- To track which CSV batch this user came from
 );
 
--- Create index on email for faster lookups
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+-- Unique index on email for faster lookups and as the ON CONFLICT (email) target of the CSV loader
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_unique ON users(email);
+
+-- Index on batch_id so batch matching reads only the users of one upload
+CREATE INDEX IF NOT EXISTS idx_users_batch_id ON users(batch_id);
 
 -- Loan products table to store information scraped from websites
 CREATE TABLE IF NOT EXISTS loan_products (
@@ -41,7 +52,11 @@ CREATE TABLE IF NOT EXISTS loan_products (
 -- Create index on provider and product name
 CREATE INDEX IF NOT EXISTS idx_loan_products_name ON loan_products(provider_name, product_name);
 
--- Matches table to link users with eligible loan products
+-- Range lookups of candidate products use idx_loan_products_criteria_covering (migration 001)
+
+-- Matches table to link users with eligible loan products.
+-- Baseline only: migration 002 replaces it with a table partitioned by created_at
+-- month, whose primary key is (match_id, created_at) and which has no UNIQUE constraint
 CREATE TABLE IF NOT EXISTS matches (
     match_id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(user_id),
@@ -50,22 +65,62 @@ CREATE TABLE IF NOT EXISTS matches (
     match_reason TEXT, -- Explanation of why this match was made
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     notified BOOLEAN DEFAULT FALSE, -- Whether user has been notified about this match
-    UNIQUE(user_id, product_id) -- Prevent duplicate matches
+    ai_eligible BOOLEAN, -- AI verdict written by ai_eligibility_lambda
+    ai_confidence NUMERIC(5, 2), -- AI confidence in the verdict (0-100)
+    ai_reason TEXT, -- AI explanation of the verdict
+    ai_evaluated_at TIMESTAMP, -- When the AI verdict was recorded; NULL until evaluated
+    UNIQUE(user_id, product_id) -- Prevent duplicate matches; match_keys does this after migration 002
 );
 
--- Create index for faster lookups by user_id
-CREATE INDEX IF NOT EXISTS idx_matches_user_id ON matches(user_id);
+-- Add the AI verdict columns to matches tables created before they existed
+ALTER TABLE matches
+    ADD COLUMN IF NOT EXISTS ai_eligible BOOLEAN,
+    ADD COLUMN IF NOT EXISTS ai_confidence NUMERIC(5, 2),
+    ADD COLUMN IF NOT EXISTS ai_reason TEXT,
+    ADD COLUMN IF NOT EXISTS ai_evaluated_at TIMESTAMP;
 
--- Notifications table to track emails sent to users
+-- Lookups by user_id use idx_matches_user_product (migration 002)
+
+-- Notifications table to track emails sent to users.
+-- Baseline only: migration 002 replaces it with a table partitioned by sent_at month
 CREATE TABLE IF NOT EXISTS notifications (
     notification_id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(user_id),
     email_subject VARCHAR(255),
-    email_body TEXT,
+    email_body TEXT, -- Full HTML; NULL for compact entries, which are rendered again on demand
     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    status VARCHAR(50) -- 'sent', 'failed', etc.
+    status VARCHAR(50), -- 'sent', 'failed', etc.
+    template_version VARCHAR(20), -- Email template version the email was rendered with
+    match_items JSONB, -- [{"product_id": ..., "match_score": ...}] in email order
+    content_hash CHAR(64) -- SHA-256 of the HTML that was sent
 );
 
+-- Add the compact log columns to notifications tables created before they existed
+ALTER TABLE notifications
+    ADD COLUMN IF NOT EXISTS template_version VARCHAR(20),
+    ADD COLUMN IF NOT EXISTS match_items JSONB,
+    ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+-- Index for the per-user digest window; recent emails are counted with
+-- idx_notifications_sent (migration 001)
+CREATE INDEX IF NOT EXISTS idx_notifications_user_sent ON notifications(user_id, sent_at);
+
+-- Emails claimed before they are sent (see send_email_notification.notify_users).
+-- A claim stays 'sending' until the send and its match updates are committed together;
+-- one left behind by an interrupted run blocks re-sending until it is reconciled and deleted.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    idempotency_key CHAR(64) PRIMARY KEY, -- SHA-256 of the user and the notified match IDs
+    user_id INTEGER REFERENCES users(user_id),
+    match_ids INTEGER[] NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'sending', -- 'sending' or 'sent'
+    message_id VARCHAR(255), -- SES message ID once sent
+    claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Create index for finding users with unconfirmed sends
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_sending ON notification_outbox(user_id) WHERE status = 'sending';
+
 -- Create function to update timestamp on record update
 CREATE OR REPLACE FUNCTION update_modified_column()
 RETURNS TRIGGER AS $$
@@ -80,3 +135,86 @@ CREATE TRIGGER update_users_modtime
 BEFORE UPDATE ON users
 FOR EACH ROW
 EXECUTE FUNCTION update_modified_column();
+
+-- Eligible products and tiered match scores for every user of a batch.
+-- A plain SQL function, so the planner inlines it and EXPLAIN shows the join.
+CREATE OR REPLACE FUNCTION batch_match_candidates(p_batch_id VARCHAR)
+RETURNS TABLE (user_id INTEGER, product_id INTEGER, match_score INTEGER) AS $$
+    SELECT
+        u.user_id,
+        lp.product_id,
+        CASE
+            WHEN u.credit_score >= lp.min_credit_score + 50 THEN 90
+            WHEN u.credit_score >= lp.min_credit_score + 30 THEN 80
+            WHEN u.credit_score >= lp.min_credit_score + 10 THEN 70
+            WHEN u.credit_score >= lp.min_credit_score THEN 60
+            ELSE 50
+        END
+    FROM users u
+    JOIN loan_products lp
+        ON u.credit_score >= lp.min_credit_score
+        AND u.monthly_income >= lp.min_monthly_income
+        AND u.age >= lp.min_age
+        AND (lp.max_age IS NULL OR u.age <= lp.max_age)
+        AND (lp.max_debt_to_income IS NULL OR COALESCE(u.debt_to_income_ratio, 0) <= lp.max_debt_to_income)
+    WHERE u.batch_id = p_batch_id;
+$$ LANGUAGE sql STABLE;
+
+-- Match a whole batch in one statement; returns the number of new matches.
+-- Pairs that already have a key in match_keys (migration 008) are skipped. Keys are added in
+-- key order, so two runs sharing pairs cannot deadlock.
+CREATE OR REPLACE FUNCTION match_batch(p_batch_id VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+    inserted INTEGER;
+BEGIN
+    WITH candidates AS MATERIALIZED (
+        SELECT user_id, product_id, match_score FROM batch_match_candidates(p_batch_id)
+    ), new_keys AS (
+        INSERT INTO match_keys (user_id, product_id)
+        SELECT user_id, product_id FROM candidates
+        ORDER BY user_id, product_id
+        ON CONFLICT DO NOTHING
+        RETURNING user_id, product_id
+    )
+    INSERT INTO matches (user_id, product_id, match_score, match_reason)
+    SELECT c.user_id, c.product_id, c.match_score,
+           'Pre-filtered match based on credit score, income, and age criteria'
+    FROM candidates c
+    JOIN new_keys k ON k.user_id = c.user_id AND k.product_id = c.product_id;
+
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cache of AI eligibility verdicts keyed on a hash of the normalized prompt inputs (see backend/verdict_cache.py)
+CREATE TABLE IF NOT EXISTS ai_verdict_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    product_id INTEGER, -- Product the verdict is about, for invalidation
+    eligible BOOLEAN NOT NULL,
+    confidence NUMERIC(5, 2) NOT NULL,
+    reason TEXT,
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Create index for invalidation by product
+CREATE INDEX IF NOT EXISTS idx_ai_verdict_cache_product_id ON ai_verdict_cache(product_id);
+
+-- Drop cached verdicts about a loan product whenever that product changes
+CREATE OR REPLACE FUNCTION invalidate_verdict_cache()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM ai_verdict_cache WHERE product_id = OLD.product_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE 'plpgsql';
+
+-- Create trigger to invalidate cached verdicts on loan_products changes
+CREATE TRIGGER invalidate_verdict_cache_on_product_change
+AFTER UPDATE OR DELETE ON loan_products
+FOR EACH ROW
+EXECUTE FUNCTION invalidate_verdict_cache();
@@ -0,0 +1,65 @@
+import os
+import sys
+import uuid
+import pytest
+
+# Make the Lambda modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+@pytest.fixture
+def db_conn():
+    """Connection to the database in DB_HOST, DB_NAME and DB_USER; skips the test without one"""
+    if not os.environ.get("DB_HOST"):
+        pytest.skip("DB_HOST is not set")
+    from db import connect
+
+    try:
+        conn = connect()
+    except Exception as e:
+        pytest.skip(f"Database unavailable: {e}")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+@pytest.fixture
+def queued_pairs(db_conn):
+    """
+    One loan product and three users of a fresh batch, with an LLM job per pair.
+
+    Yields:
+        (batch_id, product_id, user_ids)
+    """
+    batch_id = str(uuid.uuid4())
+    cursor = db_conn.cursor()
+    cursor.execute("""
+        INSERT INTO loan_products (provider_name, product_name, interest_rate, min_loan_amount,
+                                   max_loan_amount, loan_term_months, min_credit_score, min_monthly_income)
+        VALUES ('Test Bank', %s, 5, 1000, 5000, 12, 700, 3000)
+        RETURNING product_id
+    """, (batch_id,))
+    product_id = cursor.fetchone()[0]
+    user_ids = []
+    for number in range(3):
+        cursor.execute("""
+            INSERT INTO users (email, monthly_income, credit_score, employment_status, age, batch_id)
+            VALUES (%s, 2900, 690, 'employed', 30, %s)
+            RETURNING user_id
+        """, (f"user{number}@{batch_id}.test", batch_id))
+        user_ids.append(cursor.fetchone()[0])
+    cursor.execute("""
+        INSERT INTO llm_jobs (user_id, product_id, batch_id)
+        SELECT user_id, %s, batch_id FROM users WHERE batch_id = %s ORDER BY user_id
+    """, (product_id, batch_id))
+    db_conn.commit()
+
+    try:
+        yield batch_id, product_id, user_ids
+    finally:
+        db_conn.rollback()
+        # Jobs go with their users and product (ON DELETE CASCADE)
+        cursor.execute("DELETE FROM users WHERE batch_id = %s", (batch_id,))
+        cursor.execute("DELETE FROM loan_products WHERE product_id = %s", (product_id,))
+        db_conn.commit()
+        cursor.close()
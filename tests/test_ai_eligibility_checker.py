@@ -0,0 +1,52 @@
+import pytest
+from ai_eligibility_checker import AIEligibilityChecker
+from llm_client import PermanentLLMError, TransientLLMError
+
+PRODUCT = {"product_id": 1, "min_credit_score": 700, "min_monthly_income": 3000, "max_debt_to_income": 0.4}
+
+def user(user_id, credit_score):
+    return {
+        "user_id": user_id, "credit_score": credit_score, "monthly_income": 2900,
+        "debt_to_income_ratio": 0.3, "existing_loans": 1, "employment_status": "employed"
+    }
+
+def unavailable(*args):
+    raise TransientLLMError("HTTP 503 after 4 attempt(s)")
+
+def test_mock_route_answers_every_pair():
+    checker = AIEligibilityChecker(api_type="mock", route=["mock"], pack_size=2)
+    verdicts = checker.check_eligibility_batch([(user(1, 690), PRODUCT), (user(2, 600), PRODUCT), (user(3, 710), PRODUCT)])
+    assert [verdict[0] for verdict in verdicts] == [True, False, True]
+    assert checker.get_stats()["packed_requests"] == 2
+
+def test_unsure_pairs_escalate_to_the_next_provider():
+    checker = AIEligibilityChecker(api_type="mock", route=["local", "mock"], escalate_confidence=101)
+    verdict = checker.check_eligibility(user(1, 600), PRODUCT)
+    assert verdict == (False, 0.0, "Credit score is 100 points below the minimum")
+    assert checker.get_stats()["escalated_pairs"] == 1
+
+def test_escalated_pair_keeps_its_verdict_when_the_next_provider_defers():
+    checker = AIEligibilityChecker(api_type="mock", route=["local", "mock"], escalate_confidence=101)
+    checker._provider("mock").complete = unavailable
+    verdict = checker.check_eligibility(user(1, 690), PRODUCT)
+    assert verdict is not None
+    assert verdict[2].startswith("Local classifier")
+
+def test_deferred_pair_without_earlier_verdict_is_none():
+    checker = AIEligibilityChecker(api_type="mock", route=["mock"])
+    checker._provider("mock").complete = unavailable
+    assert checker.check_eligibility(user(1, 690), PRODUCT) is None
+    assert checker.get_stats()["deferred_pairs"] == 1
+
+def test_route_model_follows_the_provider_override():
+    checker = AIEligibilityChecker(api_type="mock", route=["local", "mock"])
+    assert checker.model == checker.route_model()
+    assert checker.route_model("mock") == "mock"
+    assert checker.route_model(["local"]) != checker.model
+
+@pytest.mark.parametrize("pack_size", [1, 4])
+def test_unconfigured_provider_raises_permanent_error(monkeypatch, pack_size):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    checker = AIEligibilityChecker(api_type="openai", route=["openai"], pack_size=pack_size)
+    with pytest.raises(PermanentLLMError, match="not configured"):
+        checker.check_eligibility_batch([(user(1, 690), PRODUCT), (user(2, 695), PRODUCT)])
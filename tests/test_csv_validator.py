@@ -0,0 +1,74 @@
+import io
+from csv_validator import RejectReport, iter_valid_batches
+
+HEADER = "email,monthly_income,credit_score,employment_status,age,debt_to_income_ratio,existing_loans\n"
+
+def validate(rows, max_samples=100):
+    """Validate CSV rows; returns the valid rows as dicts and the report"""
+    report = RejectReport(max_samples)
+    stream = io.BytesIO((HEADER + "".join(rows)).encode("utf-8"))
+    valid = [row for batch in iter_valid_batches(stream, report) for row in batch.to_pylist()]
+    return valid, report.as_dict()
+
+def test_valid_rows_are_coerced():
+    valid, report = validate(["A@Example.com ,4000.50,720,employed,30,0.25,1\n"])
+    assert report["rejected"] == 0
+    assert valid[0]["email"] == "a@example.com"
+    assert valid[0]["monthly_income"] == 4000.5
+    assert valid[0]["credit_score"] == 720
+    assert valid[0]["row_number"] == 2
+
+def test_range_bounds_are_inclusive():
+    valid, report = validate([
+        "low@example.com,0,300,employed,18,0,0\n",
+        "high@example.com,9999999999.99,850,employed,120,999.99,1000\n"
+    ])
+    assert report["rejected"] == 0
+    assert len(valid) == 2
+
+def test_out_of_range_values_are_rejected():
+    valid, report = validate([
+        "credit@example.com,4000,299,employed,30,0.2,0\n",
+        "age@example.com,4000,700,employed,17,0.2,0\n",
+        "income@example.com,-1,700,employed,30,0.2,0\n",
+        "loans@example.com,4000,700,employed,30,0.2,1001\n",
+        "ok@example.com,4000,700,employed,30,0.2,0\n"
+    ])
+    assert [row["email"] for row in valid] == ["ok@example.com"]
+    assert report["rejected"] == 4
+    assert report["reject_reasons"] == {
+        "credit_score out of range": 1,
+        "age out of range": 1,
+        "monthly_income out of range": 1,
+        "existing_loans out of range": 1
+    }
+    assert {sample["row_number"] for sample in report["reject_samples"]} == {2, 3, 4, 5}
+
+def test_unparsable_values_are_reported_once():
+    valid, report = validate([
+        "nan@example.com,nan,700,employed,30,0.2,0\n",
+        "text@example.com,4000,good,employed,30,0.2,0\n"
+    ])
+    assert valid == []
+    assert report["reject_reasons"] == {"invalid monthly_income": 1, "invalid credit_score": 1}
+
+def test_wrong_field_count_keeps_row_numbers():
+    valid, report = validate([
+        "short@example.com,4000\n",
+        "ok@example.com,4000,700,employed,30,0.2,0\n"
+    ])
+    assert valid[0]["row_number"] == 3
+    assert report["reject_samples"] == [{"row_number": 2, "reason": "expected 7 fields, got 2"}]
+
+def test_reject_report_caps_samples():
+    report = RejectReport(max_samples=2)
+    report.add_rows([2, 3, 4], "invalid email")
+    report.add(5, "invalid age")
+    assert report.as_dict() == {
+        "rejected": 4,
+        "reject_reasons": {"invalid email": 3, "invalid age": 1},
+        "reject_samples": [
+            {"row_number": 2, "reason": "invalid email"},
+            {"row_number": 3, "reason": "invalid email"}
+        ]
+    }
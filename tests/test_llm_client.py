@@ -0,0 +1,146 @@
+import pytest
+import llm_client
+from llm_client import (
+    LLMClient, CircuitBreaker, CircuitOpenError, PermanentLLMError, TransientLLMError, parse_retry_after
+)
+
+class FakeClock:
+    """Stands in for the time module of llm_client, so backoff and breaker waits take no real time"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1_700_000_000.0 + self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+        self.text = str(self.body)
+
+    def json(self):
+        return self.body
+
+class FakeSession:
+    """Answers each post with the next of responses, recording the calls"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client, "time", clock)
+    return clock
+
+def client_with(responses, **kwargs):
+    client = LLMClient(**kwargs)
+    client.session = FakeSession(responses)
+    return client
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+def test_breaker_success_resets_the_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_breaker_lets_one_trial_through_when_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half-open"
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.allow()
+
+def test_failed_trial_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(100):
+        breaker.record_failure()
+    breaker.allow()
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+def test_post_json_retries_server_errors(clock):
+    client = client_with([FakeResponse(503), FakeResponse(500), FakeResponse(200, {"ok": True})], max_attempts=4)
+    assert client.post_json("https://api.test/v1", {}) == {"ok": True}
+    stats = client.get_stats()
+    assert (stats["attempts"], stats["retries"], stats["server_errors"]) == (3, 2, 2)
+    assert client.breaker.state == "closed"
+
+def test_post_json_waits_for_retry_after(clock):
+    client = client_with([FakeResponse(429, headers={"Retry-After": "7"}), FakeResponse(200, {})], backoff_max=20)
+    client.post_json("https://api.test/v1", {})
+    assert sum(clock.slept) >= 7
+    assert client.get_stats()["throttled"] == 1
+
+def test_post_json_gives_up_on_long_retry_after(clock):
+    client = client_with([FakeResponse(429, headers={"Retry-After": "600"})], backoff_max=20)
+    with pytest.raises(TransientLLMError, match="Retry-After 600s"):
+        client.post_json("https://api.test/v1", {})
+    assert client.session.calls == 1
+
+def test_post_json_raises_transient_error_when_attempts_run_out(clock):
+    client = client_with([FakeResponse(502)] * 3, max_attempts=3)
+    with pytest.raises(TransientLLMError, match="after 3 attempt"):
+        client.post_json("https://api.test/v1", {})
+    assert client.get_stats()["transient_failures"] == 1
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_post_json_raises_permanent_error_without_retrying(clock, status):
+    client = client_with([FakeResponse(status, {"error": "rejected"})])
+    with pytest.raises(PermanentLLMError, match=f"HTTP {status}"):
+        client.post_json("https://api.test/v1", {})
+    assert client.session.calls == 1
+    assert client.get_stats()["permanent_failures"] == 1
+    # A rejected request says nothing about the API's health
+    assert client.breaker.state == "closed"
+
+def test_open_circuit_sends_nothing(clock):
+    client = client_with([], breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30))
+    client.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        client.post_json("https://api.test/v1", {})
+    assert client.session.calls == 0
+    assert client.get_stats()["circuit_rejections"] == 1
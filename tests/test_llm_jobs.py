@@ -0,0 +1,77 @@
+from db import connect
+from llm_jobs import claim_jobs, release_expired_leases, complete_jobs, retry_jobs, get_queue_stats
+
+def job_states(conn, batch_id):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT status, COUNT(*) FROM llm_jobs WHERE batch_id = %s GROUP BY status", (batch_id,))
+        states = dict(cursor.fetchall())
+    conn.commit()
+    return states
+
+def test_claims_are_disjoint_and_leased(db_conn, queued_pairs):
+    batch_id, _, user_ids = queued_pairs
+    other = connect()
+    try:
+        first = claim_jobs(db_conn, "worker-a", 2, batch_id=batch_id)
+        second = claim_jobs(other, "worker-b", 2, batch_id=batch_id)
+    finally:
+        other.close()
+
+    assert [job["user_id"] for job in first] == user_ids[:2]
+    assert [job["user_id"] for job in second] == user_ids[2:]
+    assert all(job["attempts"] == 1 for job in first + second)
+    assert claim_jobs(db_conn, "worker-c", 10, batch_id=batch_id) == []
+    assert job_states(db_conn, batch_id) == {"running": 3}
+
+def test_claims_skip_rows_locked_by_an_open_claim(db_conn, queued_pairs):
+    batch_id, _, user_ids = queued_pairs
+    other = connect()
+    try:
+        # An uncommitted claim holds its row locks; a concurrent claim skips them instead of waiting
+        with other.cursor() as cursor:
+            cursor.execute("""
+                SELECT job_id FROM llm_jobs WHERE batch_id = %s
+                ORDER BY job_id LIMIT 1 FOR UPDATE
+            """, (batch_id,))
+        jobs = claim_jobs(db_conn, "worker-a", 10, batch_id=batch_id)
+    finally:
+        other.rollback()
+        other.close()
+
+    assert [job["user_id"] for job in jobs] == user_ids[1:]
+
+def test_claims_filter_by_batch(db_conn, queued_pairs):
+    batch_id, _, _ = queued_pairs
+    assert claim_jobs(db_conn, "worker-a", 10, batch_id=f"{batch_id}-other") == []
+
+def test_expired_leases_are_claimed_again(db_conn, queued_pairs):
+    batch_id, _, _ = queued_pairs
+    claim_jobs(db_conn, "worker-a", 10, lease_seconds=0, batch_id=batch_id)
+    assert release_expired_leases(db_conn) >= 3
+
+    jobs = claim_jobs(db_conn, "worker-b", 10, batch_id=batch_id)
+    assert len(jobs) == 3
+    assert all(job["attempts"] == 2 for job in jobs)
+
+def test_only_the_lease_holder_completes_jobs(db_conn, queued_pairs):
+    batch_id, _, _ = queued_pairs
+    jobs = claim_jobs(db_conn, "worker-a", 10, batch_id=batch_id)
+    verdicts = [(job["job_id"], True, 80.0, "Looks fine") for job in jobs]
+
+    assert complete_jobs(db_conn, "worker-b", verdicts) == 0
+    assert complete_jobs(db_conn, "worker-a", verdicts[:2]) == 2
+    assert job_states(db_conn, batch_id) == {"done": 2, "running": 1}
+
+def test_retried_jobs_wait_and_fail_after_max_attempts(db_conn, queued_pairs):
+    batch_id, _, _ = queued_pairs
+    jobs = claim_jobs(db_conn, "worker-a", 10, batch_id=batch_id)
+    job_ids = [job["job_id"] for job in jobs]
+
+    assert retry_jobs(db_conn, "worker-a", job_ids[:2], "HTTP 503", max_attempts=5) == (2, 0)
+    assert retry_jobs(db_conn, "worker-a", job_ids[2:], "HTTP 503", max_attempts=1) == (0, 1)
+    # Requeued jobs are not ready until their backoff has passed
+    assert claim_jobs(db_conn, "worker-b", 10, batch_id=batch_id) == []
+
+    stats = get_queue_stats(db_conn, batch_id)
+    assert stats["pending"] == 2
+    assert stats["failed"] == 1
@@ -0,0 +1,51 @@
+from llm_response_parser import parse_verdict, parse_verdicts, FAST, FALLBACK, FAILED, DEFAULT_REASON
+
+def test_parse_verdict_fast_path():
+    verdict, outcome = parse_verdict('{"eligible": true, "confidence": 85, "reason": "Stable income"}')
+    assert verdict == (True, 85.0, "Stable income")
+    assert outcome == FAST
+
+def test_parse_verdict_fenced():
+    content = 'Here is my answer:\n```json\n{"eligible": false, "confidence": 70, "reason": "High DTI"}\n```\nThanks'
+    assert parse_verdict(content) == ((False, 70.0, "High DTI"), FALLBACK)
+
+def test_parse_verdict_unclosed_fence():
+    content = '```json\n{"eligible": true, "confidence": 60, "reason": "Close to the minimum"}'
+    assert parse_verdict(content) == ((True, 60.0, "Close to the minimum"), FALLBACK)
+
+def test_parse_verdict_truncated_reason():
+    verdict, outcome = parse_verdict('{"eligible": true, "confidence": 72, "reason": "Income covers the loan but the cre')
+    assert verdict == (True, 72.0, "Income covers the loan but the cre")
+    assert outcome == FALLBACK
+
+def test_parse_verdict_loose_types():
+    verdict, outcome = parse_verdict("{'eligible': 'yes', 'confidence': '80%', 'reason': ''}")
+    assert verdict == (True, 80.0, DEFAULT_REASON)
+    assert outcome == FALLBACK
+
+def test_parse_verdict_rejects_out_of_range_confidence():
+    assert parse_verdict('{"eligible": true, "confidence": 150, "reason": "x"}') == (None, FAILED)
+
+def test_parse_verdict_prose():
+    assert parse_verdict("I cannot decide on this application.") == (None, FAILED)
+    assert parse_verdict(None) == (None, FAILED)
+
+def test_parse_verdicts_object():
+    content = '{"verdicts": [{"id": "u1-p1", "eligible": true, "confidence": 90, "reason": "a"}, {"id": "u2-p1", "eligible": false, "confidence": 40, "reason": "b"}]}'
+    verdicts, outcome = parse_verdicts(content, {"u1-p1", "u2-p1"})
+    assert verdicts == {"u1-p1": (True, 90.0, "a"), "u2-p1": (False, 40.0, "b")}
+    assert outcome == FAST
+
+def test_parse_verdicts_fenced_array():
+    content = '```json\n[{"id": "u1-p1", "eligible": true, "confidence": 90, "reason": "a"}]\n```'
+    assert parse_verdicts(content, {"u1-p1"}) == ({"u1-p1": (True, 90.0, "a")}, FALLBACK)
+
+def test_parse_verdicts_truncated_keeps_complete_items():
+    content = '[{"id": "u1-p1", "eligible": true, "confidence": 90, "reason": "a"}, {"id": "u2-p1", "eligible": fal'
+    verdicts, outcome = parse_verdicts(content, {"u1-p1", "u2-p1"})
+    assert verdicts == {"u1-p1": (True, 90.0, "a")}
+    assert outcome == FALLBACK
+
+def test_parse_verdicts_skips_unknown_and_malformed_items():
+    content = '[{"id": "u9-p9", "eligible": true, "confidence": 90, "reason": "a"}, {"id": "u1-p1", "eligible": true, "confidence": 101}]'
+    assert parse_verdicts(content, {"u1-p1"}) == ({}, FAILED)
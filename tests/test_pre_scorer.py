@@ -0,0 +1,43 @@
+import numpy as np
+from pre_scorer import (
+    score_dict_pairs, triage, verdict, APPROVE, ASK_LLM, REJECT, PRE_SCORE_PREFIX, BASE_SCORE
+)
+
+PRODUCT = {"min_credit_score": 700, "min_monthly_income": 3000, "max_debt_to_income": 0.4}
+
+def user(**fields):
+    return {
+        "credit_score": 700, "monthly_income": 3000, "debt_to_income_ratio": 0.4,
+        "existing_loans": 1, "employment_status": "self-employed", **fields
+    }
+
+def test_user_at_the_minimums_scores_the_base():
+    assert score_dict_pairs([(user(), PRODUCT)])[0] == BASE_SCORE
+
+def test_scores_are_clipped_to_0_100():
+    strong = user(credit_score=850, monthly_income=20000, debt_to_income_ratio=0, employment_status="employed")
+    weak = user(credit_score=500, monthly_income=100, debt_to_income_ratio=2, existing_loans=10, employment_status="unemployed")
+    scores = score_dict_pairs([(strong, PRODUCT), (weak, PRODUCT)])
+    assert scores[0] == 100
+    assert scores[1] == 0
+
+def test_missing_fields_score_no_points():
+    bare = {"credit_score": 700, "monthly_income": 3000, "employment_status": "self-employed"}
+    score = score_dict_pairs([(bare, {"min_credit_score": 700, "min_monthly_income": 3000})])[0]
+    # Zero DTI under the default maximum earns the full DTI points
+    assert np.isfinite(score)
+    assert score == BASE_SCORE + 20
+
+def test_unknown_employment_costs_points():
+    known, unknown = score_dict_pairs([(user(), PRODUCT), (user(employment_status="freelance"), PRODUCT)])
+    assert unknown < known
+
+def test_triage_thresholds_are_inclusive():
+    decisions = triage(np.array([80.0, 79.9, 30.1, 30.0]), approve=80, reject=30)
+    assert decisions.tolist() == [APPROVE, ASK_LLM, ASK_LLM, REJECT]
+
+def test_verdict_of_local_decisions():
+    eligible, confidence, reason = verdict(APPROVE, 91.4)
+    assert (eligible, confidence) == (True, 91.4)
+    assert reason.startswith(PRE_SCORE_PREFIX)
+    assert verdict(REJECT, 12.0)[:2] == (False, 88.0)
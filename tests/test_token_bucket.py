@@ -0,0 +1,54 @@
+import pytest
+import token_bucket
+from token_bucket import TokenBucket
+
+class FakeClock:
+    """Stands in for the time module of token_bucket, so waits take no real time"""
+
+    def __init__(self):
+        # Binary fractions keep the refill arithmetic exact
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(token_bucket, "time", clock)
+    return clock
+
+def test_burst_up_to_capacity_does_not_wait(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert clock.slept == []
+
+def test_waits_for_refill_when_empty(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    bucket.acquire(5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.slept == [pytest.approx(0.5)]
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    bucket.acquire(5)
+    clock.now += 60
+    assert bucket.acquire(5) == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+
+def test_partial_refill(clock):
+    bucket = TokenBucket(rate=4, capacity=8)
+    bucket.acquire(8)
+    clock.now += 0.75
+    assert bucket.acquire(3) == 0.0
+    assert bucket.acquire(1) == pytest.approx(0.25)
+
+def test_zero_rate_disables_limiting(clock):
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.acquire(100) == 0.0 for _ in range(10))
+    assert clock.slept == []
@@ -0,0 +1,2166 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for Loan Eligibility Engine
+
+This script measures the hot paths of the backend Lambdas:
+1. upsert: row-by-row INSERT loop vs COPY-based bulk upsert of users
+2. split: parallel byte-range ingestion of one large CSV with 1-8 workers
+3. validate: DictReader validation loop vs columnar Arrow validation (no database)
+4. match: per-user SQL filter statements vs the vectorized matching engine vs
+   the set-based match_batch() function, over a grid of users x products
+5. index: per-user eligible/borderline lookups by full scan vs ProductIndex (no database)
+6. llm: check_eligibility_batch at several concurrency limits and pack sizes against
+   tools/mock_llm_server.py, with request, token and latency accounting
+7. ai-batch: one ai_eligibility_lambda invocation per matched pair vs one batch
+   invocation for the whole batch_id, against the mock LLM server (needs PostgreSQL)
+8. notify: the serial per-user notification loop vs the pipelined sender, against
+   tools/mock_ses_server.py at several SES send rates (needs PostgreSQL)
+9. email: f-string email rendering and MIMEMultipart vs the precompiled templates,
+   at several matches per user, checking the HTML is byte-identical (no database)
+10. pool: per-invocation latency with a new connection each time vs the shared
+   health-checked connection pool (needs PostgreSQL)
+11. plans: latency and scan nodes of the workflows' and Lambdas' queries before
+   and after an index migration, over millions of seeded rows in a scratch schema
+   that is dropped afterwards (needs PostgreSQL)
+12. partitions: the stats and unnotified-match queries and retiring a month of
+   matches, on single tables vs the monthly partitions of migration 002, over
+   up to 100M seeded matches in a scratch schema (needs PostgreSQL)
+13. stats: the workflows' COUNT(*) queries vs the trigger-kept counters of
+   migration 003, and the time the triggers add to loading and matching a batch
+   (needs PostgreSQL)
+14. faults: check_eligibility_batch against a mock LLM server injecting 429s,
+   503s, stalled requests and an outage, with a single attempt and no read
+   timeout vs retries with backoff vs retries and the circuit breaker
+15. queue: LLM jobs queued by the matching engine drained by 1-N llm_worker
+   processes against the mock LLM server, with one worker crashing on its claim,
+   checking every job is done once and no match is duplicated (needs PostgreSQL)
+16. parse: the previous json.loads-then-regex verdict parsing vs llm_response_parser
+   over a corpus of raw LLM answers (recorded, or synthetic with fenced, chatty,
+   truncated and malformed answers), with parse outcomes and verdict accuracy (no database)
+17. providers: check_eligibility_batch through the remote LLM (the mock server), the
+   in-process mock, the local classifier and local-first routes escalating to the
+   remote LLM at several confidence thresholds, with remote requests, agreement
+   with the LLM's verdicts and throughput (no database)
+
+Benchmarks that need PostgreSQL read the DB_* environment variables. Run them
+against a scratch database: rows are tagged with a benchmark batch_id and
+removed afterwards by batch_id, but sequences and table statistics are left modified.
+
+Usage:
+    python benchmark.py upsert --sizes 10000 100000 1000000
+    python benchmark.py split --rows 1000000 --workers 1 2 4 8
+    python benchmark.py validate --users 1000000
+    python benchmark.py match --users 1000 10000 --products 20 200 --explain
+    python benchmark.py index --products 100 10000 100000
+    python benchmark.py llm --pairs 200 --concurrency 1 4 8 16
+    python benchmark.py llm --pairs 500 --concurrency 8 --pack-sizes 1 5 10 20 --drop-every 25
+    python benchmark.py llm --pairs 500 --concurrency 8 --response-format text --chatty-every 3
+    python benchmark.py ai-batch --users 200 --products 10 --latency 0.05
+    python benchmark.py ai-batch --users 200 --products 10 --api local
+    python benchmark.py notify --users 500 --products 10 --send-rates 14 50 200
+    python benchmark.py email --emails 5000 --matches 10 50
+    python benchmark.py pool --invocations 200 --health-check-intervals 0 30
+    python benchmark.py plans --users 2000000 --products 500 --repeat 5
+    python benchmark.py partitions --matches 100000000 --months 24
+    python benchmark.py stats --matches 20000000 --batch-size 10000
+    python benchmark.py faults --pairs 300 --throttle-every 7 --fail-every 11 --hang-every 50
+    python benchmark.py queue --users 2000 --products 50 --workers 1 2 4 --crash-jobs 20
+    python benchmark.py parse --responses 20000 --export corpus.jsonl
+    python benchmark.py parse --corpus corpus.jsonl --repeat 5
+    python benchmark.py providers --pairs 1000 --latency 0.2 --escalate-confidence 60 75 90
+"""
+
+import os
+import sys
+import json
+import csv
+import time
+import uuid
+import random
+import argparse
+import tempfile
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+# Make the Lambda modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+# Load environment variables
+load_dotenv()
+
+EMPLOYMENT_STATUSES = ["employed", "self-employed", "unemployed", "retired"]
+
+CSV_HEADERS = [
+    "email", "monthly_income", "credit_score", "employment_status",
+    "age", "debt_to_income_ratio", "existing_loans"
+]
+
+class LocalObjectBody:
+    """Streaming body over a byte range of a local file, like botocore's StreamingBody."""
+
+    def __init__(self, path, start, length):
+        self.path = path
+        self.start = start
+        self.length = length
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.start)
+            return f.read(self.length)
+
+    def iter_chunks(self, chunk_size):
+        with open(self.path, 'rb') as f:
+            f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+class LocalS3Client:
+    """
+    Filesystem stand-in for the S3 calls used by ingestion.
+
+    Objects live at <root>/<bucket>/<key>. Instances are picklable, so they can be
+    passed to the process pool used by ingest_object_parallel.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': os.path.getsize(self._path(Bucket, Key))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self._path(Bucket, Key)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        if Range:
+            start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+            end = min(end, size - 1)
+        return {'Body': LocalObjectBody(path, start, end - start + 1)}
+
+def generate_users(count, seed=42, id_offset=None):
+    """
+    Generate validated user dicts shaped like process_user_data.iter_users output.
+
+    Args:
+        count: Number of users to generate
+        seed: Random seed so runs are comparable
+        id_offset: If set, users carry explicit user_ids starting after this value
+
+    Returns:
+        List of user dictionaries
+    """
+    rng = random.Random(seed)
+    run_tag = uuid.uuid4().hex[:8]
+    users = []
+    for i in range(count):
+        users.append({
+            'row_number': i + 2,
+            'user_id': str(id_offset + i + 1) if id_offset is not None else None,
+            'email': f"bench-{run_tag}-{i}@example.com",
+            'monthly_income': float(rng.randint(2000, 15000)),
+            'credit_score': rng.randint(500, 850),
+            'employment_status': rng.choice(EMPLOYMENT_STATUSES),
+            'age': rng.randint(21, 75),
+            'debt_to_income_ratio': round(rng.uniform(0.1, 0.6), 2),
+            'existing_loans': rng.randint(0, 3)
+        })
+    return users
+
+def print_table(headers, rows):
+    """Print benchmark results as an aligned text table."""
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+def cleanup_batch(conn, batch_id):
+    """Delete benchmark users tagged with batch_id, and their matches and notifications."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM notifications WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+    cursor.execute("DELETE FROM notification_outbox WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+    cursor.execute("DELETE FROM matches WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+    cursor.execute("DELETE FROM users WHERE batch_id = %s", (batch_id,))
+    conn.commit()
+    cursor.close()
+
+def reserve_user_ids(conn, count):
+    """
+    Reserve a range of explicit user_ids above both MAX(user_id) and the SERIAL sequence.
+
+    The sequence is moved past the range so email-keyed rows never collide with it.
+
+    Returns:
+        Offset after which count user_ids are free
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT GREATEST(
+            (SELECT COALESCE(MAX(user_id), 0) FROM users),
+            COALESCE(pg_sequence_last_value(pg_get_serial_sequence('users', 'user_id')::regclass), 0)
+        )
+    """)
+    id_offset = cursor.fetchone()[0] + 1000
+    cursor.execute("SELECT setval(pg_get_serial_sequence('users', 'user_id'), %s)", (id_offset + count,))
+    conn.commit()
+    cursor.close()
+    return id_offset
+
+def benchmark_upsert(args):
+    """Compare insert_users_to_db with bulk_upsert_users at several sizes."""
+    from db import connect
+    from process_user_data import insert_users_to_db, bulk_upsert_users, iter_chunks
+
+    conn = connect()
+
+    loaders = {
+        'rows': lambda chunk, batch_id: insert_users_to_db(conn, chunk, batch_id),
+        'copy': lambda chunk, batch_id: sum(bulk_upsert_users(conn, chunk, batch_id)[:2])
+    }
+
+    results = []
+    for size in args.sizes:
+        for name in args.loaders:
+            # Half of the rows carry explicit user_ids, half are keyed on email
+            id_offset = reserve_user_ids(conn, size)
+            users = generate_users(size // 2, seed=size, id_offset=id_offset)
+            users += generate_users(size - size // 2, seed=size + 1)
+            batch_id = str(uuid.uuid4())
+
+            try:
+                timings = []
+                # First pass inserts every row, second pass updates every row
+                for _ in ('insert', 'update'):
+                    start = time.perf_counter()
+                    loaded = 0
+                    for chunk in iter_chunks(users, args.chunk_size):
+                        loaded += loaders[name](chunk, batch_id)
+                    timings.append(time.perf_counter() - start)
+            finally:
+                cleanup_batch(conn, batch_id)
+
+            results.append([
+                size, name, loaded,
+                f"{timings[0]:.2f}s", f"{size / timings[0]:,.0f}",
+                f"{timings[1]:.2f}s", f"{size / timings[1]:,.0f}"
+            ])
+            print(f"{name:>5} loader, {size} rows: insert {timings[0]:.2f}s, update {timings[1]:.2f}s")
+
+    conn.close()
+    print()
+    print_table(['rows', 'loader', 'loaded', 'insert', 'insert rows/s', 'update', 'update rows/s'], results)
+
+def write_users_csv(path, count):
+    """Write count synthetic users to a CSV file in the upload template format."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS, extrasaction='ignore')
+        writer.writeheader()
+        for start in range(0, count, 100000):
+            writer.writerows(generate_users(min(100000, count - start), seed=start))
+
+def benchmark_split(args):
+    """Measure ingest_object_parallel throughput for several worker counts."""
+    from db import connect
+    from process_user_data import ingest_object_parallel
+
+    root = args.data_dir or tempfile.mkdtemp(prefix='loan-bench-')
+    client = LocalS3Client(root)
+    write_users_csv(os.path.join(root, 'bench', 'users.csv'), args.rows)
+    size = client.head_object(Bucket='bench', Key='users.csv')['ContentLength']
+    print(f"Generated {args.rows} users ({size / 1e6:.1f} MB) in {root}")
+
+    conn = connect()
+    results = []
+    for workers in args.workers:
+        batch_id = str(uuid.uuid4())
+        try:
+            start = time.perf_counter()
+            summary = ingest_object_parallel('bench', 'users.csv', size, batch_id, workers=workers, client=client)
+            elapsed = time.perf_counter() - start
+        finally:
+            cleanup_batch(conn, batch_id)
+
+        results.append([
+            workers, summary['processed'], summary['loaded'],
+            f"{elapsed:.2f}s", f"{summary['processed'] / elapsed:,.0f}", f"{size / elapsed / 1e6:.1f}"
+        ])
+        print(f"{workers} workers: {elapsed:.2f}s")
+
+    conn.close()
+    print()
+    print_table(['workers', 'processed', 'loaded', 'elapsed', 'rows/s', 'MB/s'], results)
+
+def dictreader_validate(path):
+    """Baseline: the original per-row DictReader validation loop from process_csv."""
+    users = []
+    with open(path, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            required_fields = ['email', 'monthly_income', 'credit_score', 'employment_status', 'age']
+            if not all(field in row for field in required_fields):
+                continue
+            try:
+                users.append({
+                    'user_id': row.get('user_id'),
+                    'email': row['email'].strip().lower(),
+                    'monthly_income': float(row['monthly_income']),
+                    'credit_score': int(row['credit_score']),
+                    'employment_status': row['employment_status'].strip(),
+                    'age': int(row['age']),
+                    'debt_to_income_ratio': float(row.get('debt_to_income_ratio', 0)),
+                    'existing_loans': int(row.get('existing_loans', 0))
+                })
+            except (ValueError, TypeError):
+                continue
+    return len(users)
+
+def columnar_validate(path):
+    """Columnar Arrow validation as used by process_user_data.iter_user_batches."""
+    from csv_validator import RejectReport
+    from process_user_data import iter_user_batches
+
+    report = RejectReport()
+    with open(path, 'rb') as csvfile:
+        chunks = iter(lambda: csvfile.read(1024 * 1024), b'')
+        return sum(batch.num_rows for batch in iter_user_batches(chunks, report))
+
+def benchmark_validate(args):
+    """Compare rows/second of the DictReader loop and the columnar validator."""
+    path = args.csv
+    if not path:
+        from generate_sample_data import generate_user_data
+        path = generate_user_data(args.users, args.data_dir or tempfile.mkdtemp(prefix='loan-bench-'))
+
+    # Import the Lambda module up front so its cold-start cost is not timed
+    import process_user_data  # noqa: F401
+
+    results = []
+    for name, validate in (('dictreader', dictreader_validate), ('columnar', columnar_validate)):
+        start = time.perf_counter()
+        valid = validate(path)
+        elapsed = time.perf_counter() - start
+        results.append([name, valid, f"{elapsed:.2f}s", f"{valid / elapsed:,.0f}"])
+
+    print()
+    print_table(['validator', 'valid rows', 'elapsed', 'rows/s'], results)
+
+def insert_benchmark_products(conn, count, seed=42):
+    """
+    Insert count loan products with random criteria, some of them NULL.
+
+    Returns:
+        provider_name shared by the inserted products, for cleanup
+    """
+    rng = random.Random(seed)
+    provider = f"benchmark-{uuid.uuid4().hex[:8]}"
+
+    def maybe(value):
+        return None if rng.random() < 0.1 else value
+
+    rows = []
+    for i in range(count):
+        min_age = maybe(rng.choice([18, 21, 25]))
+        rows.append((
+            provider, f"Product {i}", round(rng.uniform(3.5, 18.5), 2), 1000, 50000, 36,
+            maybe(rng.randint(580, 720)), maybe(rng.randint(1500, 5000)),
+            maybe(round(rng.uniform(0.3, 0.5), 2)), min_age, maybe(rng.choice([60, 65, 70]))
+        ))
+
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO loan_products (
+            provider_name, product_name, interest_rate, min_loan_amount, max_loan_amount,
+            loan_term_months, min_credit_score, min_monthly_income, max_debt_to_income, min_age, max_age
+        ) VALUES %s
+    """, rows)
+    conn.commit()
+    cursor.close()
+    return provider
+
+def per_user_sql_matching(conn, batch_id):
+    """Baseline: one INSERT ... SELECT per user, as built by the n8n "Generate SQL Filters" node."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT user_id, credit_score, monthly_income, age, debt_to_income_ratio
+        FROM users WHERE batch_id = %s
+    """, (batch_id,))
+    users = cursor.fetchall()
+
+    for user_id, credit_score, monthly_income, age, dti in users:
+        cursor.execute(f"""
+            INSERT INTO matches (user_id, product_id, match_score, match_reason)
+            SELECT
+              {user_id} as user_id,
+              product_id,
+              CASE
+                WHEN {credit_score} >= min_credit_score + 50 THEN 90
+                WHEN {credit_score} >= min_credit_score + 30 THEN 80
+                WHEN {credit_score} >= min_credit_score + 10 THEN 70
+                WHEN {credit_score} >= min_credit_score THEN 60
+                ELSE 50
+              END as match_score,
+              'Pre-filtered match based on credit score, income, and age criteria'
+            FROM
+              loan_products
+            WHERE
+              {credit_score} >= min_credit_score
+              AND {monthly_income} >= min_monthly_income
+              AND {age} >= min_age
+              AND (max_age IS NULL OR {age} <= max_age)
+              AND (max_debt_to_income IS NULL OR {dti or 0} <= max_debt_to_income)
+              AND NOT EXISTS (
+                SELECT 1 FROM matches m WHERE m.user_id = {user_id} AND m.product_id = loan_products.product_id
+              )
+            RETURNING *;
+        """)
+        conn.commit()
+    cursor.close()
+
+def fetch_batch_matches(conn, batch_id):
+    """
+    Return the set of (user_id, product_id, match_score, match_reason) rule matches stored for a batch.
+
+    Borderline pairs approved by the engine's pre-scorer are left out, since the
+    other matchers have no pre-scorer; all the batch's matches are deleted.
+    """
+    from pre_scorer import PRE_SCORE_REASON
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT m.user_id, m.product_id, m.match_score, m.match_reason
+        FROM matches m JOIN users u ON m.user_id = u.user_id
+        WHERE u.batch_id = %s AND m.match_reason IS DISTINCT FROM %s
+    """, (batch_id, PRE_SCORE_REASON))
+    matches = set(cursor.fetchall())
+    cursor.execute("DELETE FROM matches WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+    conn.commit()
+    cursor.close()
+    return matches
+
+def explain_batch_matching(conn, batch_id):
+    """Print the EXPLAIN ANALYZE plan of the set-based candidate query for a batch."""
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM batch_match_candidates(%s)", (batch_id,))
+    for (line,) in cursor.fetchall():
+        print(f"    {line}")
+    cursor.close()
+
+def benchmark_match(args):
+    """Compare the matching paths over a grid of users x products and check they agree."""
+    from db import connect
+    from process_user_data import bulk_upsert_users, iter_chunks
+    from matching_engine import run_matching, run_sql_matching
+
+    matchers = {
+        'per-user-sql': per_user_sql_matching,
+        'engine': run_matching,
+        'sql-function': run_sql_matching
+    }
+
+    conn = connect()
+    results = []
+    for product_count in args.products:
+        provider = insert_benchmark_products(conn, product_count, seed=product_count)
+        try:
+            for user_count in args.users:
+                batch_id = str(uuid.uuid4())
+                try:
+                    for chunk in iter_chunks(generate_users(user_count, seed=user_count), 5000):
+                        bulk_upsert_users(conn, chunk, batch_id)
+                    # Fresh statistics so the plans reflect the new rows
+                    cursor = conn.cursor()
+                    cursor.execute("ANALYZE users")
+                    cursor.execute("ANALYZE loan_products")
+                    cursor.close()
+
+                    if args.explain:
+                        print(f"{user_count} users x {product_count} products:")
+                        explain_batch_matching(conn, batch_id)
+
+                    match_sets = []
+                    for name in args.matchers:
+                        start = time.perf_counter()
+                        matchers[name](conn, batch_id)
+                        elapsed = time.perf_counter() - start
+                        match_sets.append(fetch_batch_matches(conn, batch_id))
+                        results.append([
+                            user_count, product_count, name, len(match_sets[-1]),
+                            f"{elapsed:.2f}s", f"{user_count / elapsed:,.0f}"
+                        ])
+                        print(f"{name:>12}: {user_count} users x {product_count} products in {elapsed:.2f}s")
+
+                    if any(matches != match_sets[0] for matches in match_sets):
+                        print(f"WARNING: matchers disagree for {user_count} users x {product_count} products")
+                finally:
+                    cleanup_batch(conn, batch_id)
+        finally:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM loan_products WHERE provider_name = %s", (provider,))
+            conn.commit()
+            cursor.close()
+
+    conn.close()
+    print()
+    print_table(['users', 'products', 'matcher', 'matches', 'elapsed', 'users/s'], results)
+
+def random_products(count, seed=42):
+    """Column arrays shaped like matching_engine.load_products output, with about 10% NULL criteria."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+
+    def with_nulls(values):
+        values = values.astype(np.float64)
+        values[rng.random(count) < 0.1] = np.nan
+        return values
+
+    return {
+        'product_id': np.arange(1, count + 1, dtype=np.int64),
+        'min_credit_score': with_nulls(rng.integers(580, 721, count)),
+        'min_monthly_income': with_nulls(rng.integers(1500, 5001, count)),
+        'min_age': with_nulls(rng.choice([18, 21, 25], count)),
+        'max_age': with_nulls(rng.choice([60, 65, 70], count)),
+        'max_debt_to_income': with_nulls(np.round(rng.uniform(0.3, 0.5, count), 2))
+    }
+
+def full_scan_lookup(products, user):
+    """Baseline: evaluate one user against every product, as the per-user SQL and the CROSS JOIN do."""
+    import numpy as np
+
+    credit, income, age, dti = user
+    eligible = (
+        (credit >= products['min_credit_score'])
+        & (income >= products['min_monthly_income'])
+        & (age >= products['min_age'])
+        & (np.isnan(products['max_age']) | (age <= products['max_age']))
+        & (np.isnan(products['max_debt_to_income']) | (dti <= products['max_debt_to_income']))
+    )
+    borderline = (
+        (credit >= products['min_credit_score'] - 30)
+        & (credit <= products['min_credit_score'])
+        & (income >= products['min_monthly_income'] * 0.9)
+        & ~eligible
+    )
+    return products['product_id'][eligible], products['product_id'][borderline]
+
+def benchmark_index(args):
+    """Compare per-user candidate lookups by full scan and by ProductIndex at several catalog sizes."""
+    from product_index import ProductIndex
+
+    users = [
+        (float(u['credit_score']), u['monthly_income'], float(u['age']), u['debt_to_income_ratio'])
+        for u in generate_users(args.lookups)
+    ]
+
+    results = []
+    for count in args.products:
+        products = random_products(count, seed=count)
+
+        start = time.perf_counter()
+        index = ProductIndex(products)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scan_hits = sum(len(e) + len(b) for e, b in (full_scan_lookup(products, user) for user in users))
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index_hits = sum(len(index.eligible(*user)) + len(index.borderline(*user)) for user in users)
+        indexed = time.perf_counter() - start
+
+        if scan_hits != index_hits:
+            print(f"WARNING: full scan found {scan_hits} candidates, index found {index_hits}")
+
+        results.append([
+            count, f"{build * 1000:.1f}ms", index_hits // len(users),
+            f"{scan / len(users) * 1e6:.1f}us", f"{indexed / len(users) * 1e6:.1f}us", f"{scan / indexed:.1f}x"
+        ])
+
+    print_table(['products', 'index build', 'candidates/user', 'full scan', 'index', 'speedup'], results)
+
+def borderline_pairs(count, seed=42):
+    """Build count (user_data, loan_product) dicts with credit scores just below the product minimum."""
+    rng = random.Random(seed)
+    pairs = []
+    for i, user in enumerate(generate_users(count, seed=seed)):
+        user['user_id'] = i + 1
+        pairs.append((user, {
+            'product_id': i + 1,
+            'provider_name': 'Benchmark Bank',
+            'product_name': f"Personal Loan {i}",
+            'interest_rate': 7.5,
+            'min_loan_amount': 5000,
+            'max_loan_amount': 25000,
+            'loan_term_months': 36,
+            'min_credit_score': user['credit_score'] + rng.randint(0, 30),
+            'min_monthly_income': round(user['monthly_income'] / rng.uniform(0.9, 1.0)),
+            'max_debt_to_income': 0.4
+        }))
+    return pairs
+
+def benchmark_llm(args):
+    """Measure check_eligibility_batch against the mock LLM server across concurrency limits and pack sizes."""
+    from mock_llm_server import serve_in_background
+
+    server = serve_in_background(latency=args.latency, drop_every=args.drop_every, chatty_every=args.chatty_every)
+    base = f"http://127.0.0.1:{server.server_port}/" + ('v1' if args.api == 'openai' else 'v1beta')
+    os.environ.setdefault('OPENAI_API_KEY' if args.api == 'openai' else 'GEMINI_API_KEY', 'mock-key')
+    from ai_eligibility_checker import AIEligibilityChecker
+
+    checker = AIEligibilityChecker(api_type=args.api, api_base=base, response_format=args.response_format)
+    pairs = borderline_pairs(args.pairs)
+
+    results = []
+    baseline = None
+    for pack_size in args.pack_sizes:
+        for concurrency in args.concurrency:
+            checker.reset_stats()
+            start = time.perf_counter()
+            verdicts = checker.check_eligibility_batch(pairs, max_concurrency=concurrency, pack_size=pack_size)
+            elapsed = time.perf_counter() - start
+            stats = checker.get_stats()
+
+            # Mock verdicts are deterministic, so every run should agree with the first
+            baseline = baseline or [verdict and verdict[:2] for verdict in verdicts]
+            if [verdict and verdict[:2] for verdict in verdicts] != baseline:
+                print(f"WARNING: verdicts at pack size {pack_size}, concurrency {concurrency} differ from the first run")
+            errors = sum(1 for verdict in verdicts if verdict is None or verdict[2].startswith('API error'))
+
+            results.append([
+                pack_size, concurrency, len(verdicts), errors, stats['requests'], stats['fallback_pairs'],
+                f"{stats['parse_fast']}/{stats['parse_fallback']}/{stats['parse_failed']}",
+                stats['prompt_tokens'], stats['completion_tokens'],
+                f"{stats['latency_seconds'] / max(1, stats['requests']) * 1000:.0f}ms",
+                f"{elapsed:.2f}s", f"{len(pairs) / elapsed:,.1f}"
+            ])
+
+    server.shutdown()
+    print_table([
+        'pack', 'concurrency', 'pairs', 'errors', 'requests', 'fallbacks', 'parsed fast/fallback/failed',
+        'prompt tokens', 'completion tokens', 'avg latency', 'elapsed', 'pairs/s'
+    ], results)
+
+def benchmark_ai_batch(args):
+    """Compare per-pair ai_eligibility_lambda invocations with one batch invocation."""
+    import json
+    from mock_llm_server import serve_in_background
+
+    server = serve_in_background(latency=args.latency)
+    os.environ['OPENAI_API_BASE'] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ['AI_API_TYPE'] = args.api
+    os.environ['AI_ROUTE'] = ''
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    from db import connect
+    from process_user_data import bulk_upsert_users, iter_chunks
+    from matching_engine import run_matching
+    from verdict_cache import VerdictCache
+    import ai_eligibility_lambda
+
+    def reset(conn, batch_id, provider):
+        # Every mode starts without verdicts, in the matches table or in either cache tier
+        ai_eligibility_lambda.verdict_cache = VerdictCache(
+            model=ai_eligibility_lambda.ai_checker.model, prompt_version=ai_eligibility_lambda.PROMPT_VERSION
+        )
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM ai_verdict_cache
+            WHERE product_id IN (SELECT product_id FROM loan_products WHERE provider_name = %s)
+        """, (provider,))
+        cursor.execute("""
+            UPDATE matches SET ai_eligible = NULL, ai_confidence = NULL, ai_reason = NULL, ai_evaluated_at = NULL
+            WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)
+        """, (batch_id,))
+        conn.commit()
+        cursor.close()
+
+    def verdicts(conn, batch_id):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT m.user_id, m.product_id, m.ai_eligible, m.ai_confidence
+            FROM matches m JOIN users u ON u.user_id = m.user_id
+            WHERE u.batch_id = %s ORDER BY 1, 2
+        """, (batch_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    conn = connect()
+    batch_id = str(uuid.uuid4())
+    provider = insert_benchmark_products(conn, args.products, seed=args.products)
+    results = []
+    try:
+        for chunk in iter_chunks(generate_users(args.users, seed=args.users), 5000):
+            bulk_upsert_users(conn, chunk, batch_id)
+        run_matching(conn, batch_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT m.user_id, m.product_id FROM matches m JOIN users u ON u.user_id = m.user_id WHERE u.batch_id = %s", (batch_id,))
+        pairs = cursor.fetchall()
+        cursor.close()
+        print(f"{args.users} users x {args.products} products: {len(pairs)} matched pairs to evaluate")
+
+        reset(conn, batch_id, provider)
+        start = time.perf_counter()
+        for user_id, product_id in pairs:
+            ai_eligibility_lambda.lambda_handler({'body': json.dumps({'user_id': user_id, 'product_id': product_id})}, None)
+        elapsed = time.perf_counter() - start
+        per_pair = verdicts(conn, batch_id)
+        results.append(['per-pair', len(pairs), len(pairs), f"{elapsed:.2f}s", f"{len(pairs) / elapsed:,.1f}"])
+
+        reset(conn, batch_id, provider)
+        start = time.perf_counter()
+        response = ai_eligibility_lambda.lambda_handler({'batch_id': batch_id}, None)
+        elapsed = time.perf_counter() - start
+        body = json.loads(response['body'])
+        results.append(['batch', body.get('evaluated'), 1, f"{elapsed:.2f}s", f"{len(pairs) / elapsed:,.1f}"])
+        print(f"batch timing: {body.get('timing')}")
+
+        if verdicts(conn, batch_id) != per_pair:
+            print("WARNING: batch verdicts differ from per-pair verdicts")
+    finally:
+        cleanup_batch(conn, batch_id)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM loan_products WHERE provider_name = %s", (provider,))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        server.shutdown()
+
+    print()
+    print_table(['mode', 'pairs', 'invocations', 'elapsed', 'pairs/s'], results)
+
+def serial_notify(conn, batch_id, sen):
+    """The original notification loop: one matches query, send and commit per user; returns the commit count."""
+    from psycopg2.extras import RealDictCursor
+
+    commits = 0
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute("""
+        SELECT DISTINCT u.user_id, u.email, u.monthly_income, u.credit_score
+        FROM users u
+        JOIN matches m ON u.user_id = m.user_id
+        WHERE u.batch_id = %s
+        AND m.notified = FALSE
+    """, (batch_id,))
+    for user in cursor.fetchall():
+        cursor.execute("""
+            SELECT m.match_id, m.user_id, m.product_id, m.match_score,
+                   lp.provider_name, lp.product_name, lp.interest_rate,
+                   lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+            FROM matches m
+            JOIN loan_products lp ON m.product_id = lp.product_id
+            WHERE m.user_id = %s
+            AND m.notified = FALSE
+            ORDER BY m.match_score DESC
+        """, (user['user_id'],))
+        matches = cursor.fetchall()
+        subject, html_body = sen.generate_email_content(user, matches)
+        if sen.send_email(user['email'], subject, html_body)['status'] == 'success':
+            cursor.execute("UPDATE matches SET notified = TRUE WHERE match_id = ANY(%s)", ([m['match_id'] for m in matches],))
+            cursor.execute("""
+                INSERT INTO notifications (user_id, email_subject, email_body, status)
+                VALUES (%s, %s, %s, 'sent')
+            """, (user['user_id'], subject, html_body))
+            conn.commit()
+            commits += 1
+    cursor.close()
+    return commits
+
+def benchmark_notify(args):
+    """Compare the serial notification loop with the pipelined sender against the mock SES server."""
+    import json
+    import logging
+    from mock_ses_server import serve_in_background
+
+    server = serve_in_background(latency=args.latency, max_rate=args.ses_quota)
+    os.environ['SES_ENDPOINT_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'mock')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'mock')
+    from db import connect
+    from process_user_data import bulk_upsert_users, iter_chunks
+    from matching_engine import run_matching
+    import send_email_notification as sen
+    # One log line per email would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def reset(conn, batch_id):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM notifications WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+        cursor.execute("DELETE FROM notification_outbox WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+        cursor.execute("UPDATE matches SET notified = FALSE WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s)", (batch_id,))
+        conn.commit()
+        cursor.close()
+
+    def outcome(conn, batch_id):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM notifications n JOIN users u ON u.user_id = n.user_id WHERE u.batch_id = %s),
+                   (SELECT COUNT(*) FROM matches m JOIN users u ON u.user_id = m.user_id WHERE u.batch_id = %s AND m.notified)
+        """, (batch_id, batch_id))
+        counts = cursor.fetchone()
+        cursor.close()
+        return counts
+
+    conn = connect()
+    batch_id = str(uuid.uuid4())
+    provider = insert_benchmark_products(conn, args.products, seed=args.products)
+    results = []
+    try:
+        for chunk in iter_chunks(generate_users(args.users, seed=args.users), 5000):
+            bulk_upsert_users(conn, chunk, batch_id)
+        run_matching(conn, batch_id)
+
+        runs = [('loop', None)] if 'loop' in args.modes else []
+        runs += [('pipeline', rate) for rate in args.send_rates] if 'pipeline' in args.modes else []
+        baseline = None
+        for mode, rate in runs:
+            reset(conn, batch_id)
+            server.state['sent'] = server.state['throttled'] = 0
+            start = time.perf_counter()
+            if mode == 'loop':
+                commits = serial_notify(conn, batch_id, sen)
+            else:
+                sen.SES_MAX_SEND_RATE = rate
+                response = sen.lambda_handler({'batch_id': batch_id}, None)
+                commits = json.loads(response['body']).get('commits', 0)
+            elapsed = time.perf_counter() - start
+
+            counts = outcome(conn, batch_id)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COALESCE(AVG(pg_column_size(n.*)), 0)
+                FROM notifications n JOIN users u ON u.user_id = n.user_id
+                WHERE u.batch_id = %s
+            """, (batch_id,))
+            log_bytes = cursor.fetchone()[0]
+            cursor.close()
+            baseline = baseline or counts
+            if counts != baseline:
+                print(f"WARNING: {mode} at rate {rate} recorded {counts}, expected {baseline}")
+            results.append([
+                mode, rate or '-', counts[0], counts[1], server.state['throttled'], commits,
+                f"{log_bytes:,.0f}", f"{elapsed:.2f}s", f"{counts[0] / elapsed:,.1f}"
+            ])
+    finally:
+        cleanup_batch(conn, batch_id)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM loan_products WHERE provider_name = %s", (provider,))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        server.shutdown()
+
+    print_table(['mode', 'send rate', 'emails', 'matches notified', 'throttled', 'commits', 'log bytes/email', 'elapsed', 'emails/s'], results)
+
+def legacy_email_content(user, matches):
+    """generate_email_content as it was before the precompiled templates, for comparison."""
+    from email_templates import format_currency
+
+    subject = f"Good news! We've found {len(matches)} loan {len(matches) == 1 and 'option' or 'options'} for you"
+    html_body = f"""
+<!DOCTYPE html>
+<html>
+<head>
+  <style>
+    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+    .header {{ background-color: #3498db; color: white; padding: 20px; text-align: center; }}
+    .content {{ padding: 20px; }}
+    .loan-item {{ border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }}
+    .loan-name {{ color: #3498db; font-size: 18px; font-weight: bold; }}
+    .loan-provider {{ color: #777; }}
+    .loan-details {{ margin-top: 10px; }}
+    .loan-match {{ background-color: #f8f9fa; padding: 5px 10px; border-radius: 15px; font-size: 14px; }}
+    .footer {{ background-color: #f8f9fa; padding: 20px; text-align: center; font-size: 12px; color: #777; }}
+    .button {{ display: inline-block; background-color: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; }}
+  </style>
+</head>
+<body>
+  <div class="container">
+    <div class="header">
+      <h1>Loan Eligibility Results</h1>
+    </div>
+    <div class="content">
+      <p>Dear {user['email'].split('@')[0]},</p>
+      <p>We're pleased to inform you that based on your financial profile, you may be eligible for the following loan products:</p>
+"""
+    for match in matches:
+        match_score = round(float(match['match_score']))
+        html_body += f"""
+      <div class="loan-item">
+        <div class="loan-name">{match['product_name']}</div>
+        <div class="loan-provider">from {match['provider_name']}</div>
+        <div class="loan-details">
+          <p><strong>Interest Rate:</strong> {match['interest_rate']}%</p>
+          <p><strong>Loan Amount:</strong> {format_currency(match['min_loan_amount'])} - {format_currency(match['max_loan_amount'])}</p>
+          <p><strong>Term:</strong> {match['loan_term_months']} months</p>
+          <p><span class="loan-match">Match Score: {match_score}%</span></p>
+        </div>
+      </div>
+"""
+    html_body += f"""
+      <p>These matches are based on the information you provided. To proceed with any of these options, please visit the lender's website or contact them directly.</p>
+      <p>If you have any questions about these recommendations, feel free to contact our support team.</p>
+      <p>Best regards,<br>Loan Eligibility Engine Team</p>
+    </div>
+    <div class="footer">
+      <p>This is an automated email. Please do not reply directly to this message.</p>
+      <p>© {2023} Loan Eligibility Engine</p>
+    </div>
+  </div>
+</body>
+</html>
+"""
+    return subject, html_body
+
+def legacy_raw_message(sender, recipient, subject, html_body):
+    """The MIMEMultipart message send_email used to build, for comparison."""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart()
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg.as_string()
+
+def benchmark_email(args):
+    """Compare legacy and precompiled email rendering and MIME building, checking the output matches."""
+    import re
+    from decimal import Decimal
+    from email_templates import render_email, build_raw_message, product_card
+
+    rng = random.Random(42)
+    products = [{
+        'product_name': f"Product {i}",
+        'provider_name': f"Provider {i % 7}",
+        'interest_rate': Decimal(f"{rng.uniform(3.5, 18.5):.2f}"),
+        'min_loan_amount': Decimal(rng.choice([1000, 5000, 10000])),
+        'max_loan_amount': rng.choice([Decimal(50000), Decimal('250000.00'), None]),
+        'loan_term_months': rng.choice([12, 36, 60])
+    } for i in range(args.products)]
+    boundary = re.compile(r"={15}\d{19}==")
+
+    results = []
+    for match_count in args.matches:
+        users = [
+            ({'email': f"user{i}@example.com"}, [
+                dict(product, match_score=Decimal(rng.choice([50, 60, 70, 80, 90]) + rng.choice([0, 0.5])))
+                for product in rng.sample(products, min(match_count, len(products)))
+            ])
+            for i in range(args.emails)
+        ]
+
+        # Identical HTML, and identical messages once the random MIME boundaries are aligned
+        for user, matches in users[:200]:
+            subject, html_body = render_email(user, matches)
+            if (subject, html_body) != legacy_email_content(user, matches):
+                print(f"WARNING: rendered email differs for {user['email']}")
+                break
+            new = build_raw_message('sender@example.com', user['email'], subject, html_body)
+            old = legacy_raw_message('sender@example.com', user['email'], subject, html_body)
+            if boundary.sub('B', new) != boundary.sub('B', old):
+                print(f"WARNING: MIME message differs for {user['email']}")
+                break
+
+        product_card.cache_clear()
+        for name, render, build in [
+            ('legacy', legacy_email_content, legacy_raw_message),
+            ('compiled', render_email, build_raw_message)
+        ]:
+            start = time.perf_counter()
+            rendered = [render(user, matches) for user, matches in users]
+            render_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            for (user, _), (subject, html_body) in zip(users, rendered):
+                build('sender@example.com', user['email'], subject, html_body)
+            build_elapsed = time.perf_counter() - start
+            results.append([
+                match_count, name, f"{len(users) / render_elapsed:,.0f}",
+                f"{len(users) / build_elapsed:,.0f}", f"{len(users) / (render_elapsed + build_elapsed):,.0f}"
+            ])
+
+    print_table(['matches', 'renderer', 'render/s', 'mime/s', 'emails/s'], results)
+
+def simulated_invocation(conn):
+    """Run the kind of short query a notification or AI eligibility invocation starts with."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM loan_products")
+    cursor.fetchone()
+    cursor.close()
+    conn.commit()
+
+def benchmark_pool(args):
+    """Compare a fresh connection per invocation with connections reused from ConnectionPool."""
+    from db import connect, ConnectionPool
+
+    def percentile(samples, fraction):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def run(label, acquire, release):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.invocations):
+            began = time.perf_counter()
+            conn = acquire()
+            simulated_invocation(conn)
+            release(conn)
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        return [
+            label, args.invocations, f"{percentile(latencies, 0.5) * 1000:.2f}ms",
+            f"{percentile(latencies, 0.95) * 1000:.2f}ms", f"{elapsed:.2f}s"
+        ]
+
+    results = [run('connect per invocation', connect, lambda conn: conn.close())]
+    for interval in args.health_check_intervals:
+        pool = ConnectionPool(max_size=1, health_check_interval=interval)
+        row = run(f"pool (health check after {interval:g}s idle)", pool.get, pool.put)
+        pool.close_all()
+        results.append(row + [pool.stats['connects'], pool.stats['health_checks']])
+    results[0] += [args.invocations, 0]
+
+    print_table(['mode', 'invocations', 'p50', 'p95', 'elapsed', 'connects', 'health checks'], results)
+
+# Scratch schema the plans benchmark builds its tables in
+PLANS_SCHEMA = "bench_plans"
+
+# Pipeline queries timed by the plans benchmark, as the workflows and Lambdas run them.
+# %(batch)s is a batch that is still being processed.
+PIPELINE_QUERIES = [
+    ("check new users (main)", """
+        SELECT batch_id, COUNT(*) as user_count FROM users WHERE processed = FALSE GROUP BY batch_id
+    """),
+    ("unnotified matches (main)", """
+        SELECT batch_id, COUNT(*) as match_count FROM users u JOIN matches m ON u.user_id = m.user_id
+        WHERE m.notified = FALSE GROUP BY batch_id
+    """),
+    ("new products (main)", """
+        SELECT COUNT(*) as new_products FROM loan_products WHERE created_at > NOW() - INTERVAL '1 day'
+    """),
+    ("count sent emails (C)", """
+        SELECT COUNT(*) as emails_sent FROM notifications WHERE sent_at >= NOW() - INTERVAL '1 hour' AND status = 'sent'
+    """),
+    ("notify batch (lambda)", """
+        SELECT u.user_id, u.email, u.monthly_income, u.credit_score,
+               m.match_id, m.product_id, m.match_score,
+               lp.provider_name, lp.product_name, lp.interest_rate,
+               lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+        FROM users u
+        JOIN matches m ON m.user_id = u.user_id
+        JOIN loan_products lp ON m.product_id = lp.product_id
+        WHERE m.notified = FALSE AND NOT EXISTS (
+            SELECT 1 FROM notification_outbox o WHERE o.user_id = u.user_id AND o.status = 'sending'
+        ) AND u.batch_id = %(batch)s
+        ORDER BY u.user_id, m.match_score DESC, m.match_id
+    """),
+    ("notify all (lambda digest)", """
+        SELECT u.user_id, u.email, u.monthly_income, u.credit_score,
+               m.match_id, m.product_id, m.match_score,
+               lp.provider_name, lp.product_name, lp.interest_rate,
+               lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+        FROM users u
+        JOIN matches m ON m.user_id = u.user_id
+        JOIN loan_products lp ON m.product_id = lp.product_id
+        WHERE m.notified = FALSE AND NOT EXISTS (
+            SELECT 1 FROM notification_outbox o WHERE o.user_id = u.user_id AND o.status = 'sending'
+        )
+        ORDER BY u.user_id, m.match_score DESC, m.match_id
+    """),
+    ("pending AI pairs (lambda)", """
+        SELECT m.user_id, m.product_id FROM matches m JOIN users u ON u.user_id = m.user_id
+        WHERE u.batch_id = %(batch)s AND (FALSE OR m.ai_evaluated_at IS NULL)
+        ORDER BY m.user_id, m.product_id
+    """),
+    ("match candidates (B)", """
+        SELECT COUNT(*) FROM batch_match_candidates(%(batch)s)
+    """)
+]
+
+def seed_plans_schema(conn, args, column_statements):
+    """
+    Build the pipeline tables in PLANS_SCHEMA and fill them with generated rows.
+
+    column_statements (the migration minus its indexes) run right after schema.sql.
+
+    All but the last --pending-batches batches are processed, matched, notified
+    and AI-evaluated, like a production database long after their uploads.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {PLANS_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {PLANS_SCHEMA}")
+    cursor.execute(f"SET search_path TO {PLANS_SCHEMA}")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrastructure', 'schema.sql')) as f:
+        cursor.execute(f.read())
+    for statement in column_statements:
+        cursor.execute(statement)
+
+    pending_from = max(0, args.users // args.batch_size - args.pending_batches)
+    cursor.execute("""
+        INSERT INTO loan_products (provider_name, product_name, interest_rate, min_loan_amount, max_loan_amount,
+                                   loan_term_months, min_credit_score, min_monthly_income, max_debt_to_income,
+                                   min_age, max_age, created_at)
+        SELECT 'Provider ' || (i %% 40), 'Product ' || i, 3.5 + (i %% 150) / 10.0, 1000, 50000,
+               12 * (1 + i %% 5), 550 + (i * 37) %% 200, 1000 + (i * 53) %% 7000,
+               CASE WHEN i %% 3 = 0 THEN NULL ELSE 0.3 + (i %% 4) / 10.0 END,
+               18 + i %% 8, CASE WHEN i %% 2 = 0 THEN NULL ELSE 60 + i %% 15 END,
+               NOW() - (i %% 90) * INTERVAL '1 day'
+        FROM generate_series(1, %s) i
+    """, (args.products,))
+    cursor.execute("""
+        INSERT INTO users (email, monthly_income, credit_score, employment_status, age,
+                           debt_to_income_ratio, existing_loans, batch_id, processed)
+        SELECT 'user' || i || '@bench.example', 2000 + (i * 7919) %% 13000, 500 + (i * 104729) %% 350,
+               'employed', 21 + (i * 31) %% 55, ((i * 17) %% 60) / 100.0, i %% 4,
+               'bench-' || (i / %(batch_size)s), i / %(batch_size)s < %(pending_from)s
+        FROM generate_series(0::bigint, %(users)s - 1) i
+    """, {"batch_size": args.batch_size, "pending_from": pending_from, "users": args.users})
+    cursor.execute("""
+        INSERT INTO matches (user_id, product_id, match_score, match_reason, notified, ai_eligible, ai_evaluated_at)
+        SELECT u.user_id, 1 + (u.user_id * 7 + k * 13) %% %(products)s, 50 + 10 * ((u.user_id + k) %% 5),
+               'Pre-filtered match based on credit score, income, and age criteria',
+               u.processed, CASE WHEN u.processed THEN TRUE END, CASE WHEN u.processed THEN NOW() END
+        FROM users u, generate_series(1, %(matches)s) k
+    """, {"products": args.products, "matches": args.matches_per_user})
+    cursor.execute("""
+        INSERT INTO notifications (user_id, email_subject, sent_at, status)
+        SELECT user_id, 'Good news!', NOW() - (user_id % 43200) * INTERVAL '1 minute',
+               CASE WHEN user_id % 20 = 0 THEN 'failed' ELSE 'sent' END
+        FROM users WHERE processed
+    """)
+    cursor.close()
+    return f"bench-{pending_from}"
+
+def scan_nodes(plan):
+    """List the scans of an EXPLAIN (FORMAT JSON) plan as 'node type relation/index'."""
+    scans = []
+    if plan.get("Node Type", "").endswith("Scan"):
+        target = plan.get("Index Name") or plan.get("Relation Name") or ""
+        scans.append(f"{plan['Node Type']} {target}".strip())
+    for child in plan.get("Plans", []):
+        scans.extend(scan_nodes(child))
+    return scans
+
+def time_pipeline_queries(conn, params, repeat):
+    """Run every pipeline query repeat times; return {name: (median seconds, scans)}."""
+    cursor = conn.cursor()
+    timings = {}
+    for name, sql in PIPELINE_QUERIES:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        scans = scan_nodes(cursor.fetchone()[0][0]["Plan"])
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[name] = (sorted(samples)[len(samples) // 2], scans)
+    cursor.close()
+    return timings
+
+def benchmark_plans(args):
+    """Time the pipeline's queries before and after the index migration on a seeded scratch schema."""
+    import re
+    from db import connect
+    from migrate import list_migrations, split_statements
+
+    migration = next(m for m in list_migrations() if m["version"] == args.migration)
+    with open(migration["path"]) as f:
+        statements = split_statements(f.read())
+    index_statements = [s for s in statements if re.match(r'(CREATE|DROP) INDEX', s)]
+
+    conn = connect()
+    conn.autocommit = True
+    try:
+        start = time.perf_counter()
+        batch = seed_plans_schema(conn, args, [s for s in statements if s not in index_statements])
+        cursor = conn.cursor()
+        cursor.execute("VACUUM ANALYZE")
+        print(f"Seeded {args.users:,} users, {args.users * args.matches_per_user:,} matches and "
+              f"{args.products} products in {time.perf_counter() - start:.1f}s")
+
+        params = {"batch": batch}
+        before = time_pipeline_queries(conn, params, args.repeat)
+
+        start = time.perf_counter()
+        for statement in index_statements:
+            cursor.execute(statement)
+        cursor.execute("VACUUM ANALYZE")
+        print(f"Applied {len(index_statements)} index statements of migration "
+              f"{migration['version']:03d} in {time.perf_counter() - start:.1f}s")
+        after = time_pipeline_queries(conn, params, args.repeat)
+        cursor.close()
+
+        results = []
+        for name, _ in PIPELINE_QUERIES:
+            old, new = before[name][0], after[name][0]
+            results.append([name, f"{old * 1000:.1f}ms", f"{new * 1000:.1f}ms", f"{old / new:.1f}x"])
+        print_table(['query', 'before', 'after', 'speedup'], results)
+
+        print("\nScans before -> after:")
+        for name, _ in PIPELINE_QUERIES:
+            print(f"  {name}: {', '.join(before[name][1])} -> {', '.join(after[name][1])}")
+    finally:
+        if not args.keep:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP SCHEMA IF EXISTS {PLANS_SCHEMA} CASCADE")
+            cursor.close()
+        conn.close()
+
+# Scratch schema the partitions benchmark builds its tables in
+PARTITIONS_SCHEMA = "bench_partitions"
+
+# Queries timed by the partitions benchmark, as the workflows and Lambdas run them
+# against partitioned tables. %(batch)s is the latest, still unnotified batch.
+PARTITION_QUERIES = [
+    ("system stats (main)", """
+        SELECT
+          (SELECT COUNT(*) FROM users) as total_users,
+          (SELECT COUNT(*) FROM loan_products) as total_products,
+          (SELECT COUNT(*) FROM matches) as total_matches,
+          (SELECT COUNT(*) FROM notifications WHERE status = 'sent') as total_notifications
+    """),
+    ("count sent emails (C)", """
+        SELECT COUNT(*) as emails_sent FROM notifications WHERE sent_at >= NOW() - INTERVAL '1 hour' AND status = 'sent'
+    """),
+    ("unnotified matches (main)", """
+        SELECT batch_id, COUNT(*) as match_count FROM users u JOIN matches m ON u.user_id = m.user_id
+        WHERE m.notified = FALSE AND m.ai_eligible IS NOT FALSE AND m.created_at >= u.created_at GROUP BY batch_id
+    """),
+    ("notify batch (lambda)", """
+        SELECT u.user_id, u.email, u.monthly_income, u.credit_score,
+               m.match_id, m.created_at, m.product_id, m.match_score,
+               lp.provider_name, lp.product_name, lp.interest_rate,
+               lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+        FROM users u
+        JOIN matches m ON m.user_id = u.user_id
+        JOIN loan_products lp ON m.product_id = lp.product_id
+        WHERE m.notified = FALSE AND NOT EXISTS (
+            SELECT 1 FROM notification_outbox o WHERE o.user_id = u.user_id AND o.status = 'sending'
+        ) AND u.batch_id = %(batch)s
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch)s)
+        ORDER BY u.user_id, m.match_score DESC, m.match_id
+    """),
+    ("notify digest (lambda)", """
+        SELECT u.user_id, u.email, u.monthly_income, u.credit_score,
+               m.match_id, m.created_at, m.product_id, m.match_score,
+               lp.provider_name, lp.product_name, lp.interest_rate,
+               lp.min_loan_amount, lp.max_loan_amount, lp.loan_term_months
+        FROM users u
+        JOIN matches m ON m.user_id = u.user_id
+        JOIN loan_products lp ON m.product_id = lp.product_id
+        WHERE m.notified = FALSE AND m.ai_eligible IS NOT FALSE AND NOT EXISTS (
+            SELECT 1 FROM notification_outbox o WHERE o.user_id = u.user_id AND o.status = 'sending'
+        ) AND m.created_at >= u.created_at AND NOT EXISTS (
+            SELECT 1 FROM notifications n
+            WHERE n.user_id = u.user_id AND n.status = 'sent' AND n.sent_at > NOW() - make_interval(secs => 86400)
+        )
+        ORDER BY u.user_id, m.match_score DESC, m.match_id
+    """),
+    ("pending AI pairs (lambda)", """
+        SELECT m.user_id, m.product_id FROM matches m JOIN users u ON u.user_id = m.user_id
+        WHERE u.batch_id = %(batch)s AND (FALSE OR m.ai_evaluated_at IS NULL)
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch)s)
+        ORDER BY m.user_id, m.product_id
+    """),
+    ("count batch matches (B)", """
+        SELECT COUNT(*) as total_matches FROM matches m JOIN users u ON m.user_id = u.user_id
+        WHERE u.batch_id = %(batch)s
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch)s)
+    """)
+]
+
+def seed_partitions_schema(conn, args, schema=PARTITIONS_SCHEMA):
+    """
+    Build the pipeline tables in schema with migration 001 applied and fill
+    them with args.months months of batches, oldest first.
+
+    Every batch but the last --pending-batches is matched, notified and AI-evaluated;
+    matches are created an hour after their users and emails sent an hour later.
+
+    Returns:
+        batch_id of the latest batch
+    """
+    from migrate import ensure_migrations_table, list_migrations, apply_migration
+
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrastructure', 'schema.sql')) as f:
+        cursor.execute(f.read())
+    conn.commit()
+    ensure_migrations_table(conn)
+    apply_migration(conn, next(m for m in list_migrations() if m["version"] == 1))
+
+    users = args.matches // args.matches_per_user
+    batches = max(1, -(-users // args.batch_size))
+    pending_from = max(0, batches - args.pending_batches)
+    cursor.execute("""
+        INSERT INTO loan_products (provider_name, product_name, interest_rate, min_loan_amount, max_loan_amount,
+                                   loan_term_months, min_credit_score, min_monthly_income, max_debt_to_income,
+                                   min_age, max_age)
+        SELECT 'Provider ' || (i %% 40), 'Product ' || i, 3.5 + (i %% 150) / 10.0, 1000, 50000,
+               12 * (1 + i %% 5), 550 + (i * 37) %% 200, 1000 + (i * 53) %% 7000,
+               CASE WHEN i %% 3 = 0 THEN NULL ELSE 0.3 + (i %% 4) / 10.0 END,
+               18 + i %% 8, CASE WHEN i %% 2 = 0 THEN NULL ELSE 60 + i %% 15 END
+        FROM generate_series(1, %s) i
+    """, (args.products,))
+    # Batch b is uploaded at the b-th step between the start of the first month and two hours ago
+    cursor.execute("""
+        INSERT INTO users (email, monthly_income, credit_score, employment_status, age,
+                           debt_to_income_ratio, existing_loans, batch_id, processed, created_at)
+        SELECT 'user' || i || '@bench.example', 2000 + (i * 7919) %% 13000, 500 + (i * 104729) %% 350,
+               'employed', 21 + (i * 31) %% 55, ((i * 17) %% 60) / 100.0, i %% 4,
+               'bench-' || (i / %(batch_size)s), i / %(batch_size)s < %(pending_from)s,
+               start + (NOW() - INTERVAL '2 hours' - start) * ((i / %(batch_size)s)::float / %(last_batch)s)
+        FROM generate_series(0::bigint, %(users)s - 1) i,
+             (SELECT date_trunc('month', NOW()) - make_interval(months => %(months)s - 1) AS start) s
+    """, {"batch_size": args.batch_size, "pending_from": pending_from, "users": users,
+          "last_batch": max(1, batches - 1), "months": args.months})
+    cursor.execute("""
+        INSERT INTO matches (user_id, product_id, match_score, match_reason, created_at,
+                             notified, ai_eligible, ai_evaluated_at)
+        SELECT u.user_id, 1 + (u.user_id * 7 + k * 13) %% %(products)s, 50 + 10 * ((u.user_id + k) %% 5),
+               'Pre-filtered match based on credit score, income, and age criteria',
+               u.created_at + INTERVAL '1 hour',
+               u.processed, CASE WHEN u.processed THEN TRUE END,
+               CASE WHEN u.processed THEN u.created_at + INTERVAL '1 hour' END
+        FROM users u, generate_series(1, %(matches)s) k
+    """, {"products": args.products, "matches": args.matches_per_user})
+    cursor.execute("""
+        INSERT INTO notifications (user_id, email_subject, sent_at, status, template_version)
+        SELECT user_id, 'Good news!', created_at + INTERVAL '2 hours',
+               CASE WHEN user_id % 20 = 0 THEN 'failed' ELSE 'sent' END, '1'
+        FROM users WHERE processed
+    """)
+    conn.commit()
+    cursor.close()
+    return f"bench-{batches - 1}"
+
+def benchmark_partitions(args):
+    """Time the stats and unnotified-match queries and a month of retention, unpartitioned vs partitioned."""
+    from db import connect
+    from migrate import list_migrations, apply_migration
+    from partition_maintenance import maintain_partitions
+
+    def vacuum_analyze():
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("VACUUM ANALYZE")
+        cursor.close()
+        conn.autocommit = False
+
+    def time_queries():
+        cursor = conn.cursor()
+        timings = {}
+        for name, sql in PARTITION_QUERIES:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                samples.append(time.perf_counter() - start)
+            cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+            timings[name] = (sorted(samples)[len(samples) // 2], count_scanned_partitions(cursor.fetchone()[0][0]["Plan"]))
+        cursor.close()
+        conn.rollback()
+        return timings
+
+    def count_scanned_partitions(plan):
+        # Scans of matches_*/notifications_* partitions that actually ran
+        scanned = set()
+        relation = plan.get("Relation Name", "")
+        if re.match(r'^(matches|notifications)_\d{4}_\d{2}$', relation) and plan.get("Actual Loops", 0) > 0:
+            scanned.add(relation)
+        for child in plan.get("Plans", []):
+            scanned |= count_scanned_partitions(child)
+        return scanned
+
+    import re
+    conn = connect()
+    try:
+        start = time.perf_counter()
+        batch = seed_partitions_schema(conn, args)
+        vacuum_analyze()
+        print(f"Seeded {args.matches:,} matches over {args.months} months in {time.perf_counter() - start:.1f}s")
+        params = {"batch": batch}
+
+        before = time_queries()
+
+        # Retiring the oldest month: DELETE from the single table (rolled back)...
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        cursor.execute("""
+            DELETE FROM matches
+            WHERE created_at < date_trunc('month', NOW()) - make_interval(months => %s)
+        """, (args.months - 2,))
+        deleted = cursor.rowcount
+        delete_elapsed = time.perf_counter() - start
+        conn.rollback()
+        cursor.close()
+
+        start = time.perf_counter()
+        apply_migration(conn, next(m for m in list_migrations() if m["version"] == 2))
+        migrate_elapsed = time.perf_counter() - start
+        vacuum_analyze()
+        print(f"Migration 002 copied the tables into monthly partitions in {migrate_elapsed:.1f}s")
+
+        after = time_queries()
+
+        # ...vs detaching and dropping its partition
+        start = time.perf_counter()
+        retired = maintain_partitions(conn, tables={"matches": args.months - 1}, drop=True)["matches"]["retired"]
+        detach_elapsed = time.perf_counter() - start
+
+        results = []
+        for name, _ in PARTITION_QUERIES:
+            old, new = before[name][0], after[name][0]
+            results.append([
+                name, f"{old * 1000:.1f}ms", f"{new * 1000:.1f}ms", f"{old / new:.1f}x",
+                len(after[name][1]) if after[name][1] else "-"
+            ])
+        results.append([
+            f"retire oldest month ({deleted:,} matches)", f"{delete_elapsed * 1000:.1f}ms",
+            f"{detach_elapsed * 1000:.1f}ms", f"{delete_elapsed / detach_elapsed:.1f}x", f"dropped {', '.join(retired)}"
+        ])
+        print_table(['query', 'unpartitioned', 'partitioned', 'speedup', 'partitions read'], results)
+    finally:
+        if not args.keep:
+            conn.rollback()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP SCHEMA IF EXISTS {PARTITIONS_SCHEMA} CASCADE")
+            conn.commit()
+            cursor.close()
+        conn.close()
+
+# Scratch schema the stats benchmark builds its tables in
+STATS_SCHEMA = "bench_stats"
+
+# Counts read by the workflows: (name, COUNT(*) query they ran, counter query after migration 003).
+# %(batch)s is the latest batch.
+STATS_QUERIES = [
+    ("system stats (main)", """
+        SELECT
+          (SELECT COUNT(*) FROM users) as total_users,
+          (SELECT COUNT(*) FROM loan_products) as total_products,
+          (SELECT COUNT(*) FROM matches) as total_matches,
+          (SELECT COUNT(*) FROM notifications WHERE status = 'sent') as total_notifications
+    """, """
+        SELECT total_users, total_products, total_matches, total_notifications FROM system_stats
+    """),
+    ("count batch matches (B)", """
+        SELECT COUNT(*) as total_matches FROM matches m JOIN users u ON m.user_id = u.user_id
+        WHERE u.batch_id = %(batch)s
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch)s)
+    """, """
+        SELECT COALESCE((SELECT matches FROM batch_stats WHERE batch_id = %(batch)s), 0) as total_matches
+    """),
+    ("count LLM matches (B)", """
+        SELECT COUNT(*) as llm_matches FROM matches m JOIN users u ON m.user_id = u.user_id
+        WHERE u.batch_id = %(batch)s
+        AND m.created_at >= (SELECT MIN(created_at) FROM users WHERE batch_id = %(batch)s)
+        AND m.match_reason LIKE 'LLM Evaluation:%%'
+    """, """
+        SELECT COALESCE((SELECT llm_matches FROM batch_stats WHERE batch_id = %(batch)s), 0) as llm_matches
+    """)
+]
+
+def benchmark_stats(args):
+    """Time the workflows' counts with COUNT(*) vs the trigger-kept counters, and what the triggers add to a batch load."""
+    from db import connect
+    from migrate import list_migrations, apply_migration
+
+    def time_queries(column):
+        cursor = conn.cursor()
+        timings = {}
+        for query in STATS_QUERIES:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cursor.execute(query[column], params)
+                row = cursor.fetchone()
+                samples.append(time.perf_counter() - start)
+            timings[query[0]] = (sorted(samples)[len(samples) // 2], tuple(row))
+        cursor.close()
+        conn.rollback()
+        return timings
+
+    def time_batch_load(check=False):
+        # Load and match one more batch like the ingestion and matching Lambdas, then roll it back
+        cursor = conn.cursor()
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            cursor.execute("""
+                INSERT INTO users (email, monthly_income, credit_score, employment_status, age,
+                                   debt_to_income_ratio, existing_loans, batch_id)
+                SELECT 'load' || i || '@bench.example', 2000 + (i * 7919) %% 13000, 500 + (i * 104729) %% 350,
+                       'employed', 21 + (i * 31) %% 55, ((i * 17) %% 60) / 100.0, i %% 4, 'bench-load'
+                FROM generate_series(1, %s) i
+            """, (args.batch_size,))
+            cursor.execute("SELECT match_batch('bench-load')")
+            matched = cursor.fetchone()[0]
+            samples.append(time.perf_counter() - start)
+            if check:
+                for name, count_sql, counter_sql in STATS_QUERIES:
+                    cursor.execute(count_sql, {"batch": "bench-load"})
+                    counted = cursor.fetchone()
+                    cursor.execute(counter_sql, {"batch": "bench-load"})
+                    if cursor.fetchone() != counted:
+                        raise RuntimeError(f"{name}: counters disagree with COUNT(*) after a batch load")
+            conn.rollback()
+        cursor.close()
+        return sorted(samples)[len(samples) // 2], matched
+
+    conn = connect()
+    try:
+        start = time.perf_counter()
+        batch = seed_partitions_schema(conn, args, STATS_SCHEMA)
+        migrations = {m["version"]: m for m in list_migrations()}
+        apply_migration(conn, migrations[2])
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("VACUUM ANALYZE")
+        cursor.close()
+        conn.autocommit = False
+        print(f"Seeded {args.matches:,} matches in monthly partitions in {time.perf_counter() - start:.1f}s")
+        params = {"batch": batch}
+
+        before = time_queries(1)
+        load_before, matched = time_batch_load()
+
+        start = time.perf_counter()
+        apply_migration(conn, migrations[3])
+        print(f"Migration 003 created the triggers and backfilled the counters in {time.perf_counter() - start:.1f}s")
+
+        after = time_queries(2)
+        load_after, _ = time_batch_load(check=True)
+
+        results = []
+        for name, _, _ in STATS_QUERIES:
+            old, new = before[name][0], after[name][0]
+            if before[name][1] != after[name][1]:
+                raise RuntimeError(f"{name}: counters {after[name][1]} disagree with COUNT(*) {before[name][1]}")
+            results.append([name, f"{old * 1000:.2f}ms", f"{new * 1000:.2f}ms", f"{old / new:.0f}x"])
+        results.append([
+            f"load + match a batch ({args.batch_size:,} users, {matched:,} matches)",
+            f"{load_before * 1000:.1f}ms", f"{load_after * 1000:.1f}ms",
+            f"{(load_after / load_before - 1) * 100:+.1f}% write cost"
+        ])
+        print_table(['query', 'COUNT(*)', 'counters', 'speedup'], results)
+    finally:
+        if not args.keep:
+            conn.rollback()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP SCHEMA IF EXISTS {STATS_SCHEMA} CASCADE")
+            conn.commit()
+            cursor.close()
+        conn.close()
+
+def benchmark_faults(args):
+    """Compare LLM client settings on check_eligibility_batch against a mock LLM server injecting faults."""
+    from mock_llm_server import serve_in_background, evaluate_prompt
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    from ai_eligibility_checker import AIEligibilityChecker
+    from llm_client import LLMClient, CircuitBreaker
+
+    pairs = borderline_pairs(args.pairs)
+    expected = [evaluate_prompt(AIEligibilityChecker(api_type='openai')._create_prompt(*pair)) for pair in pairs]
+
+    clients = {
+        # Like the client before retries: one attempt and no read timeout
+        'single attempt': lambda: LLMClient(max_attempts=1, read_timeout=None, breaker=CircuitBreaker(0)),
+        'retries': lambda: LLMClient(
+            max_attempts=args.attempts, read_timeout=args.read_timeout,
+            backoff_base=args.backoff_base, breaker=CircuitBreaker(0)
+        ),
+        'retries + breaker': lambda: LLMClient(
+            max_attempts=args.attempts, read_timeout=args.read_timeout, backoff_base=args.backoff_base,
+            breaker=CircuitBreaker(args.breaker_failures, args.breaker_reset)
+        )
+    }
+    scenarios = {
+        'flaky': {
+            'throttle_every': args.throttle_every, 'retry_after': args.retry_after,
+            'fail_every': args.fail_every, 'hang_every': args.hang_every, 'hang_seconds': args.hang_seconds
+        },
+        'outage': {'outage_seconds': args.outage_seconds}
+    }
+
+    results = []
+    for scenario, faults in scenarios.items():
+        for name, make_client in clients.items():
+            # A fresh server per run, so fault counters and the outage start over
+            server = serve_in_background(latency=args.latency, **faults)
+            checker = AIEligibilityChecker(
+                api_type='openai', api_base=f"http://127.0.0.1:{server.server_port}/v1",
+                max_concurrency=args.concurrency, client=make_client()
+            )
+            start = time.perf_counter()
+            verdicts = checker.check_eligibility_batch(pairs)
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            stats = checker.get_stats()
+
+            answered = [(verdict, truth) for verdict, truth in zip(verdicts, expected) if verdict is not None]
+            correct = sum(1 for verdict, truth in answered if verdict[0] == truth['eligible'] and verdict[1] == truth['confidence'])
+            results.append([
+                scenario, name, len(answered), correct, stats['deferred_pairs'], stats['attempts'],
+                stats['retries'], stats['throttled'], stats['timeouts'], stats['server_errors'],
+                stats['circuit_rejections'], f"{elapsed:.2f}s"
+            ])
+            print(f"{scenario:>6} / {name}: {len(answered)} verdicts, {stats['deferred_pairs']} deferred in {elapsed:.2f}s")
+
+    print()
+    print_table([
+        'faults', 'client', 'verdicts', 'correct', 'deferred', 'attempts', 'retries',
+        '429s', 'timeouts', '5xx', 'circuit rejections', 'elapsed'
+    ], results)
+
+def queue_worker(worker_id, batch_id, lease_seconds):
+    """Run one llm_worker over a batch in a worker process, with its own connection."""
+    from db import connect
+    from llm_worker import run_worker
+
+    conn = connect()
+    try:
+        return run_worker(conn, worker_id, batch_id=batch_id, lease_seconds=lease_seconds)
+    finally:
+        conn.close()
+
+def benchmark_queue(args):
+    """Drain a batch's LLM jobs with several worker processes, one of which crashes."""
+    from concurrent.futures import ProcessPoolExecutor
+    from mock_llm_server import serve_in_background
+
+    server = serve_in_background(latency=args.latency)
+    # Set before the worker processes import ai_eligibility_lambda
+    os.environ['OPENAI_API_BASE'] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ['AI_API_TYPE'] = 'openai'
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    from db import connect
+    from process_user_data import bulk_upsert_users, iter_chunks
+    from matching_engine import run_matching
+    from llm_jobs import claim_jobs, get_queue_stats
+
+    def reset(conn, batch_id, provider):
+        # Every run starts from the freshly queued jobs, without verdicts in the cache
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM ai_verdict_cache
+            WHERE product_id IN (SELECT product_id FROM loan_products WHERE provider_name = %s)
+        """, (provider,))
+        cursor.execute("""
+            DELETE FROM matches
+            WHERE user_id IN (SELECT user_id FROM users WHERE batch_id = %s) AND match_reason LIKE 'LLM Evaluation:%%'
+        """, (batch_id,))
+        cursor.execute("""
+            UPDATE llm_jobs
+            SET status = 'pending', attempts = 0, available_at = NOW(), locked_by = NULL, locked_until = NULL,
+                eligible = NULL, confidence = NULL, reason = NULL, finished_at = NULL
+            WHERE batch_id = %s
+        """, (batch_id,))
+        conn.commit()
+        cursor.close()
+
+    def check(conn, batch_id):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM matches m JOIN users u ON u.user_id = m.user_id
+                WHERE u.batch_id = %s GROUP BY m.user_id, m.product_id HAVING COUNT(*) > 1
+            ) d
+        """, (batch_id,))
+        duplicates = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FROM matches m JOIN users u ON u.user_id = m.user_id
+            WHERE u.batch_id = %s AND m.match_reason LIKE 'LLM Evaluation:%%'
+        """, (batch_id,))
+        llm_matches = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FILTER (WHERE eligible), MAX(attempts) FROM llm_jobs WHERE batch_id = %s AND status = 'done'
+        """, (batch_id,))
+        eligible_jobs, max_attempts = cursor.fetchone()
+        cursor.close()
+        return duplicates, llm_matches, eligible_jobs, max_attempts
+
+    conn = connect()
+    batch_id = str(uuid.uuid4())
+    provider = insert_benchmark_products(conn, args.products, seed=args.products)
+    results = []
+    try:
+        for chunk in iter_chunks(generate_users(args.users, seed=args.users), 5000):
+            bulk_upsert_users(conn, chunk, batch_id)
+        summary = run_matching(conn, batch_id)
+        jobs = summary['llm_jobs_queued']
+        print(f"{args.users} users x {args.products} products: {summary['borderline_pairs']}, {jobs} LLM jobs queued")
+        if args.max_jobs and jobs > args.max_jobs:
+            # Keep the first max_jobs jobs so runs stay short
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM llm_jobs WHERE batch_id = %s
+                AND job_id NOT IN (SELECT job_id FROM llm_jobs WHERE batch_id = %s ORDER BY job_id LIMIT %s)
+            """, (batch_id, batch_id, args.max_jobs))
+            conn.commit()
+            cursor.close()
+            jobs = args.max_jobs
+
+        for workers in args.workers:
+            reset(conn, batch_id, provider)
+            start = time.perf_counter()
+            # A worker that claims jobs and dies before finishing them
+            crashed = len(claim_jobs(conn, 'crashed-worker', args.crash_jobs, args.lease, batch_id)) if args.crash_jobs else 0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                summaries = list(pool.map(
+                    queue_worker, [f"bench-{workers}-{i}" for i in range(workers)],
+                    [batch_id] * workers, [args.lease] * workers
+                ))
+            drained = time.perf_counter() - start
+
+            # Once its lease expires, the next worker picks up what the crashed one held
+            resumed = 0
+            if crashed:
+                time.sleep(max(0.0, args.lease - drained) + 0.5)
+                resumed = queue_worker(f"bench-{workers}-resume", batch_id, args.lease)['completed']
+            elapsed = time.perf_counter() - start
+
+            queue = get_queue_stats(conn, batch_id)
+            duplicates, llm_matches, eligible_jobs, max_attempts = check(conn, batch_id)
+            completed = sum(worker['completed'] for worker in summaries)
+            results.append([
+                workers, jobs, completed, crashed, resumed, queue['done'], queue['pending'] + queue['running'],
+                queue['failed'], duplicates, f"{llm_matches}/{eligible_jobs}", max_attempts,
+                f"{drained:.2f}s", f"{completed / drained:,.1f}", f"{elapsed:.2f}s"
+            ])
+            print(f"{workers} workers: {completed} jobs in {drained:.2f}s, {resumed} resumed after the crash")
+            if duplicates or llm_matches != eligible_jobs or queue['done'] != jobs:
+                print("WARNING: jobs were lost, duplicated or recorded inconsistently")
+    finally:
+        cleanup_batch(conn, batch_id)
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM ai_verdict_cache
+            WHERE product_id IN (SELECT product_id FROM loan_products WHERE provider_name = %s)
+        """, (provider,))
+        cursor.execute("DELETE FROM loan_products WHERE provider_name = %s", (provider,))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        server.shutdown()
+
+    print()
+    print_table([
+        'workers', 'jobs', 'completed', 'crashed', 'resumed', 'done', 'left', 'failed',
+        'duplicate matches', 'LLM matches/eligible', 'max attempts', 'drain', 'jobs/s', 'elapsed'
+    ], results)
+
+def legacy_parse_verdict(content):
+    """AIEligibilityChecker._parse_verdict as it was before llm_response_parser, for comparison."""
+    import re
+    try:
+        result = json.loads(content)
+        eligible = result.get("eligible", False)
+        confidence = float(result.get("confidence", 0))
+        reason = result.get("reason", "No reason provided")
+        return eligible, confidence, reason
+    except json.JSONDecodeError:
+        eligible_match = re.search(r'"eligible"\s*:\s*(true|false)', content, re.IGNORECASE)
+        eligible = eligible_match and eligible_match.group(1).lower() == 'true'
+        confidence_match = re.search(r'"confidence"\s*:\s*(\d+)', content, re.IGNORECASE)
+        confidence = float(confidence_match.group(1)) if confidence_match else 0
+        reason_match = re.search(r'"reason"\s*:\s*"([^"]+)"', content, re.IGNORECASE)
+        reason = reason_match.group(1) if reason_match else "No reason provided"
+        return eligible, confidence, reason
+
+def legacy_parse_verdicts(content, case_ids):
+    """AIEligibilityChecker._parse_packed_verdicts as it was before llm_response_parser, for comparison."""
+    try:
+        items = json.loads(content)
+    except json.JSONDecodeError:
+        start, end = content.find("["), content.rfind("]")
+        try:
+            items = json.loads(content[start:end + 1]) if 0 <= start < end else []
+        except json.JSONDecodeError:
+            items = []
+    if isinstance(items, dict):
+        items = items.get("verdicts", [])
+    if not isinstance(items, list):
+        return {}
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("id") not in case_ids:
+            continue
+        eligible = item.get("eligible")
+        confidence = item.get("confidence")
+        if not isinstance(eligible, bool) or isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+            continue
+        if not 0 <= confidence <= 100:
+            continue
+        verdicts[item["id"]] = (eligible, float(confidence), str(item.get("reason") or "No reason provided"))
+    return verdicts
+
+# Share of each answer shape in the synthetic corpus, after what chat models return without a JSON mode
+RESPONSE_STYLES = {
+    'json': 0.5, 'fenced': 0.2, 'prose': 0.1, 'truncated': 0.08,
+    'python': 0.04, 'strings': 0.04, 'refusal': 0.04
+}
+
+def render_response(style, verdicts, packed, rng):
+    """Render verdict dicts as an LLM answer of the given style."""
+    if style == 'python':
+        # Single quotes and True/False, as if the model printed a Python dict
+        return repr({'verdicts': verdicts} if packed else verdicts[0])
+    if style == 'strings':
+        verdicts = [{**v, 'eligible': str(v['eligible']).lower(), 'confidence': f"{v['confidence']}%"} for v in verdicts]
+    body = json.dumps(verdicts if packed else verdicts[0], indent=rng.choice([None, 2]))
+    if style == 'fenced':
+        return f"```json\n{body}\n```"
+    if style == 'prose':
+        return f"Based on the applicant's profile, here is my assessment: {body} I hope this helps."
+    if style == 'truncated':
+        # Cut off inside the last reason, as when max_tokens runs out
+        return body[:body.rfind('"reason"') + 20]
+    if style == 'refusal':
+        return "I'm sorry, but I can't provide a lending decision for this applicant."
+    return body
+
+def synthetic_responses(count, seed=42):
+    """
+    Build a corpus of raw answers with the verdicts they should parse to.
+
+    Returns:
+        List of dicts with content, case_ids (packed answers only) and expected
+        verdicts ({case_id: [eligible, confidence]}, None for refusals)
+    """
+    from mock_llm_server import evaluate_prompt
+    from ai_eligibility_checker import AIEligibilityChecker
+
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    checker = AIEligibilityChecker(api_type='openai')
+    pairs = borderline_pairs(max(1, count // 4), seed=seed)
+    rng = random.Random(seed)
+    styles, weights = zip(*RESPONSE_STYLES.items())
+
+    corpus = []
+    for i in range(count):
+        packed = rng.random() < 0.3
+        size = rng.randint(2, 8) if packed else 1
+        cases = [pairs[(i + j) % len(pairs)] for j in range(size)]
+        case_ids = [f"u{user['user_id']}-p{product['product_id']}-{j}" for j, (user, product) in enumerate(cases)]
+        verdicts = [
+            {**({'id': case_id} if packed else {}), **evaluate_prompt(checker._create_prompt(user, product))}
+            for case_id, (user, product) in zip(case_ids, cases)
+        ]
+        style = rng.choices(styles, weights)[0]
+        content = render_response(style, verdicts, packed, rng)
+
+        keys = case_ids if packed else ['']
+        expected = {key: [v['eligible'], v['confidence']] for key, v in zip(keys, verdicts)}
+        if style == 'refusal':
+            expected = None
+        elif style == 'truncated' and packed:
+            # The verdict being written when the output stopped is lost
+            expected.pop(keys[-1])
+        corpus.append({'style': style, 'content': content, 'case_ids': case_ids if packed else None, 'expected': expected})
+    return corpus
+
+def benchmark_parse(args):
+    """Compare the legacy and current LLM answer parsers over a corpus of raw answers."""
+    from llm_response_parser import parse_verdict, parse_verdicts, FAST, FALLBACK, FAILED
+
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        corpus = synthetic_responses(args.responses)
+    if args.export:
+        with open(args.export, 'w') as f:
+            for record in corpus:
+                f.write(json.dumps(record) + "\n")
+        print(f"Wrote {len(corpus)} answers to {args.export}")
+
+    def current(record):
+        if record.get('case_ids'):
+            return parse_verdicts(record['content'], set(record['case_ids']))
+        verdict, outcome = parse_verdict(record['content'])
+        return ({'': verdict} if verdict else {}), outcome
+
+    def legacy(record):
+        if record.get('case_ids'):
+            verdicts = legacy_parse_verdicts(record['content'], set(record['case_ids']))
+            return verdicts, None
+        try:
+            return {'': legacy_parse_verdict(record['content'])}, None
+        except Exception as e:
+            # The check methods turned this into an API error rejection
+            return {'': (False, 0.0, f"API error: {e}")}, None
+
+    def score(parse, records):
+        """Count verdicts read correctly, wrongly or not at all, and parse outcomes"""
+        counts = {'correct': 0, 'wrong': 0, 'missed': 0, FAST: 0, FALLBACK: 0, FAILED: 0}
+        for record in records:
+            verdicts, outcome = parse(record)
+            if outcome:
+                counts[outcome] += 1
+            expected = record.get('expected')
+            if expected is None:
+                # Nothing should be read from a refusal; a verdict here is a made-up rejection
+                counts['wrong'] += sum(1 for verdict in verdicts.values() if verdict is not None)
+                continue
+            for key, (eligible, confidence) in expected.items():
+                verdict = verdicts.get(key)
+                if verdict is None:
+                    counts['missed'] += 1
+                elif bool(verdict[0]) == eligible and verdict[1] == confidence:
+                    counts['correct'] += 1
+                else:
+                    counts['wrong'] += 1
+        return counts
+
+    def timed(parse, records):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for record in records:
+                parse(record)
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    styles = {}
+    for record in corpus:
+        styles.setdefault(record.get('style', 'recorded'), []).append(record)
+    print(f"{len(corpus)} answers: {', '.join(f'{style} {len(records)}' for style, records in styles.items())}")
+
+    results = []
+    by_style = {style: [style, len(records)] for style, records in styles.items()}
+    for name, parse in (('legacy', legacy), ('llm_response_parser', current)):
+        elapsed = 0.0
+        for style, records in styles.items():
+            style_elapsed = timed(parse, records)
+            elapsed += style_elapsed
+            counts = score(parse, records)
+            by_style[style] += [f"{style_elapsed / len(records) * 1e6:.1f}us", f"{counts['correct']}/{counts['wrong']}/{counts['missed']}"]
+
+        counts = score(parse, corpus)
+        legacy_run = name == 'legacy'
+        results.append([
+            name, f"{elapsed / len(corpus) * 1e6:.1f}us", f"{len(corpus) / elapsed:,.0f}",
+            '-' if legacy_run else counts[FAST], '-' if legacy_run else counts[FALLBACK], '-' if legacy_run else counts[FAILED],
+            counts['correct'], counts['wrong'], counts['missed']
+        ])
+
+    print()
+    print_table(['parser', 'per answer', 'answers/s', 'fast', 'fallback', 'failed', 'correct verdicts', 'wrong verdicts', 'missed verdicts'], results)
+    print()
+    print_table(['style', 'answers', 'legacy', 'legacy correct/wrong/missed', 'parser', 'parser correct/wrong/missed'], list(by_style.values()))
+
+def benchmark_providers(args):
+    """Compare AI providers and local-first routes on the same borderline pairs."""
+    from mock_llm_server import serve_in_background
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    from ai_eligibility_checker import AIEligibilityChecker
+
+    server = serve_in_background(latency=args.latency)
+    base = f"http://127.0.0.1:{server.server_port}/v1"
+    pairs = borderline_pairs(args.pairs)
+
+    runs = [('openai (mock server)', ['openai'], None), ('mock (in-process)', ['mock'], None), ('local', ['local'], None)]
+    runs += [(f"local,openai < {threshold:g}", ['local', 'openai'], threshold) for threshold in args.escalate_confidence]
+
+    results = []
+    reference = None
+    try:
+        for name, route, threshold in runs:
+            checker = AIEligibilityChecker(
+                api_type='openai', api_base=base, max_concurrency=args.concurrency, pack_size=args.pack_size,
+                route=route, escalate_confidence=threshold or 0
+            )
+            start = time.perf_counter()
+            verdicts = checker.check_eligibility_batch(pairs)
+            elapsed = time.perf_counter() - start
+            stats = checker.get_stats()
+
+            # The remote LLM's verdicts are the reference the other routes are scored against
+            reference = reference or verdicts
+            agree = sum(1 for verdict, truth in zip(verdicts, reference) if verdict and truth and verdict[0] == truth[0])
+            remote = stats.get('pairs_openai', 0)
+            results.append([
+                name, len(pairs), stats.get('pairs_local', 0), stats['escalated_pairs'], remote,
+                stats['requests'] if remote else 0, stats['prompt_tokens'] + stats['completion_tokens'] if remote else 0,
+                f"{agree / len(pairs):.1%}", f"{elapsed:.2f}s", f"{len(pairs) / elapsed:,.0f}"
+            ])
+    finally:
+        server.shutdown()
+
+    print_table([
+        'route', 'pairs', 'local', 'escalated', 'remote pairs', 'remote requests', 'remote tokens',
+        'agreement with LLM', 'elapsed', 'pairs/s'
+    ], results)
+
+def main():
+    """Main function to run benchmarks."""
+    parser = argparse.ArgumentParser(description='Benchmark the Loan Eligibility Engine backend')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    upsert_parser = subparsers.add_parser('upsert', help='Row-by-row vs COPY user upserts (needs PostgreSQL)')
+    upsert_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Row counts to load')
+    upsert_parser.add_argument('--loaders', nargs='+', choices=['rows', 'copy'], default=['rows', 'copy'], help='Loaders to compare')
+    upsert_parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per transaction')
+    upsert_parser.set_defaults(func=benchmark_upsert)
+
+    split_parser = subparsers.add_parser('split', help='Parallel byte-range ingestion of one CSV (needs PostgreSQL)')
+    split_parser.add_argument('--rows', type=int, default=1000000, help='Number of users in the generated CSV')
+    split_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts to compare')
+    split_parser.add_argument('--data-dir', type=str, help='Directory used as the local S3 stand-in')
+    split_parser.set_defaults(func=benchmark_split)
+
+    validate_parser = subparsers.add_parser('validate', help='DictReader vs columnar CSV validation')
+    validate_parser.add_argument('--users', type=int, default=1000000, help='Number of users generated with generate_sample_data')
+    validate_parser.add_argument('--csv', type=str, help='Existing user CSV to validate instead of generating one')
+    validate_parser.add_argument('--data-dir', type=str, help='Directory for the generated CSV')
+    validate_parser.set_defaults(func=benchmark_validate)
+
+    match_parser = subparsers.add_parser('match', help='Per-user SQL vs engine vs match_batch() (needs PostgreSQL)')
+    match_parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000], help='Batch sizes to match')
+    match_parser.add_argument('--products', type=int, nargs='+', default=[20, 200], help='Product catalog sizes')
+    match_parser.add_argument('--matchers', nargs='+', choices=['per-user-sql', 'engine', 'sql-function'],
+                              default=['per-user-sql', 'engine', 'sql-function'], help='Matching paths to compare')
+    match_parser.add_argument('--explain', action='store_true', help='Print the EXPLAIN ANALYZE plan of the set-based query')
+    match_parser.set_defaults(func=benchmark_match)
+
+    index_parser = subparsers.add_parser('index', help='Full scan vs ProductIndex candidate lookups (no database)')
+    index_parser.add_argument('--products', type=int, nargs='+', default=[100, 10000, 100000], help='Product catalog sizes')
+    index_parser.add_argument('--lookups', type=int, default=2000, help='Users looked up per catalog size')
+    index_parser.set_defaults(func=benchmark_index)
+
+    llm_parser = subparsers.add_parser('llm', help='Concurrent AI eligibility checks against the mock LLM server')
+    llm_parser.add_argument('--pairs', type=int, default=200, help='Number of user/product pairs to evaluate')
+    llm_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16], help='Concurrency limits to compare')
+    llm_parser.add_argument('--latency', type=float, default=0.2, help='Mock API latency in seconds')
+    llm_parser.add_argument('--api', choices=['openai', 'gemini'], default='openai', help='API flavour to exercise')
+    llm_parser.add_argument('--pack-sizes', type=int, nargs='+', default=[1], help='Pairs per request to compare')
+    llm_parser.add_argument('--drop-every', type=int, default=0, help='Mock omits every Nth case of packed answers')
+    llm_parser.add_argument('--response-format', choices=['json', 'schema', 'text'], help='How answers are requested (defaults to the API type\'s setting)')
+    llm_parser.add_argument('--chatty-every', type=int, default=0, help='Mock wraps every Nth answer outside JSON mode in prose and a code fence')
+    llm_parser.set_defaults(func=benchmark_llm)
+
+    ai_batch_parser = subparsers.add_parser('ai-batch', help='Per-pair vs batch AI eligibility invocations (needs PostgreSQL)')
+    ai_batch_parser.add_argument('--users', type=int, default=200, help='Users in the generated batch')
+    ai_batch_parser.add_argument('--products', type=int, default=10, help='Loan products to match them against')
+    ai_batch_parser.add_argument('--latency', type=float, default=0.05, help='Mock API latency in seconds')
+    ai_batch_parser.add_argument('--api', choices=['openai', 'mock', 'local'], default='openai',
+                                 help='Provider: openai against the mock server, or the offline mock or local classifier')
+    ai_batch_parser.set_defaults(func=benchmark_ai_batch)
+
+    notify_parser = subparsers.add_parser('notify', help='Serial vs pipelined notification emails (needs PostgreSQL)')
+    notify_parser.add_argument('--users', type=int, default=500, help='Users in the generated batch')
+    notify_parser.add_argument('--products', type=int, default=10, help='Loan products to match them against')
+    notify_parser.add_argument('--modes', nargs='+', choices=['loop', 'pipeline'], default=['loop', 'pipeline'], help='Senders to compare')
+    notify_parser.add_argument('--send-rates', type=float, nargs='+', default=[14, 50, 200], help='SES_MAX_SEND_RATE values for the pipeline')
+    notify_parser.add_argument('--latency', type=float, default=0.05, help='Mock SES latency in seconds')
+    notify_parser.add_argument('--ses-quota', type=float, default=0, help='Mock SES rejects sends above this rate (0 accepts all)')
+    notify_parser.set_defaults(func=benchmark_notify)
+
+    email_parser = subparsers.add_parser('email', help='Legacy vs precompiled email rendering (no database)')
+    email_parser.add_argument('--emails', type=int, default=5000, help='Emails rendered per configuration')
+    email_parser.add_argument('--matches', type=int, nargs='+', default=[10, 50], help='Matches per user to compare')
+    email_parser.add_argument('--products', type=int, default=200, help='Distinct products the matches are drawn from')
+    email_parser.set_defaults(func=benchmark_email)
+
+    pool_parser = subparsers.add_parser('pool', help='New connection per invocation vs the shared pool (needs PostgreSQL)')
+    pool_parser.add_argument('--invocations', type=int, default=200, help='Simulated Lambda invocations per mode')
+    pool_parser.add_argument('--health-check-intervals', type=float, nargs='+', default=[0, 30],
+                             help='Idle seconds before a pooled connection is pinged (0 pings every reuse)')
+    pool_parser.set_defaults(func=benchmark_pool)
+
+    plans_parser = subparsers.add_parser('plans', help='Pipeline query latencies before/after the index migration (needs PostgreSQL)')
+    plans_parser.add_argument('--users', type=int, default=2000000, help='Users seeded into the scratch schema')
+    plans_parser.add_argument('--products', type=int, default=500, help='Loan products seeded')
+    plans_parser.add_argument('--matches-per-user', type=int, default=3, help='Matches seeded per user')
+    plans_parser.add_argument('--batch-size', type=int, default=10000, help='Users per upload batch')
+    plans_parser.add_argument('--pending-batches', type=int, default=2, help='Latest batches left unprocessed and unnotified')
+    plans_parser.add_argument('--migration', type=int, default=1, help='Version of the index migration to measure')
+    plans_parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    plans_parser.add_argument('--keep', action='store_true', help=f'Keep the {PLANS_SCHEMA} schema afterwards')
+    plans_parser.set_defaults(func=benchmark_plans)
+
+    partitions_parser = subparsers.add_parser('partitions', help='Unpartitioned vs monthly partitioned matches and notifications (needs PostgreSQL)')
+    partitions_parser.add_argument('--matches', type=int, default=100000000, help='Matches seeded into the scratch schema')
+    partitions_parser.add_argument('--matches-per-user', type=int, default=5, help='Matches seeded per user')
+    partitions_parser.add_argument('--months', type=int, default=24, help='Months the batches are spread over, up to now')
+    partitions_parser.add_argument('--batch-size', type=int, default=10000, help='Users per upload batch')
+    partitions_parser.add_argument('--pending-batches', type=int, default=2, help='Latest batches left unprocessed and unnotified')
+    partitions_parser.add_argument('--products', type=int, default=500, help='Loan products seeded')
+    partitions_parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    partitions_parser.add_argument('--keep', action='store_true', help=f'Keep the {PARTITIONS_SCHEMA} schema afterwards')
+    partitions_parser.set_defaults(func=benchmark_partitions)
+
+    stats_parser = subparsers.add_parser('stats', help='COUNT(*) vs trigger-kept counters (needs PostgreSQL)')
+    stats_parser.add_argument('--matches', type=int, default=20000000, help='Matches seeded into the scratch schema')
+    stats_parser.add_argument('--matches-per-user', type=int, default=5, help='Matches seeded per user')
+    stats_parser.add_argument('--months', type=int, default=24, help='Months the batches are spread over, up to now')
+    stats_parser.add_argument('--batch-size', type=int, default=10000, help='Users per upload batch, and in the timed batch load')
+    stats_parser.add_argument('--pending-batches', type=int, default=2, help='Latest batches left unprocessed and unnotified')
+    stats_parser.add_argument('--products', type=int, default=500, help='Loan products seeded')
+    stats_parser.add_argument('--repeat', type=int, default=5, help='Runs per query and batch load; the median is reported')
+    stats_parser.add_argument('--keep', action='store_true', help=f'Keep the {STATS_SCHEMA} schema afterwards')
+    stats_parser.set_defaults(func=benchmark_stats)
+
+    faults_parser = subparsers.add_parser('faults', help='LLM client retries and circuit breaker against injected faults')
+    faults_parser.add_argument('--pairs', type=int, default=300, help='Number of borderline pairs to check')
+    faults_parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight')
+    faults_parser.add_argument('--latency', type=float, default=0.02, help='Mock server latency in seconds')
+    faults_parser.add_argument('--throttle-every', type=int, default=7, help='Answer every Nth request with 429')
+    faults_parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds of the 429 answers')
+    faults_parser.add_argument('--fail-every', type=int, default=11, help='Answer every Nth request with 503')
+    faults_parser.add_argument('--hang-every', type=int, default=50, help='Stall every Nth request')
+    faults_parser.add_argument('--hang-seconds', type=float, default=10.0, help='Seconds a stalled request waits')
+    faults_parser.add_argument('--outage-seconds', type=float, default=5.0, help='Length of the outage scenario from server start')
+    faults_parser.add_argument('--attempts', type=int, default=4, help='Attempts per request of the retrying clients')
+    faults_parser.add_argument('--read-timeout', type=float, default=2.0, help='Read timeout of the retrying clients')
+    faults_parser.add_argument('--backoff-base', type=float, default=0.25, help='Backoff ceiling of the first retry')
+    faults_parser.add_argument('--breaker-failures', type=int, default=5, help='Consecutive failures that open the circuit')
+    faults_parser.add_argument('--breaker-reset', type=float, default=2.0, help='Seconds the circuit stays open')
+    faults_parser.set_defaults(func=benchmark_faults)
+
+    queue_parser = subparsers.add_parser('queue', help='LLM job queue drained by concurrent workers (needs PostgreSQL)')
+    queue_parser.add_argument('--users', type=int, default=2000, help='Users in the generated batch')
+    queue_parser.add_argument('--products', type=int, default=50, help='Loan products to match them against')
+    queue_parser.add_argument('--max-jobs', type=int, default=2000, help='Jobs kept of those queued (0 keeps all)')
+    queue_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker process counts to compare')
+    queue_parser.add_argument('--crash-jobs', type=int, default=20, help='Jobs claimed by a worker that never finishes them')
+    queue_parser.add_argument('--lease', type=float, default=5.0, help='Lease seconds of each claim')
+    queue_parser.add_argument('--latency', type=float, default=0.05, help='Mock API latency in seconds')
+    queue_parser.set_defaults(func=benchmark_queue)
+
+    parse_parser = subparsers.add_parser('parse', help='Legacy vs current LLM answer parsing (no database)')
+    parse_parser.add_argument('--responses', type=int, default=20000, help='Synthetic answers generated')
+    parse_parser.add_argument('--corpus', help='JSON Lines corpus of answers written by --export, or recorded')
+    parse_parser.add_argument('--export', help='Also write the corpus to this JSON Lines file')
+    parse_parser.add_argument('--repeat', type=int, default=5, help='Runs per parser; the median is reported')
+    parse_parser.set_defaults(func=benchmark_parse)
+
+    providers_parser = subparsers.add_parser('providers', help='Remote, in-process and local-first routed AI providers (no database)')
+    providers_parser.add_argument('--pairs', type=int, default=1000, help='Number of borderline pairs to check')
+    providers_parser.add_argument('--latency', type=float, default=0.2, help='Mock API latency of the remote LLM in seconds')
+    providers_parser.add_argument('--concurrency', type=int, default=8, help='Remote requests in flight')
+    providers_parser.add_argument('--pack-size', type=int, default=1, help='Pairs per remote request')
+    providers_parser.add_argument('--escalate-confidence', type=float, nargs='+', default=[60, 75, 90],
+                                  help='Local confidence thresholds below which routed pairs go to the remote LLM')
+    providers_parser.set_defaults(func=benchmark_providers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Pre-scorer Evaluation Script for Loan Eligibility Engine
+
+This script checks backend/pre_scorer.py against recorded LLM verdicts offline:
+1. Verdicts are read from the ai_* columns of matches (skipping API errors and
+   verdicts the pre-scorer itself recorded), from a JSON Lines file written by
+   --export, or, to try the script without recorded verdicts, labelled by
+   tools/mock_llm_server.py over synthetic borderline pairs with --synthetic
+2. Every pair is scored and triaged with the configured thresholds
+3. The report gives the fraction of LLM calls avoided, the agreement of the
+   local decisions with the recorded verdicts, and the confusion matrix;
+   --sweep repeats it over a grid of thresholds
+
+The mock server only looks at the credit score gap, so --synthetic measures
+the harness, not how well the pre-scorer matches a real model.
+
+Usage:
+    python evaluate_pre_scorer.py
+    python evaluate_pre_scorer.py --limit 50000 --export verdicts.jsonl
+    python evaluate_pre_scorer.py --input verdicts.jsonl --sweep
+    python evaluate_pre_scorer.py --synthetic 5000 --approve 85 --reject 25
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+# Make the Lambda modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+# Load environment variables
+load_dotenv()
+
+USER_FIELDS = ["monthly_income", "credit_score", "employment_status", "age", "debt_to_income_ratio", "existing_loans"]
+PRODUCT_FIELDS = ["min_credit_score", "min_monthly_income", "max_debt_to_income"]
+
+# Thresholds tried by --sweep
+SWEEP_APPROVE = [70, 75, 80, 85, 90, 95]
+SWEEP_REJECT = [15, 20, 25, 30, 35, 40]
+
+def load_recorded_verdicts(conn, limit):
+    """
+    Read the latest LLM verdicts recorded on matches, with the fields the pre-scorer uses.
+
+    Args:
+        conn: Database connection
+        limit: Maximum number of verdicts
+
+    Returns:
+        List of dicts with user, product and eligible
+    """
+    from psycopg2.extras import RealDictCursor
+    from pre_scorer import PRE_SCORE_PREFIX
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(f"""
+            SELECT {', '.join('u.' + field for field in USER_FIELDS)},
+                   {', '.join('lp.' + field for field in PRODUCT_FIELDS)},
+                   m.ai_eligible
+            FROM matches m
+            JOIN users u ON u.user_id = m.user_id
+            JOIN loan_products lp ON lp.product_id = m.product_id
+            WHERE m.ai_evaluated_at IS NOT NULL
+            AND m.ai_eligible IS NOT NULL
+            AND m.ai_reason NOT LIKE 'API error%%'
+            AND m.ai_reason NOT LIKE %s
+            ORDER BY m.ai_evaluated_at DESC
+            LIMIT %s
+        """, (PRE_SCORE_PREFIX + '%', limit))
+        rows = cursor.fetchall()
+
+    return [
+        {
+            "user": {field: _plain(row[field]) for field in USER_FIELDS},
+            "product": {field: _plain(row[field]) for field in PRODUCT_FIELDS},
+            "eligible": row["ai_eligible"]
+        }
+        for row in rows
+    ]
+
+def _plain(value):
+    """Convert NUMERIC columns to float so records can be written as JSON"""
+    return float(value) if value is not None and not isinstance(value, (int, float, str)) else value
+
+def synthetic_verdicts(count):
+    """Label count synthetic borderline pairs with the mock LLM server's verdicts."""
+    from benchmark import borderline_pairs
+    from mock_llm_server import evaluate_prompt
+    from ai_eligibility_checker import AIEligibilityChecker
+
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    checker = AIEligibilityChecker(api_type='openai')
+    return [
+        {
+            "user": {field: user[field] for field in USER_FIELDS},
+            "product": {field: product[field] for field in PRODUCT_FIELDS},
+            "eligible": evaluate_prompt(checker._create_prompt(user, product))["eligible"]
+        }
+        for user, product in borderline_pairs(count)
+    ]
+
+def evaluate(scores, recorded, approve, reject):
+    """
+    Compare the local decisions at one pair of thresholds with the recorded verdicts.
+
+    Args:
+        scores: Array of pre-scores
+        recorded: Boolean array of recorded verdicts
+        approve: Lowest score approved locally
+        reject: Highest score rejected locally
+
+    Returns:
+        Dict of counts and rates
+    """
+    from pre_scorer import triage, APPROVE, REJECT
+
+    decisions = triage(scores, approve, reject)
+    approved = decisions == APPROVE
+    rejected = decisions == REJECT
+    decided = int(approved.sum() + rejected.sum())
+    agreed = int((approved & recorded).sum() + (rejected & ~recorded).sum())
+
+    return {
+        "pairs": len(scores),
+        "decided": decided,
+        "avoided": decided / max(1, len(scores)),
+        "agreement": agreed / decided if decided else float("nan"),
+        "approve_precision": (approved & recorded).sum() / approved.sum() if approved.any() else float("nan"),
+        "reject_precision": (rejected & ~recorded).sum() / rejected.sum() if rejected.any() else float("nan"),
+        # With the undecided pairs answered by the LLM itself
+        "overall": (agreed + len(scores) - decided) / max(1, len(scores)),
+        "matrix": [
+            [int((mask & recorded).sum()), int((mask & ~recorded).sum())]
+            for mask in (approved, decisions == 0, rejected)
+        ]
+    }
+
+def percent(value):
+    """Format a rate as a percentage, or '-' when undefined."""
+    return "-" if np.isnan(value) else f"{value * 100:.1f}%"
+
+def main():
+    """Main function to run the evaluation."""
+    from pre_scorer import score_dict_pairs, PRE_SCORE_APPROVE, PRE_SCORE_REJECT
+    from benchmark import print_table
+
+    parser = argparse.ArgumentParser(description='Evaluate the pre-scorer against recorded LLM verdicts')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--input', help='JSON Lines file of verdicts written by --export')
+    source.add_argument('--synthetic', type=int, help='Label this many synthetic pairs with the mock LLM server')
+    parser.add_argument('--limit', type=int, default=100000, help='Maximum verdicts read from the database')
+    parser.add_argument('--export', help='Also write the verdicts to this JSON Lines file')
+    parser.add_argument('--approve', type=float, default=PRE_SCORE_APPROVE, help='Lowest score approved locally')
+    parser.add_argument('--reject', type=float, default=PRE_SCORE_REJECT, help='Highest score rejected locally')
+    parser.add_argument('--sweep', action='store_true', help='Also report a grid of thresholds')
+
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    elif args.synthetic:
+        records = synthetic_verdicts(args.synthetic)
+    else:
+        from db import connect
+        conn = connect()
+        try:
+            records = load_recorded_verdicts(conn, args.limit)
+        finally:
+            conn.close()
+
+    if args.export:
+        with open(args.export, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        print(f"Wrote {len(records)} verdicts to {args.export}")
+
+    if not records:
+        print("No recorded verdicts to evaluate")
+        return
+
+    scores = score_dict_pairs([(record["user"], record["product"]) for record in records])
+    recorded = np.array([bool(record["eligible"]) for record in records])
+    print(f"{len(records)} verdicts, {recorded.mean() * 100:.1f}% eligible")
+
+    result = evaluate(scores, recorded, args.approve, args.reject)
+    print(f"\nThresholds: approve >= {args.approve:g}, reject <= {args.reject:g}")
+    print(f"LLM calls avoided: {result['decided']} of {result['pairs']} ({percent(result['avoided'])})")
+    print(f"Agreement on decided pairs: {percent(result['agreement'])}")
+    print(f"Agreement overall, with the rest sent to the LLM: {percent(result['overall'])}\n")
+    print_table(['pre-score', 'LLM eligible', 'LLM ineligible'], [
+        [label, *counts] for label, counts in zip(['approve', 'ask LLM', 'reject'], result['matrix'])
+    ])
+
+    if args.sweep:
+        rows = []
+        for approve in SWEEP_APPROVE:
+            for reject in SWEEP_REJECT:
+                swept = evaluate(scores, recorded, approve, reject)
+                rows.append([
+                    approve, reject, percent(swept['avoided']), percent(swept['agreement']),
+                    percent(swept['approve_precision']), percent(swept['reject_precision']), percent(swept['overall'])
+                ])
+        print()
+        print_table(['approve', 'reject', 'calls avoided', 'agreement', 'approve precision', 'reject precision', 'overall'], rows)
+
+if __name__ == "__main__":
+    main()
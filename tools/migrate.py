@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Migration Script for Loan Eligibility Engine
+
+This script applies the versioned SQL migrations in infrastructure/migrations
+on top of infrastructure/schema.sql:
+1. Files are named NNN_description.sql and applied in version order
+2. Applied versions are recorded in the schema_migrations table, so each
+   migration runs once per database
+3. A migration runs in a single transaction together with its version record,
+   unless its first line is "-- migrate: no-transaction"; such migrations
+   (needed for CREATE INDEX CONCURRENTLY) run statement by statement in
+   autocommit mode and must be safe to re-run if interrupted
+
+An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind that
+IF NOT EXISTS would keep; drop it before running the migration again.
+
+Usage:
+    python migrate.py
+    python migrate.py --status
+    python migrate.py --dry-run --target 1
+"""
+
+import os
+import re
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Database connection parameters
+DB_HOST = os.environ.get("DB_HOST")
+DB_NAME = os.environ.get("DB_NAME", "loaneligibility")
+DB_USER = os.environ.get("DB_USER", "admin")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+# Directory holding the migration files
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrastructure', 'migrations')
+
+MIGRATION_FILE = re.compile(r'^(\d{3})_(\w+)\.sql$')
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+
+def get_db_connection():
+    """Create a connection to the PostgreSQL database."""
+    try:
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT
+        )
+        return conn
+    except Exception as e:
+        print(f"Database connection error: {str(e)}")
+        raise e
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Find the migration files.
+
+    Args:
+        directory: Directory holding NNN_description.sql files
+
+    Returns:
+        List of dicts with version, name, path and transactional flag, by version
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path) as f:
+            first_line = f.readline().strip()
+        migrations.append({
+            "version": int(match.group(1)),
+            "name": match.group(2),
+            "path": path,
+            "transactional": first_line != NO_TRANSACTION_MARKER
+        })
+    return migrations
+
+def split_statements(sql):
+    """
+    Split a migration into statements.
+
+    Statements end with a semicolon at the end of a line; comment lines are
+    dropped. Dollar-quoted bodies must be kept to transactional migrations,
+    which are executed whole.
+    """
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith("--"):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statement = "\n".join(current).strip()
+            if statement != ";":
+                statements.append(statement)
+            current = []
+    if "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+def ensure_migrations_table(conn):
+    """Create the schema_migrations table if needed."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+def applied_versions(conn):
+    """Get the versions recorded in schema_migrations."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+def apply_migration(conn, migration):
+    """
+    Apply one migration and record its version.
+
+    Args:
+        conn: Database connection, not in autocommit mode
+        migration: Dict from list_migrations()
+    """
+    with open(migration["path"]) as f:
+        sql = f.read()
+    record = "INSERT INTO schema_migrations (version, name) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING"
+
+    if migration["transactional"]:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute(record, (migration["version"], migration["name"]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return
+
+    conn.commit()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in split_statements(sql):
+                cursor.execute(statement)
+            cursor.execute(record, (migration["version"], migration["name"]))
+    finally:
+        conn.autocommit = False
+
+def migrate(conn, target=None, dry_run=False):
+    """
+    Apply every pending migration up to target.
+
+    Args:
+        conn: Database connection
+        target: Highest version to apply (all when None)
+        dry_run: Only report what would be applied
+
+    Returns:
+        List of migrations applied (or pending, for a dry run)
+    """
+    ensure_migrations_table(conn)
+    done = applied_versions(conn)
+    pending = [
+        migration for migration in list_migrations()
+        if migration["version"] not in done and (target is None or migration["version"] <= target)
+    ]
+
+    for migration in pending:
+        label = f"{migration['version']:03d}_{migration['name']}"
+        if dry_run:
+            print(f"Would apply {label}")
+            continue
+        print(f"Applying {label}...")
+        apply_migration(conn, migration)
+
+    return pending
+
+def main():
+    """Main function to run the migrations."""
+    parser = argparse.ArgumentParser(description='Apply database migrations for the Loan Eligibility Engine')
+    parser.add_argument('--status', action='store_true', help='List migrations and whether they are applied')
+    parser.add_argument('--dry-run', action='store_true', help='Show pending migrations without applying them')
+    parser.add_argument('--target', type=int, help='Highest migration version to apply')
+
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.status:
+            ensure_migrations_table(conn)
+            done = applied_versions(conn)
+            for migration in list_migrations():
+                state = "applied" if migration["version"] in done else "pending"
+                print(f"{migration['version']:03d}_{migration['name']}: {state}")
+            return
+
+        applied = migrate(conn, args.target, args.dry_run)
+        if not applied:
+            print("Database is up to date")
+        elif not args.dry_run:
+            print(f"Applied {len(applied)} migration(s)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
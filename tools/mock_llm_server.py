@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Mock LLM Server for Loan Eligibility Engine
+
+This script serves a local stand-in for the AI APIs used by AIEligibilityChecker:
+1. OpenAI chat completions: POST /v1/chat/completions
+2. Gemini generateContent: POST /v1beta/models/<model>:generateContent
+
+Verdicts are deterministic, with the rule of the in-process 'mock' provider in
+backend/ai_providers.py: a user is eligible when their credit score is within
+20 points of the product minimum. Packed prompts ("Case ID: ..." blocks) are
+answered with a JSON array of verdicts, or with an object holding a verdicts
+array when the request asks for the API's JSON mode; --drop-every N leaves
+every Nth case out of packed answers to exercise the single-pair fallback.
+Outside JSON mode, --chatty-every N wraps every Nth answer in prose and a
+```json fence, as chat models often do. Each request sleeps
+for --latency seconds to simulate API round trips, and responses report
+approximate token usage.
+
+Faults can be injected to exercise the client's retries, timeouts and circuit
+breaker: --throttle-every N answers every Nth request with 429 and a
+Retry-After of --retry-after seconds, --fail-every N answers every Nth with
+503, --hang-every N stalls every Nth for --hang-seconds before answering, and
+--outage-after/--outage-seconds answer every request with 503 during a window
+measured from server start.
+
+Point the checker at it with:
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1
+    GEMINI_API_BASE=http://127.0.0.1:8765/v1beta
+
+Usage:
+    python mock_llm_server.py --port 8765 --latency 0.2 --drop-every 25
+    python mock_llm_server.py --chatty-every 3
+    python mock_llm_server.py --throttle-every 7 --fail-every 11 --hang-every 50 --hang-seconds 35
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The verdict rule is shared with the in-process 'mock' provider of the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from ai_providers import answer_prompt  # noqa: E402
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def chatty(content):
+    """Wrap an answer the way chat models often do without a JSON mode."""
+    return f"Here is my evaluation:\n\n```json\n{content}\n```\n\nLet me know if you need anything else."
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Request handler answering OpenAI and Gemini style requests."""
+
+    # Seconds to sleep before answering, packed-case drop interval, chatty interval and injected faults, set by make_server
+    latency = 0.0
+    drop_every = 0
+    chatty_every = 0
+    chatty_counter = None
+    counter = None
+    faults = {}
+    request_counter = None
+    started = 0.0
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out on a stalled request and closed the connection
+            pass
+
+    def _inject_fault(self):
+        """Answer with an injected failure, or stall, as configured; returns True when answered"""
+        faults = self.faults
+        number = next(self.request_counter) + 1
+
+        elapsed = time.monotonic() - self.started
+        if faults.get("outage_seconds") and faults["outage_after"] <= elapsed < faults["outage_after"] + faults["outage_seconds"]:
+            self._send_json(503, {"error": {"message": "Injected outage"}})
+            return True
+        if faults.get("throttle_every") and number % faults["throttle_every"] == 0:
+            self._send_json(429, {"error": {"message": "Injected rate limit"}}, {"Retry-After": str(faults["retry_after"])})
+            return True
+        if faults.get("fail_every") and number % faults["fail_every"] == 0:
+            self._send_json(503, {"error": {"message": "Injected server error"}})
+            return True
+        if faults.get("hang_every") and number % faults["hang_every"] == 0:
+            time.sleep(faults["hang_seconds"])
+        return False
+
+    def _render(self, prompt, json_mode):
+        content = answer_prompt(prompt, self.drop_every, self.counter, json_mode)
+        if not json_mode and self.chatty_every and next(self.chatty_counter) % self.chatty_every == self.chatty_every - 1:
+            content = chatty(content)
+        return content
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        if self._inject_fault():
+            return
+
+        if self.path.endswith("/chat/completions"):
+            messages = payload.get("messages", [])
+            prompt = messages[-1]["content"] if messages else ""
+            json_mode = payload.get("response_format", {}).get("type") in ("json_object", "json_schema")
+            content = self._render(prompt, json_mode)
+            prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+            completion_tokens = estimate_tokens(content)
+            self._send_json(200, {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            })
+        elif ":generateContent" in self.path:
+            texts = [part.get("text", "") for item in payload.get("contents", []) for part in item.get("parts", [])]
+            json_mode = payload.get("generationConfig", {}).get("responseMimeType") == "application/json"
+            content = self._render(texts[-1] if texts else "", json_mode)
+            prompt_tokens = sum(estimate_tokens(text) for text in texts)
+            completion_tokens = estimate_tokens(content)
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": content}]}}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": completion_tokens,
+                    "totalTokenCount": prompt_tokens + completion_tokens
+                }
+            })
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, drop_every=0, throttle_every=0, retry_after=1,
+                fail_every=0, hang_every=0, hang_seconds=0.0, outage_after=0.0, outage_seconds=0.0, chatty_every=0):
+    """
+    Create a threaded mock server.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        latency: Seconds to wait before each response
+        drop_every: Omit every Nth case of packed answers (0 keeps all)
+        throttle_every: Answer every Nth request with 429 (0 never)
+        retry_after: Retry-After seconds sent with the 429 answers
+        fail_every: Answer every Nth request with 503 (0 never)
+        hang_every: Stall every Nth request for hang_seconds (0 never)
+        hang_seconds: Seconds a stalled request waits before its answer
+        outage_after: Seconds after start when the outage begins
+        outage_seconds: Length of the outage, during which every request gets 503 (0 for none)
+        chatty_every: Wrap every Nth answer outside JSON mode in prose and a code fence (0 never)
+
+    Returns:
+        ThreadingHTTPServer; its base URL is http://host:server.server_port
+    """
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {
+        "latency": latency,
+        "drop_every": drop_every,
+        "counter": itertools.count(),
+        "chatty_every": chatty_every,
+        "chatty_counter": itertools.count(),
+        "faults": {
+            "throttle_every": throttle_every,
+            "retry_after": retry_after,
+            "fail_every": fail_every,
+            "hang_every": hang_every,
+            "hang_seconds": hang_seconds,
+            "outage_after": outage_after,
+            "outage_seconds": outage_seconds
+        },
+        "request_counter": itertools.count(),
+        "started": time.monotonic()
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def serve_in_background(latency=0.0, drop_every=0, **faults):
+    """Start a mock server on a free local port in a daemon thread and return it; faults go to make_server."""
+    server = make_server(latency=latency, drop_every=drop_every, **faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """Main function to run the mock server."""
+    parser = argparse.ArgumentParser(description='Mock OpenAI/Gemini server for the Loan Eligibility Engine')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds to wait before each response')
+    parser.add_argument('--drop-every', type=int, default=0, help='Omit every Nth case from packed answers')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds of the 429 answers')
+    parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with 503')
+    parser.add_argument('--hang-every', type=int, default=0, help='Stall every Nth request')
+    parser.add_argument('--hang-seconds', type=float, default=35.0, help='Seconds a stalled request waits')
+    parser.add_argument('--outage-after', type=float, default=0.0, help='Seconds after start when an outage begins')
+    parser.add_argument('--outage-seconds', type=float, default=0.0, help='Length of the outage in seconds')
+    parser.add_argument('--chatty-every', type=int, default=0, help='Wrap every Nth answer outside JSON mode in prose and a code fence')
+
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, args.latency, args.drop_every,
+        throttle_every=args.throttle_every, retry_after=args.retry_after, fail_every=args.fail_every,
+        hang_every=args.hang_every, hang_seconds=args.hang_seconds,
+        outage_after=args.outage_after, outage_seconds=args.outage_seconds, chatty_every=args.chatty_every
+    )
+    print(f"Mock LLM server listening on http://{args.host}:{server.server_port}")
+    print(f"OpenAI base: http://{args.host}:{server.server_port}/v1")
+    print(f"Gemini base: http://{args.host}:{server.server_port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Mock SES Server for Loan Eligibility Engine
+
+This script serves a local stand-in for the SES query API used by
+send_email_notification:
+1. SendRawEmail and SendEmail: answered with a generated MessageId
+2. Sending rate: with --max-rate, requests beyond that many per second are
+   rejected with the Throttling error SES returns when the quota is exceeded
+
+Each request sleeps for --latency seconds to simulate API round trips. The
+server counts sent and throttled messages, reported on shutdown.
+
+Point the notification Lambda at it with:
+    SES_ENDPOINT_URL=http://127.0.0.1:8766
+    AWS_ACCESS_KEY_ID=mock AWS_SECRET_ACCESS_KEY=mock
+
+Usage:
+    python mock_ses_server.py --port 8766 --latency 0.05 --max-rate 14
+"""
+
+import time
+import uuid
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SES_NAMESPACE = "http://ses.amazonaws.com/doc/2010-12-01/"
+
+class MockSESHandler(BaseHTTPRequestHandler):
+    """Request handler answering SES query API requests."""
+
+    # Seconds to sleep before answering and sends allowed per second, set by make_server
+    latency = 0.0
+    max_rate = 0.0
+    state = None
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def _send_xml(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _within_rate(self):
+        """Count a send in the current one-second window, refusing it above max_rate."""
+        if not self.max_rate:
+            return True
+        with self.state["lock"]:
+            second = int(time.monotonic())
+            if self.state["window"] != second:
+                self.state["window"], self.state["window_count"] = second, 0
+            if self.state["window_count"] >= self.max_rate:
+                return False
+            self.state["window_count"] += 1
+            return True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        action = form.get("Action", [""])[0]
+        request_id = str(uuid.uuid4())
+        time.sleep(self.latency)
+
+        if action not in ("SendRawEmail", "SendEmail"):
+            self._send_xml(400, (
+                f'<ErrorResponse xmlns="{SES_NAMESPACE}"><Error><Type>Sender</Type>'
+                f'<Code>InvalidAction</Code><Message>Unsupported action {action}</Message></Error>'
+                f'<RequestId>{request_id}</RequestId></ErrorResponse>'
+            ))
+            return
+
+        if not self._within_rate():
+            with self.state["lock"]:
+                self.state["throttled"] += 1
+            self._send_xml(400, (
+                f'<ErrorResponse xmlns="{SES_NAMESPACE}"><Error><Type>Sender</Type>'
+                f'<Code>Throttling</Code><Message>Maximum sending rate exceeded.</Message></Error>'
+                f'<RequestId>{request_id}</RequestId></ErrorResponse>'
+            ))
+            return
+
+        with self.state["lock"]:
+            self.state["sent"] += 1
+        message_id = f"{uuid.uuid4().hex}-000000"
+        self._send_xml(200, (
+            f'<{action}Response xmlns="{SES_NAMESPACE}"><{action}Result>'
+            f'<MessageId>{message_id}</MessageId></{action}Result>'
+            f'<ResponseMetadata><RequestId>{request_id}</RequestId></ResponseMetadata></{action}Response>'
+        ))
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, max_rate=0.0):
+    """
+    Create a threaded mock server.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        latency: Seconds to wait before each response
+        max_rate: Sends accepted per second (0 accepts all)
+
+    Returns:
+        ThreadingHTTPServer; its counters are in server.state
+    """
+    state = {"lock": threading.Lock(), "sent": 0, "throttled": 0, "window": None, "window_count": 0}
+    handler = type("ConfiguredMockSESHandler", (MockSESHandler,), {
+        "latency": latency,
+        "max_rate": max_rate,
+        "state": state
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+def serve_in_background(latency=0.0, max_rate=0.0):
+    """Start a mock server on a free local port in a daemon thread and return it."""
+    server = make_server(latency=latency, max_rate=max_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """Main function to run the mock server."""
+    parser = argparse.ArgumentParser(description='Mock SES server for the Loan Eligibility Engine')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8766, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds to wait before each response')
+    parser.add_argument('--max-rate', type=float, default=0, help='Sends accepted per second (0 accepts all)')
+
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.max_rate)
+    print(f"Mock SES server listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Sent {server.state['sent']} emails, throttled {server.state['throttled']} requests")
+
+if __name__ == "__main__":
+    main()
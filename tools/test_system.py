@@ -13,15 +13,18 @@ Usage:
 """
 
 import os
+import sys
 import time
 import boto3
 import argparse
-import psycopg2
 import requests
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 from generate_sample_data import generate_user_data, generate_loan_products, insert_loan_products
 
+# Make the Lambda modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
 # Load environment variables
 load_dotenv()
 
@@ -29,32 +32,14 @@ load_dotenv()
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 S3_BUCKET = os.environ.get("S3_BUCKET")
 
-# Database connection parameters
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME", "loaneligibility")
-DB_USER = os.environ.get("DB_USER", "admin")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
-DB_PORT = os.environ.get("DB_PORT", "5432")
+# Database defaults, read by the shared db module when it is imported
+os.environ.setdefault("DB_NAME", "loaneligibility")
+os.environ.setdefault("DB_USER", "admin")
 
 # n8n webhook URLs
 N8N_MATCHING_WEBHOOK = os.environ.get("N8N_MATCHING_WEBHOOK", "http://localhost:5678/webhook/loan-matching")
 N8N_NOTIFICATION_WEBHOOK = os.environ.get("N8N_NOTIFICATION_WEBHOOK", "http://localhost:5678/webhook/loan-notification")
 
-def get_db_connection():
-    """Create a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {str(e)}")
-        raise e
-
 def upload_to_s3(file_path, bucket_name):
     """
     Upload a file to S3.
@@ -117,7 +102,9 @@ def monitor_database(batch_id, timeout=300):
     Returns:
         Dictionary with monitoring results
     """
-    conn = get_db_connection()
+    from db import connect
+    
+    conn = connect()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     start_time = time.time()